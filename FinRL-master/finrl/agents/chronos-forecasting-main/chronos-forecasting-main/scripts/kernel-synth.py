@@ -3,8 +3,10 @@
 
 import argparse
 import functools
+import itertools
+from collections import defaultdict
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import numpy as np
 from gluonts.dataset.arrow import ArrowWriter
@@ -182,19 +184,147 @@ def generate_time_series(max_kernels: int = 5):
         return {"start": np.datetime64("2000-01-01 00:00", "s"), "target": ts.squeeze()}
 
 
+def random_kernel_spec(
+    rng: np.random.Generator, max_kernels: int = 5
+) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+    """
+    Draw a composite kernel as in ``generate_time_series``, without building it.
+
+    Parameters
+    ----------
+    rng
+        The random number generator.
+    max_kernels, optional
+        The maximum number of base kernels to use, by default 5
+
+    Returns
+    -------
+        The indices of the selected kernels in ``KERNEL_BANK`` and the binary
+        operators (0 for +, 1 for *) that combine them from left to right.
+    """
+    num_kernels = rng.integers(1, max_kernels + 1)
+    kernel_ids = tuple(rng.integers(len(KERNEL_BANK), size=num_kernels).tolist())
+    operators = tuple(rng.integers(2, size=num_kernels - 1).tolist())
+    return kernel_ids, operators
+
+
+def gp_prior_factor(cov: np.ndarray) -> np.ndarray:
+    """
+    Factorize the covariance of a GP prior, so that samples can be drawn as
+    ``factor @ z`` for standard normal ``z``.
+
+    The Cholesky factor is used if the covariance, with a small jitter added to
+    its diagonal, is numerically positive definite. Otherwise the factor is
+    computed from an eigendecomposition, with negative eigenvalues clipped to zero.
+
+    Parameters
+    ----------
+    cov
+        The covariance matrix of the GP prior at the input "time" points.
+
+    Returns
+    -------
+        A matrix ``factor`` such that ``factor @ factor.T`` is the covariance.
+    """
+    scale = max(np.mean(np.diag(cov)), np.finfo(cov.dtype).tiny)
+    for jitter in [1e-10, 1e-8]:
+        try:
+            return np.linalg.cholesky(cov + np.diag(np.full(len(cov), jitter * scale)))
+        except np.linalg.LinAlgError:
+            pass
+
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+
+
+def generate_time_series_batch(
+    num_series: int, max_kernels: int = 5, seed: Optional[np.random.SeedSequence] = None
+) -> List[dict]:
+    """Generate a batch of synthetic time series from KernelSynth.
+
+    Samples are drawn with the Cholesky factor of the covariance, which is much
+    faster than the SVD used by ``sample_from_gp_prior``. Series that draw the
+    same composite kernel share one factorization, and are sampled together.
+
+    Parameters
+    ----------
+    num_series
+        The number of time series to generate.
+    max_kernels, optional
+        The maximum number of base kernels to use for each time series, by default 5
+    seed, optional
+        The seed of the random number generator, by default None.
+
+    Returns
+    -------
+        The time series generated by KernelSynth.
+    """
+    rng = np.random.default_rng(seed)
+    X = np.linspace(0, 1, LENGTH)[:, None]
+    targets = np.empty((num_series, LENGTH))
+
+    # The composite kernels share the base kernels of KERNEL_BANK and the inputs,
+    # so each base kernel is evaluated at most once per batch
+    base_covs = {}
+
+    def covariance(spec):
+        kernel_ids, operators = spec
+        for kernel_id in kernel_ids:
+            if kernel_id not in base_covs:
+                base_covs[kernel_id] = KERNEL_BANK[kernel_id](X)
+        cov = base_covs[kernel_ids[0]]
+        for kernel_id, operator in zip(kernel_ids[1:], operators):
+            other = base_covs[kernel_id]
+            cov = cov * other if operator else cov + other
+        return cov
+
+    pending = defaultdict(list)
+    for idx in range(num_series):
+        pending[random_kernel_spec(rng, max_kernels)].append(idx)
+
+    while pending:
+        retry = defaultdict(list)
+        for spec, indices in pending.items():
+            try:
+                factor = gp_prior_factor(covariance(spec))
+            except np.linalg.LinAlgError as err:
+                print("Error caught:", err)
+                for idx in indices:
+                    retry[random_kernel_spec(rng, max_kernels)].append(idx)
+                continue
+            targets[indices] = (factor @ rng.standard_normal((LENGTH, len(indices)))).T
+        pending = retry
+
+    # The timestamp is arbitrary
+    start = np.datetime64("2000-01-01 00:00", "s")
+    return [{"start": start, "target": ts} for ts in targets]
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-N", "--num-series", type=int, default=1000_000)
     parser.add_argument("-J", "--max-kernels", type=int, default=5)
+    parser.add_argument("-B", "--batch-size", type=int, default=4096)
+    parser.add_argument("-s", "--seed", type=int, default=None)
     args = parser.parse_args()
     path = Path(__file__).parent / "kernelsynth-data.arrow"
 
-    generated_dataset = Parallel(n_jobs=-1)(
-        delayed(generate_time_series)(max_kernels=args.max_kernels)
-        for _ in tqdm(range(args.num_series))
+    # Workers return batches in order as soon as they are ready, and the batches
+    # are written to the arrow file as they arrive, so at most a few batches per
+    # worker are held in memory
+    batch_sizes = [
+        min(args.batch_size, args.num_series - start)
+        for start in range(0, args.num_series, args.batch_size)
+    ]
+    seeds = np.random.SeedSequence(args.seed).spawn(len(batch_sizes))
+    generated_batches = Parallel(n_jobs=-1, return_as="generator")(
+        delayed(generate_time_series_batch)(
+            num_series=num_series, max_kernels=args.max_kernels, seed=seed
+        )
+        for num_series, seed in zip(batch_sizes, seeds)
     )
 
     ArrowWriter(compression="lz4").write_to_file(
-        generated_dataset,
+        itertools.chain.from_iterable(tqdm(generated_batches, total=len(batch_sizes))),
         path=path,
     )
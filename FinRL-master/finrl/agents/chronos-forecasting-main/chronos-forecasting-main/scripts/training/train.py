@@ -12,14 +12,14 @@ import random
 from copy import deepcopy
 from pathlib import Path
 from functools import partial
-from typing import List, Iterator, Optional, Dict
+from typing import List, Iterable, Iterator, Optional, Dict
 
 import typer
 from typer_config import use_yaml_config
 import numpy as np
 import torch
 import torch.distributed as dist
-from torch.utils.data import IterableDataset, get_worker_info
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
 import transformers
 from transformers import (
     AutoModelForSeq2SeqLM,
@@ -499,6 +499,132 @@ class ChronosDataset(IterableDataset, ShuffleMixin):
                 yield self.to_hf_format(entry)
 
 
+def write_token_shards(
+    dataset: Iterable[dict],
+    output_dir: Path,
+    num_windows: int,
+    shard_size: int = 65_536,
+    token_dtype=np.int16,
+) -> None:
+    """
+    Tokenize ``num_windows`` entries of ``dataset``, typically a ``ChronosDataset``
+    in training mode, into fixed-shape integer shards for ``TokenShardDataset``.
+
+    Each shard holds up to ``shard_size`` windows, stored as one ``.npy`` file per
+    field (``input_ids``, ``attention_mask`` and ``labels``). Token IDs and labels
+    are stored as ``token_dtype``, which must fit ``n_tokens`` and -100.
+    Note that the windows, and their randomly dropped observations, are sampled
+    once: sample more windows than the training job consumes to avoid repeats.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    entries = iter(dataset)
+    shard_lengths = []
+    fields = {}
+
+    for shard_idx, start in enumerate(range(0, num_windows, shard_size)):
+        length = min(shard_size, num_windows - start)
+        arrays = {}
+        filled = 0
+        for entry in itertools.islice(entries, length):
+            if not arrays:
+                for field, value in entry.items():
+                    dtype = np.bool_ if value.dtype == torch.bool else token_dtype
+                    arrays[field] = np.empty((length, *value.shape), dtype=dtype)
+            for field, value in entry.items():
+                arrays[field][filled] = value.numpy()
+            filled += 1
+        if filled == 0:
+            break
+
+        for field, array in arrays.items():
+            np.save(output_dir / f"shard-{shard_idx:05d}-{field}.npy", array[:filled])
+            fields[field] = {"shape": array.shape[1:], "dtype": array.dtype.str}
+        shard_lengths.append(filled)
+        log_on_main(f"Wrote {start + filled} of {num_windows} windows", logger)
+        if filled < length:
+            break
+
+    with open(output_dir / "metadata.json", "w") as fp:
+        json.dump({"shard_lengths": shard_lengths, "fields": fields}, fp, indent=4)
+
+
+class TokenShardDataset(Dataset):
+    """
+    Map-style dataset over the token shards written by ``write_token_shards``.
+
+    Shards are memory-mapped, so only the rows that are read are loaded, and
+    shuffling is left to the sampler (e.g. the ``RandomSampler`` of ``Trainer``).
+    Batched reads through ``__getitems__`` are grouped by shard and sorted, so
+    a shuffled batch costs one fancy-indexed read per shard and field.
+
+    Parameters
+    ----------
+    shards_dir
+        Directory containing the shards and their ``metadata.json``.
+    """
+
+    def __init__(self, shards_dir: Path) -> None:
+        super().__init__()
+        self.shards_dir = Path(shards_dir)
+        with open(self.shards_dir / "metadata.json") as fp:
+            self.metadata = json.load(fp)
+        self.offsets = np.cumsum([0] + self.metadata["shard_lengths"])
+        self._shards = None
+
+    def _get_shards(self) -> List[Dict[str, np.ndarray]]:
+        # opened lazily, so that every data loader worker maps its own copy
+        if self._shards is None:
+            self._shards = [
+                {
+                    field: np.load(
+                        self.shards_dir / f"shard-{shard_idx:05d}-{field}.npy",
+                        mmap_mode="r",
+                    )
+                    for field in self.metadata["fields"]
+                }
+                for shard_idx in range(len(self.metadata["shard_lengths"]))
+            ]
+        return self._shards
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getitem__(self, idx: int) -> dict:
+        return self.__getitems__([idx])[0]
+
+    def __getitems__(self, indices: List[int]) -> List[dict]:
+        indices = np.asarray(indices)
+        shard_idx = np.searchsorted(self.offsets, indices, side="right") - 1
+        rows = indices - self.offsets[shard_idx]
+        shards = self._get_shards()
+
+        batch = {
+            field: np.empty((len(indices), *info["shape"]), dtype=info["dtype"])
+            for field, info in self.metadata["fields"].items()
+        }
+        for shard in np.unique(shard_idx):
+            positions = np.flatnonzero(shard_idx == shard)
+            positions = positions[np.argsort(rows[positions])]
+            for field, array in shards[shard].items():
+                batch[field][positions] = array[rows[positions]]
+
+        batch = {
+            field: torch.from_numpy(
+                array if array.dtype == np.bool_ else array.astype(np.int64)
+            )
+            for field, array in batch.items()
+        }
+        return [
+            {field: tensor[i] for field, tensor in batch.items()}
+            for i in range(len(indices))
+        ]
+
+
 @app.command()
 @use_yaml_config(param_name="config")
 def main(
@@ -538,6 +664,8 @@ def main(
     top_k: int = 50,
     top_p: float = 1.0,
     seed: Optional[int] = None,
+    token_shards_dir: Optional[str] = None,
+    num_token_shard_windows: int = 0,
 ):
     if tf32 and not (
         torch.cuda.is_available() and torch.cuda.get_device_capability()[0] >= 8
@@ -643,7 +771,7 @@ def main(
     # Add extra items to model config so that it's saved in the ckpt
     model.config.chronos_config = chronos_config.__dict__
 
-    shuffled_train_dataset = ChronosDataset(
+    train_dataset = ChronosDataset(
         datasets=train_datasets,
         probabilities=probability,
         tokenizer=chronos_config.create_tokenizer(),
@@ -653,7 +781,7 @@ def main(
         model_type=model_type,
         imputation_method=LastValueImputation() if model_type == "causal" else None,
         mode="training",
-    ).shuffle(shuffle_buffer_length=shuffle_buffer_length)
+    )
 
     # Define training args
     training_args = TrainingArguments(
@@ -678,6 +806,31 @@ def main(
         remove_unused_columns=False,
     )
 
+    if token_shards_dir is None:
+        shuffled_train_dataset = train_dataset.shuffle(
+            shuffle_buffer_length=shuffle_buffer_length
+        )
+    else:
+        # Tokenize the training windows once, on the main process, then train
+        # from the memory-mapped shards; existing shards are reused
+        token_shards_dir = Path(token_shards_dir)
+        with training_args.main_process_first(desc="writing token shards"):
+            if not (token_shards_dir / "metadata.json").exists():
+                assert num_token_shard_windows > 0, "num_token_shard_windows not set"
+                log_on_main(f"Writing token shards to {token_shards_dir}", logger)
+                write_token_shards(
+                    train_dataset,
+                    token_shards_dir,
+                    num_windows=num_token_shard_windows,
+                    token_dtype=np.int16 if n_tokens <= 2**15 else np.int32,
+                )
+        shuffled_train_dataset = TokenShardDataset(token_shards_dir)
+        sample = next(iter(train_dataset))
+        assert all(
+            list(value.shape) == shuffled_train_dataset.metadata["fields"][key]["shape"]
+            for key, value in sample.items()
+        ), f"Token shards in {token_shards_dir} do not match the training config"
+
     # Create Trainer instance
     trainer = Trainer(
         model=model,
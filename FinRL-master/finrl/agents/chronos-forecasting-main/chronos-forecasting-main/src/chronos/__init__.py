@@ -8,9 +8,11 @@ from .chronos import (
     ChronosTokenizer,
     MeanScaleUniformBins,
 )
+from .serving import ChronosForecastService
 
 __all__ = [
     "ChronosConfig",
+    "ChronosForecastService",
     "ChronosModel",
     "ChronosPipeline",
     "ChronosTokenizer",
@@ -149,6 +149,20 @@ class ChronosTokenizer:
 
 
 class MeanScaleUniformBins(ChronosTokenizer):
+    """
+    Tokenizes series by scaling them with their mean absolute value and
+    assigning each scaled value to the closest of uniformly spaced bins.
+
+    Since the bins are uniform, the bucket of each value is computed
+    arithmetically and then corrected against the bucket boundaries, which
+    gives the same tokens as ``torch.bucketize`` without its binary search.
+    Encoding runs over blocks of ``encode_block_size`` values at a time and
+    writes into the output tensors, so that the temporaries of long contexts
+    stay small, and decoding reuses its intermediate tensors in place.
+    """
+
+    encode_block_size: int = 2**16
+
     def __init__(
         self, low_limit: float, high_limit: float, config: ChronosConfig
     ) -> None:
@@ -165,47 +179,77 @@ class MeanScaleUniformBins(ChronosTokenizer):
                 torch.tensor([1e20], device=self.centers.device),
             )
         )
-
-    def _input_transform(
-        self, context: torch.Tensor, scale: Optional[torch.Tensor] = None
-    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-        context = context.to(dtype=torch.float32)
-        attention_mask = ~torch.isnan(context)
-
-        if scale is None:
-            scale = torch.nansum(
-                torch.abs(context) * attention_mask, dim=-1
-            ) / torch.nansum(attention_mask, dim=-1)
-            scale[~(scale > 0)] = 1.0
-
-        scaled_context = context / scale.unsqueeze(dim=-1)
-        token_ids = (
-            torch.bucketize(
-                input=scaled_context,
-                boundaries=self.boundaries,
-                # buckets are open to the right, see:
-                # https://pytorch.org/docs/2.1/generated/torch.bucketize.html#torch-bucketize
-                right=True,
+        # lower_boundaries[i] == boundaries[i - 1], with no lower bound for i == 0
+        self.lower_boundaries = torch.concat(
+            (
+                torch.tensor([-float("inf")], device=self.centers.device),
+                self.boundaries[:-1],
             )
-            + self.config.n_special_tokens
         )
+        self.bin_width = (high_limit - low_limit) / max(len(self.centers) - 1, 1)
 
-        token_ids.clamp_(0, self.config.n_tokens - 1)
-
-        token_ids[~attention_mask] = self.config.pad_token_id
+    def _bucketize(self, values: torch.Tensor, out: torch.Tensor) -> None:
+        """
+        Write ``torch.bucketize(values, self.boundaries, right=True)`` to
+        ``out``, except that NaN goes to the bucket before the last one instead
+        of the last one; both are clipped to the same token.
+        """
+        # values lie in the bucket i with boundaries[i - 1] <= value < boundaries[i],
+        # where boundaries[i] = centers[0] + (i - 0.5) * bin_width for 0 < i < n
+        guess = (values - self.centers[0]).div_(self.bin_width).add_(1.5).floor_()
+        # NaN (e.g. inf / inf) ends up clipped to the last token, as with bucketize
+        guess.nan_to_num_(len(self.centers)).clamp_(0, len(self.centers))
+        out.copy_(guess)
+        # rounding errors put the guess at most one bucket away
+        out.sub_((values < self.lower_boundaries[out]).to(out.dtype))
+        out.add_(values >= self.boundaries[out])
 
-        return token_ids, attention_mask, scale
+    def _input_transform(
+        self,
+        context: torch.Tensor,
+        scale: Optional[torch.Tensor] = None,
+        append_eos: bool = False,
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        context = context.to(dtype=torch.float32)
+        length = context.shape[-1]
+        rows = context.reshape(-1, length)
 
-    def _append_eos_token(
-        self, token_ids: torch.Tensor, attention_mask: torch.Tensor
-    ) -> Tuple[torch.Tensor, torch.Tensor]:
-        batch_size = token_ids.shape[0]
-        eos_tokens = torch.full((batch_size, 1), fill_value=self.config.eos_token_id)
-        token_ids = torch.concat((token_ids, eos_tokens), dim=1)
-        eos_mask = torch.full((batch_size, 1), fill_value=True)
-        attention_mask = torch.concat((attention_mask, eos_mask), dim=1)
+        compute_scale = scale is None
+        if compute_scale:
+            scale = torch.empty(
+                context.shape[:-1], dtype=torch.float32, device=context.device
+            )
 
-        return token_ids, attention_mask
+        out_length = length + 1 if append_eos else length
+        token_ids = torch.empty(
+            (len(rows), out_length), dtype=torch.long, device=context.device
+        )
+        attention_mask = torch.empty_like(token_ids, dtype=torch.bool)
+        if append_eos:
+            token_ids[:, -1] = self.config.eos_token_id
+            attention_mask[:, -1] = True
+
+        row_scale = scale.reshape(-1, 1).expand(len(rows), 1)
+        block_rows = max(1, self.encode_block_size // max(length, 1))
+        for start in range(0, len(rows), block_rows):
+            block = slice(start, start + block_rows)
+            block_ids = token_ids[block, :length]
+            is_nan = torch.isnan(rows[block])
+
+            if compute_scale:
+                block_scale = row_scale[block, 0]
+                torch.nansum(torch.abs(rows[block]), dim=-1, out=block_scale)
+                block_scale /= length - is_nan.sum(dim=-1)
+                block_scale[~(block_scale > 0)] = 1.0
+
+            self._bucketize(rows[block] / row_scale[block], out=block_ids)
+            block_ids.add_(self.config.n_special_tokens)
+            block_ids.clamp_(0, self.config.n_tokens - 1)
+            block_ids.masked_fill_(is_nan, self.config.pad_token_id)
+            torch.logical_not(is_nan, out=attention_mask[block, :length])
+
+        out_shape = context.shape[:-1] + (out_length,)
+        return token_ids.view(out_shape), attention_mask.view(out_shape), scale
 
     def context_input_transform(
         self, context: torch.Tensor
@@ -215,14 +259,11 @@ class MeanScaleUniformBins(ChronosTokenizer):
         if length > self.config.context_length:
             context = context[..., -self.config.context_length :]
 
-        token_ids, attention_mask, scale = self._input_transform(context=context)
-
-        if self.config.use_eos_token and self.config.model_type == "seq2seq":
-            token_ids, attention_mask = self._append_eos_token(
-                token_ids=token_ids, attention_mask=attention_mask
-            )
-
-        return token_ids, attention_mask, scale
+        return self._input_transform(
+            context=context,
+            append_eos=self.config.use_eos_token
+            and self.config.model_type == "seq2seq",
+        )
 
     def label_input_transform(
         self, label: torch.Tensor, scale: torch.Tensor
@@ -230,12 +271,9 @@ class MeanScaleUniformBins(ChronosTokenizer):
         length = label.shape[-1]
 
         assert length == self.config.prediction_length
-        token_ids, attention_mask, _ = self._input_transform(context=label, scale=scale)
-
-        if self.config.use_eos_token:
-            token_ids, attention_mask = self._append_eos_token(
-                token_ids=token_ids, attention_mask=attention_mask
-            )
+        token_ids, attention_mask, _ = self._input_transform(
+            context=label, scale=scale, append_eos=self.config.use_eos_token
+        )
 
         return token_ids, attention_mask
 
@@ -243,12 +281,12 @@ class MeanScaleUniformBins(ChronosTokenizer):
         self, samples: torch.Tensor, scale: torch.Tensor
     ) -> torch.Tensor:
         scale_unsqueezed = scale.unsqueeze(-1).unsqueeze(-1)
-        indices = torch.clamp(
-            samples - self.config.n_special_tokens - 1,
-            min=0,
-            max=len(self.centers) - 1,
-        )
-        return self.centers[indices] * scale_unsqueezed
+        indices = samples - (self.config.n_special_tokens + 1)
+        indices.clamp_(min=0, max=len(self.centers) - 1)
+        values = self.centers[indices]
+        if values.dtype != torch.promote_types(values.dtype, scale.dtype):
+            return values * scale_unsqueezed
+        return values.mul_(scale_unsqueezed)
 
 
 class ChronosModel(nn.Module):
@@ -0,0 +1,207 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import torch
+
+from .chronos import ChronosPipeline
+
+
+@dataclass
+class _ForecastRequest:
+    context: torch.Tensor
+    future: Future
+    deadline: float
+
+
+@dataclass
+class _Bucket:
+    requests: List[_ForecastRequest] = field(default_factory=list)
+
+    @property
+    def deadline(self) -> float:
+        return self.requests[0].deadline
+
+
+class ChronosForecastService:
+    """
+    A ``ChronosForecastService`` batches concurrent forecast requests
+    for a ``ChronosPipeline``.
+
+    Requests are grouped by context length and by forecast options,
+    so that each batch only pads series to the length of its bucket.
+    A bucket is forecast as soon as it holds ``max_batch_size`` series,
+    or once its oldest request has waited ``max_wait`` seconds, whichever
+    comes first. All forecasts run on a single worker thread.
+
+    Parameters
+    ----------
+    pipeline
+        The pipeline to forecast with.
+    max_batch_size
+        Largest number of series forecast in one batch.
+    max_wait
+        Latency budget, in seconds, that a request may wait for more
+        requests to join its batch.
+    length_buckets
+        Increasing upper bounds of the context length buckets. Defaults
+        to powers of two up to the model's context length. Contexts longer
+        than the model's context length are truncated by the tokenizer
+        and go to the last bucket.
+    """
+
+    def __init__(
+        self,
+        pipeline: ChronosPipeline,
+        max_batch_size: int = 32,
+        max_wait: float = 0.01,
+        length_buckets: Optional[Sequence[int]] = None,
+    ) -> None:
+        context_length = pipeline.model.config.context_length
+        if length_buckets is None:
+            length_buckets = [32]
+            while length_buckets[-1] < context_length:
+                length_buckets.append(2 * length_buckets[-1])
+        self.pipeline = pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.length_buckets = list(length_buckets)
+        self.context_length = context_length
+
+        self._buckets: Dict[Tuple, _Bucket] = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(
+        self,
+        context: torch.Tensor,
+        prediction_length: Optional[int] = None,
+        num_samples: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_k: Optional[int] = None,
+        top_p: Optional[float] = None,
+        limit_prediction_length: bool = True,
+    ) -> Future:
+        """
+        Request a forecast for one time series.
+
+        Parameters
+        ----------
+        context
+            A 1D tensor holding the series to forecast.
+        prediction_length, num_samples, temperature, top_k, top_p, limit_prediction_length
+            Forecast options, as in ``ChronosPipeline.predict``.
+
+        Returns
+        -------
+        future
+            A ``concurrent.futures.Future`` whose result is the tensor of
+            sample forecasts, of shape (num_samples, prediction_length).
+        """
+        assert isinstance(context, torch.Tensor)
+        assert context.ndim == 1
+        length = min(len(context), self.context_length)
+        bucket_length = next(
+            (b for b in self.length_buckets if b >= length), self.length_buckets[-1]
+        )
+        key = (
+            bucket_length,
+            prediction_length,
+            num_samples,
+            temperature,
+            top_k,
+            top_p,
+            limit_prediction_length,
+        )
+
+        future: Future = Future()
+        request = _ForecastRequest(
+            context=context,
+            future=future,
+            deadline=time.monotonic() + self.max_wait,
+        )
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Cannot submit to a closed ChronosForecastService")
+            self._buckets.setdefault(key, _Bucket()).requests.append(request)
+            self._condition.notify()
+        return future
+
+    def predict(self, context: List[torch.Tensor], **kwargs) -> List[torch.Tensor]:
+        """
+        Submit each series of ``context`` and wait for all the forecasts.
+        Takes the same keyword arguments as ``submit``.
+        """
+        futures = [self.submit(c, **kwargs) for c in context]
+        return [f.result() for f in futures]
+
+    def close(self) -> None:
+        """Forecast all pending requests, then stop the worker thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+
+    def __enter__(self) -> "ChronosForecastService":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _next_batch(self) -> Optional[Tuple[Tuple, List[_ForecastRequest]]]:
+        # called with the condition held; blocks until a batch is due
+        while True:
+            now = time.monotonic()
+            due = [
+                (key, bucket)
+                for key, bucket in self._buckets.items()
+                if self._closed
+                or len(bucket.requests) >= self.max_batch_size
+                or bucket.deadline <= now
+            ]
+            if due:
+                key, bucket = min(due, key=lambda item: item[1].deadline)
+                requests = bucket.requests[: self.max_batch_size]
+                del bucket.requests[: self.max_batch_size]
+                if not bucket.requests:
+                    del self._buckets[key]
+                return key, requests
+            if self._closed:
+                return None
+            deadline = min((b.deadline for b in self._buckets.values()), default=None)
+            self._condition.wait(None if deadline is None else deadline - now)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                batch = self._next_batch()
+            if batch is None:
+                return
+            key, requests = batch
+            requests = [r for r in requests if r.future.set_running_or_notify_cancel()]
+            if not requests:
+                continue
+            _, prediction_length, num_samples, temperature, top_k, top_p, limit = key
+            try:
+                samples = self.pipeline.predict(
+                    [r.context for r in requests],
+                    prediction_length=prediction_length,
+                    num_samples=num_samples,
+                    temperature=temperature,
+                    top_k=top_k,
+                    top_p=top_p,
+                    limit_prediction_length=limit,
+                )
+            except Exception as e:
+                for r in requests:
+                    r.future.set_exception(e)
+            else:
+                for r, s in zip(requests, samples):
+                    r.future.set_result(s)
@@ -7,7 +7,12 @@ from typing import Tuple
 import pytest
 import torch
 
-from chronos import ChronosConfig, ChronosPipeline, MeanScaleUniformBins
+from chronos import (
+    ChronosConfig,
+    ChronosForecastService,
+    ChronosPipeline,
+    MeanScaleUniformBins,
+)
 
 
 @pytest.mark.parametrize("n_numerical_tokens", [5, 10, 27])
@@ -219,6 +224,27 @@ def test_pipeline_predict(model_dtype: torch.dtype, input_dtype: torch.dtype):
     validate_tensor(samples, shape=(1, 7, 65), dtype=input_dtype)
 
 
+def test_forecast_service():
+    pipeline = ChronosPipeline.from_pretrained(
+        Path(__file__).parent / "dummy-chronos-model",
+        device_map="cpu",
+        torch_dtype=torch.float32,
+    )
+    context = [10 * torch.rand(length) + 10 for length in [5, 16, 40, 600, 16, 7]]
+
+    with ChronosForecastService(pipeline, max_batch_size=2) as service:
+        samples = service.predict(context, num_samples=7, prediction_length=3)
+        for s in samples:
+            validate_tensor(s, shape=(7, 3), dtype=torch.float32)
+
+        future = service.submit(context[0], prediction_length=65)
+        with pytest.raises(ValueError):
+            future.result()
+
+    with pytest.raises(RuntimeError):
+        service.submit(context[0])
+
+
 @pytest.mark.parametrize("model_dtype", [torch.float32, torch.bfloat16])
 @pytest.mark.parametrize("input_dtype", [torch.float32, torch.bfloat16])
 def test_pipeline_embed(model_dtype: torch.dtype, input_dtype: torch.dtype):
@@ -309,3 +335,58 @@ def test_token_clipping(n_tokens):
         context=torch.tensor([[huge_value]]), scale=torch.tensor(([1]))
     )
     assert token_ids[0, 0] == config.n_tokens - 1  # and it's clipped to n_tokens - 1
+
+
+@pytest.mark.parametrize("n_tokens", [10, 4096, 10000])
+@pytest.mark.parametrize("shape", [(7,), (3, 2, 9), (70, 1000)])
+def test_tokenizer_matches_bucketize(n_tokens, shape):
+    config = ChronosConfig(
+        tokenizer_class="MeanScaleUniformBins",
+        tokenizer_kwargs={"low_limit": -15, "high_limit": 15},
+        n_tokens=n_tokens,
+        n_special_tokens=2,
+        pad_token_id=0,
+        eos_token_id=1,
+        use_eos_token=True,
+        model_type="seq2seq",
+        context_length=1000,
+        prediction_length=64,
+        num_samples=20,
+        temperature=1.0,
+        top_k=50,
+        top_p=1.0,
+    )
+    tokenizer = config.create_tokenizer()
+    tokenizer.encode_block_size = 2048  # several blocks for the largest shape
+
+    # values on, and next to, the boundaries, beyond the limits, and missing
+    boundaries = tokenizer.boundaries[1:-1]
+    values = torch.cat(
+        [
+            boundaries,
+            torch.nextafter(boundaries, torch.tensor(-torch.inf)),
+            torch.nextafter(boundaries, torch.tensor(torch.inf)),
+            torch.tensor([0.0, 1e22, -1e22, torch.inf, -torch.inf, torch.nan]),
+        ]
+    )
+    context = values[torch.randint(len(values), shape)]
+    context[torch.rand(shape) < 0.1] = torch.nan
+    context.view(-1, shape[-1])[0] = torch.nan  # a series with no observations
+
+    is_nan = torch.isnan(context)
+    scale = torch.nansum(context.abs(), dim=-1) / (~is_nan).sum(dim=-1)
+    scale[~(scale > 0)] = 1.0
+    expected_ids = torch.bucketize(
+        context / scale.unsqueeze(-1), tokenizer.boundaries, right=True
+    )
+    expected_ids += config.n_special_tokens
+    expected_ids.clamp_(0, config.n_tokens - 1)
+    expected_ids[is_nan] = config.pad_token_id
+
+    token_ids, attention_mask, actual_scale = tokenizer.context_input_transform(context)
+
+    assert torch.equal(actual_scale, scale)
+    assert torch.equal(token_ids[..., :-1], expected_ids)
+    assert torch.equal(attention_mask[..., :-1], ~is_nan)
+    assert (token_ids[..., -1] == config.eos_token_id).all()
+    assert attention_mask[..., -1].all()
@@ -8,22 +8,27 @@ import datetime
 import logging
 
 from .protocols import Message, MessageType, ErrorCode, create_error_message
-from .broker import broker
+from .broker import Broker, broker as default_broker
 
 logger = logging.getLogger(__name__)
 
 class BaseAgent(ABC):
     """Base class for all agents in the system."""
 
-    def __init__(self, agent_id: str):
+    def __init__(self, agent_id: str, broker: Optional[Broker] = None):
+        """Create an agent on ``broker``, by default the global in-process one.
+
+        Pass a ``transport.RemoteBroker`` to run the agent in its own process.
+        """
         self.agent_id = agent_id
+        self.broker = broker if broker is not None else default_broker
         self._setup_message_handlers()
 
     def _setup_message_handlers(self):
         """Setup message handlers for different message types."""
-        broker.subscribe(MessageType.STRATEGY_REQUEST, self._handle_strategy_request)
-        broker.subscribe(MessageType.DATA_REQUEST, self._handle_data_request)
-        broker.subscribe(MessageType.ACTION_REQUEST, self._handle_action_request)
+        self.broker.subscribe(MessageType.STRATEGY_REQUEST, self._handle_strategy_request)
+        self.broker.subscribe(MessageType.DATA_REQUEST, self._handle_data_request)
+        self.broker.subscribe(MessageType.ACTION_REQUEST, self._handle_action_request)
 
     async def send_message(
         self,
@@ -40,7 +45,7 @@ class BaseAgent(ABC):
             correlation_id=correlation_id,
             payload=payload
         )
-        await broker.publish(message)
+        await self.broker.publish(message)
 
     async def _handle_strategy_request(self, message: Message) -> None:
         """Handle incoming strategy requests."""
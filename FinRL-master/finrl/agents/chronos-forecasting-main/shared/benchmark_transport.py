@@ -0,0 +1,196 @@
+"""Benchmark the in-process broker against the Unix socket transport.
+
+One publisher sends ``--messages`` messages, as fast as it can or at
+``--rate`` messages per second, to a fast subscriber and to a slow one,
+which blocks for ``--slow-ms`` per message like a CPU-bound agent would.
+Reports the publisher's messages per second, and the messages received and
+delivery latency of each subscriber.
+
+    python -m shared.benchmark_transport --messages 5000 --slow-ms 1
+"""
+
+import argparse
+import asyncio
+import datetime
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import List, Optional
+
+from .broker import MessageBroker
+from .protocols import Message, MessageType
+from .transport import BrokerServer, RemoteBroker
+
+IDLE_TIMEOUT = 2.0
+
+
+def _make_message(seq: int, stop: bool = False) -> Message:
+    return Message(
+        message_type=MessageType.DATA_RESPONSE,
+        sender="publisher",
+        timestamp=datetime.datetime.utcnow(),
+        message_id=str(seq),
+        payload={"seq": seq, "sent_ns": time.monotonic_ns(), "stop": stop}
+    )
+
+
+class _Subscriber:
+    """Records delivery latencies, blocking ``delay`` seconds per message."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.latencies_ms: List[float] = []
+        self.last_seen = time.monotonic()
+        self.stopped = asyncio.Event()
+
+    async def __call__(self, message: Message) -> None:
+        self.last_seen = time.monotonic()
+        if message.payload["stop"]:
+            self.stopped.set()
+            return
+        latency_ns = time.monotonic_ns() - message.payload["sent_ns"]
+        self.latencies_ms.append(latency_ns / 1e6)
+        if self.delay:
+            time.sleep(self.delay)
+
+    async def wait(self) -> None:
+        """Wait for the stop message, or until no message came for a while."""
+        while not self.stopped.is_set():
+            if time.monotonic() - self.last_seen > IDLE_TIMEOUT:
+                return
+            try:
+                await asyncio.wait_for(self.stopped.wait(), 0.1)
+            except asyncio.TimeoutError:
+                pass
+
+
+def _summary(name: str, latencies_ms: List[float], sent: int) -> str:
+    if not latencies_ms:
+        return f"  {name}: received 0/{sent}"
+    latencies_ms = sorted(latencies_ms)
+    p50 = latencies_ms[len(latencies_ms) // 2]
+    p99 = latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.99))]
+    return (
+        f"  {name}: received {len(latencies_ms)}/{sent}, "
+        f"latency p50 {p50:.2f} ms, p99 {p99:.2f} ms"
+    )
+
+
+async def _publish(broker, num_messages: int, rate: float = 0.0) -> float:
+    start = time.perf_counter()
+    for seq in range(num_messages):
+        if rate:
+            await asyncio.sleep(max(0.0, start + seq / rate - time.perf_counter()))
+        await broker.publish(_make_message(seq))
+    achieved_rate = num_messages / (time.perf_counter() - start)
+    await broker.publish(_make_message(num_messages, stop=True))
+    return achieved_rate
+
+
+async def _run_in_process(num_messages: int, slow_delay: float, rate: float) -> None:
+    broker = MessageBroker()
+    subscribers = {"fast": _Subscriber(), "slow": _Subscriber(slow_delay)}
+    for subscriber in subscribers.values():
+        broker.subscribe(MessageType.DATA_RESPONSE, subscriber)
+    achieved_rate = await _publish(broker, num_messages, rate)
+    print(f"in-process MessageBroker: publisher {achieved_rate:.0f} msg/s")
+    for name, subscriber in subscribers.items():
+        print(_summary(name, subscriber.latencies_ms, num_messages))
+
+
+def _run_server(path: str, queue_size: int, overflow: str, ready, done) -> None:
+    async def serve():
+        server = BrokerServer(path, queue_size, overflow)
+        await server.start()
+        ready.set()
+        while not done.is_set():
+            await asyncio.sleep(0.05)
+        await server.close()
+
+    asyncio.run(serve())
+
+
+def _run_subscriber(path: str, delay: float, ready, results) -> None:
+    async def subscribe():
+        broker = RemoteBroker(path)
+        subscriber = _Subscriber(delay)
+        broker.subscribe(MessageType.DATA_RESPONSE, subscriber)
+        await broker.connect()
+        ready.set()
+        await subscriber.wait()
+        await broker.close()
+        return subscriber.latencies_ms
+
+    results.put((delay, asyncio.run(subscribe())))
+
+
+async def _publish_remote(path: str, num_messages: int, rate: float) -> float:
+    broker = RemoteBroker(path)
+    await broker.connect()
+    achieved_rate = await _publish(broker, num_messages, rate)
+    await broker.close()
+    return achieved_rate
+
+
+def _run_transport(
+    num_messages: int,
+    slow_delay: float,
+    rate: float,
+    queue_size: int,
+    overflow: str
+) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "broker.sock")
+    context = multiprocessing.get_context("spawn")
+    server_ready, done = context.Event(), context.Event()
+    server = context.Process(
+        target=_run_server, args=(path, queue_size, overflow, server_ready, done)
+    )
+    server.start()
+    server_ready.wait()
+
+    results = context.Queue()
+    subscribers = []
+    for delay in (0.0, slow_delay):
+        ready = context.Event()
+        process = context.Process(
+            target=_run_subscriber, args=(path, delay, ready, results)
+        )
+        process.start()
+        ready.wait()
+        subscribers.append(process)
+    time.sleep(0.2)  # let the subscriptions reach the server
+
+    achieved_rate = asyncio.run(_publish_remote(path, num_messages, rate))
+    latencies = dict(results.get() for _ in subscribers)
+    for process in subscribers:
+        process.join()
+    done.set()
+    server.join()
+
+    print(
+        f"Unix socket transport, overflow={overflow}, queue_size={queue_size}: "
+        f"publisher {achieved_rate:.0f} msg/s"
+    )
+    print(_summary("fast", latencies[0.0], num_messages))
+    print(_summary("slow", latencies[slow_delay], num_messages))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=0.0, help="0 for unlimited")
+    parser.add_argument("--slow-ms", type=float, default=1.0)
+    parser.add_argument("--queue-size", type=int, default=256)
+    args = parser.parse_args(argv)
+    slow_delay = args.slow_ms / 1000
+
+    asyncio.run(_run_in_process(args.messages, slow_delay, args.rate))
+    for overflow in ("block", "drop_oldest"):
+        _run_transport(
+            args.messages, slow_delay, args.rate, args.queue_size, overflow
+        )
+
+
+if __name__ == "__main__":
+    main()
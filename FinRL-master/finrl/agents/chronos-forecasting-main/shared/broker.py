@@ -1,12 +1,35 @@
 """Message broker for inter-agent communication."""
 
 import asyncio
-from typing import Dict, Set, Callable, Awaitable, Optional
+from typing import Dict, Set, Callable, Awaitable, Optional, Protocol
 from .protocols import Message, MessageType, ErrorCode, create_error_message
 import logging
 
 logger = logging.getLogger(__name__)
 
+class Broker(Protocol):
+    """What agents need from a broker, in process or not.
+
+    Implemented by ``MessageBroker`` and ``transport.RemoteBroker``.
+    """
+
+    async def publish(self, message: Message) -> None:
+        ...
+
+    def subscribe(
+        self,
+        message_type: MessageType,
+        callback: Callable[[Message], Awaitable[None]]
+    ) -> None:
+        ...
+
+    def unsubscribe(
+        self,
+        message_type: MessageType,
+        callback: Callable[[Message], Awaitable[None]]
+    ) -> None:
+        ...
+
 class MessageBroker:
     """Central message broker for handling inter-agent communication."""
     
@@ -1,10 +1,27 @@
 """Protocol definitions for inter-agent communication."""
 
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Sequence, Tuple, Union, Any
 from enum import Enum
 import json
 import datetime
+import struct
+
+import numpy as np
+
+# Encodings a peer can ask for, in order of preference
+SUPPORTED_ENCODINGS = ("binary", "json")
+
+# Binary messages start with bytes that cannot start a JSON text:
+# magic, format version, length of the JSON header
+_BINARY_MAGIC = b"\x93FRM"
+_BINARY_VERSION = 1
+_BINARY_PREFIX = struct.Struct("<4sBI")
+# Numeric lists shorter than this stay in the JSON header
+_MIN_ARRAY_LENGTH = 16
+_ARRAY_KEY = "__array__"
+# wraps payload dicts that use one of the reserved keys themselves
+_DICT_KEY = "__dict__"
 
 class MessageType(Enum):
     """Types of messages that can be exchanged between agents."""
@@ -35,31 +52,176 @@ class Message:
     payload: Optional[Dict[str, Any]] = None
     error: Optional[Dict[str, Any]] = None
 
-    def to_json(self) -> str:
-        """Convert message to JSON string."""
-        return json.dumps({
+    def _to_dict(self, payload: Any, error: Any) -> Dict[str, Any]:
+        return {
             "message_type": self.message_type.value,
             "sender": self.sender,
             "timestamp": self.timestamp.isoformat(),
             "message_id": self.message_id,
             "correlation_id": self.correlation_id,
-            "payload": self.payload,
-            "error": self.error
-        })
+            "payload": payload,
+            "error": error
+        }
 
     @classmethod
-    def from_json(cls, json_str: str) -> 'Message':
-        """Create message from JSON string."""
-        data = json.loads(json_str)
+    def _from_dict(cls, data: Dict[str, Any], payload: Any, error: Any) -> 'Message':
         return cls(
             message_type=MessageType(data["message_type"]),
             sender=data["sender"],
             timestamp=datetime.datetime.fromisoformat(data["timestamp"]),
             message_id=data["message_id"],
             correlation_id=data.get("correlation_id"),
-            payload=data.get("payload"),
-            error=data.get("error")
+            payload=payload,
+            error=error
+        )
+
+    def to_json(self) -> str:
+        """Convert message to JSON string. NumPy arrays become lists."""
+        return json.dumps(self._to_dict(self.payload, self.error), default=_json_default)
+
+    @classmethod
+    def from_json(cls, json_str: str) -> 'Message':
+        """Create message from JSON string."""
+        data = json.loads(json_str)
+        return cls._from_dict(data, data.get("payload"), data.get("error"))
+
+    def to_binary(self) -> bytes:
+        """Convert message to the compact binary encoding.
+
+        Numeric lists of at least 16 elements and NumPy arrays in the payload
+        and error are stored as raw little-endian buffers after a JSON header
+        holding everything else. Numeric lists come back as lists, of floats
+        if any element was a float; arrays come back as arrays
+        of the same shape, 0-d and empty ones included.
+        """
+        arrays: List[Tuple[np.ndarray, bool]] = []
+        header = self._to_dict(
+            _extract_arrays(self.payload, arrays), _extract_arrays(self.error, arrays)
         )
+        header["arrays"] = [
+            {"dtype": array.dtype.str, "shape": array.shape, "list": is_list}
+            for array, is_list in arrays
+        ]
+        header_bytes = json.dumps(header, default=_json_default).encode()
+        return b"".join([
+            _BINARY_PREFIX.pack(_BINARY_MAGIC, _BINARY_VERSION, len(header_bytes)),
+            header_bytes,
+            *(_raw_bytes(array) for array, _ in arrays)
+        ])
+
+    @classmethod
+    def from_binary(cls, data: bytes) -> 'Message':
+        """Create message from the binary encoding."""
+        magic, version, header_length = _BINARY_PREFIX.unpack_from(data)
+        if magic != _BINARY_MAGIC or version != _BINARY_VERSION:
+            raise ValueError("Not a binary message of a supported version")
+        offset = _BINARY_PREFIX.size + header_length
+        header = json.loads(bytes(data[_BINARY_PREFIX.size:offset]))
+
+        arrays = []
+        for spec in header["arrays"]:
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += count * dtype.itemsize
+            array = array.reshape(spec["shape"])
+            arrays.append(array.tolist() if spec["list"] else array.copy())
+
+        return cls._from_dict(
+            header,
+            _restore_arrays(header.get("payload"), arrays),
+            _restore_arrays(header.get("error"), arrays)
+        )
+
+    def to_bytes(self, encoding: str = "binary") -> bytes:
+        """Convert message to bytes in one of the ``SUPPORTED_ENCODINGS``."""
+        if encoding == "binary":
+            return self.to_binary()
+        if encoding == "json":
+            return self.to_json().encode()
+        raise ValueError(f"Unsupported encoding: {encoding}")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Message':
+        """Create message from bytes in any of the ``SUPPORTED_ENCODINGS``."""
+        if detect_encoding(data) == "binary":
+            return cls.from_binary(data)
+        return cls.from_json(bytes(data).decode())
+
+
+def detect_encoding(data: bytes) -> str:
+    """Tell which of the ``SUPPORTED_ENCODINGS`` a message was encoded with."""
+    return "binary" if data[:len(_BINARY_MAGIC)] == _BINARY_MAGIC else "json"
+
+
+def negotiate_encoding(
+    preferred: Sequence[str],
+    accepted: Sequence[str]
+) -> str:
+    """Pick the first of the ``preferred`` encodings that a peer ``accepted``.
+
+    Falls back to JSON, which every peer understands.
+    """
+    for encoding in preferred:
+        if encoding in accepted and encoding in SUPPORTED_ENCODINGS:
+            return encoding
+    return "json"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _extract_arrays(value: Any, arrays: List[Tuple[np.ndarray, bool]]) -> Any:
+    """Replace numeric arrays and long numeric lists by placeholders."""
+    if isinstance(value, dict):
+        items = {key: _extract_arrays(item, arrays) for key, item in value.items()}
+        if _ARRAY_KEY in value or _DICT_KEY in value:
+            return {_DICT_KEY: items}
+        return items
+    if isinstance(value, np.ndarray) and value.dtype.kind in "biuf":
+        # astype keeps the shape, ascontiguousarray would make 0-d arrays 1-d
+        array = value.astype(value.dtype.newbyteorder("<"), order="C", copy=False)
+        arrays.append((array, False))
+        return {_ARRAY_KEY: len(arrays) - 1}
+    if isinstance(value, (list, tuple)):
+        first = value[0] if len(value) >= _MIN_ARRAY_LENGTH else None
+        if isinstance(first, (int, float)) and not isinstance(first, bool):
+            try:
+                array = np.asarray(value)
+            except (ValueError, OverflowError):
+                array = None
+            # ints beyond int64, strings or ragged lists are left to JSON
+            if array is not None and array.ndim == 1 and array.dtype.kind in "if":
+                arrays.append((array.astype(array.dtype.newbyteorder("<"), copy=False), True))
+                return {_ARRAY_KEY: len(arrays) - 1}
+        return [_extract_arrays(item, arrays) for item in value]
+    return value
+
+
+def _raw_bytes(array: np.ndarray) -> Union[memoryview, bytes]:
+    """The buffer of a C-contiguous array, without copying it."""
+    if array.size == 0:
+        # memoryview cannot cast views with zeros in their shape
+        return b""
+    return memoryview(array.reshape(-1)).cast("B")
+
+
+def _restore_arrays(value: Any, arrays: List[Any]) -> Any:
+    """Put the decoded arrays back in place of their placeholders."""
+    if isinstance(value, dict):
+        if len(value) == 1 and _ARRAY_KEY in value:
+            return arrays[value[_ARRAY_KEY]]
+        if len(value) == 1 and _DICT_KEY in value:
+            value = value[_DICT_KEY]
+        return {key: _restore_arrays(item, arrays) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_restore_arrays(item, arrays) for item in value]
+    return value
 
 def create_error_message(
     error_code: ErrorCode,
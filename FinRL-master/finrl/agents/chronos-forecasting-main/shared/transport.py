@@ -0,0 +1,355 @@
+"""Unix socket transport for running agents in separate processes.
+
+A ``BrokerServer`` process routes messages between ``RemoteBroker`` clients,
+one per agent process. ``RemoteBroker`` implements the same ``broker.Broker``
+interface as ``MessageBroker``, so an agent moves out of process by being
+given a ``RemoteBroker`` instead of the global ``broker``.
+
+Each subscribing connection gets a bounded queue on the server. When a
+queue is full, the server either stops reading from the publisher until
+there is room again (``overflow="block"``), which slows the publisher
+down through socket flow control, or drops the oldest queued message of
+that subscriber (``overflow="drop_oldest"``), which keeps publishers and
+other subscribers at full speed.
+
+Frames are a 4-byte big-endian body length, a 1-byte kind and the body.
+Publish frames carry the message type before the message itself, so the
+server routes them without decoding the message.
+
+On connecting, a client sends the message encodings it accepts (see
+``protocols.SUPPORTED_ENCODINGS``) and the server replies with its own;
+the client then publishes in the first of its encodings that the server
+accepts. Clients that do not say are sent JSON, and the server converts
+a message only for subscribers that do not accept its encoding.
+"""
+
+import asyncio
+import json
+import struct
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+import logging
+
+from .protocols import (
+    Message,
+    MessageType,
+    SUPPORTED_ENCODINGS,
+    detect_encoding,
+    negotiate_encoding,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = "/tmp/finrl-agents.sock"
+
+_HEADER = struct.Struct(">IB")
+_PUBLISH = 0
+_SUBSCRIBE = 1
+_UNSUBSCRIBE = 2
+_HELLO = 3
+_OVERFLOW_POLICIES = ("block", "drop_oldest")
+HELLO_TIMEOUT = 1.0
+
+
+def _encode_frame(kind: int, body: bytes) -> bytes:
+    return _HEADER.pack(len(body), kind) + body
+
+
+def _encode_publish(topic: str, data: bytes) -> bytes:
+    topic_bytes = topic.encode()
+    return _encode_frame(_PUBLISH, bytes([len(topic_bytes)]) + topic_bytes + data)
+
+
+def _encode_hello(encodings: Sequence[str]) -> bytes:
+    return _encode_frame(_HELLO, json.dumps(list(encodings)).encode())
+
+
+def _split_publish(body: bytes) -> Tuple[str, bytes]:
+    """Split a publish body into the message type value and the message."""
+    topic_end = 1 + body[0]
+    return body[1:topic_end].decode(), body[topic_end:]
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    length, kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+class _Subscription:
+    """Server-side state of one connection: its topics and outgoing queue."""
+
+    def __init__(self, name: str, writer: asyncio.StreamWriter, queue_size: int):
+        self.name = name
+        self.writer = writer
+        self.topics: Set[str] = set()
+        # clients that do not send a hello only understand JSON
+        self.encodings: List[str] = ["json"]
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.delivered = 0
+        self.dropped = 0
+        self.task = asyncio.ensure_future(self._send_loop())
+
+    async def _send_loop(self) -> None:
+        # write everything queued so far in one go, then wait for the socket
+        while True:
+            frames = [await self.queue.get()]
+            while not self.queue.empty():
+                frames.append(self.queue.get_nowait())
+            self.writer.write(b"".join(frames))
+            await self.writer.drain()
+            self.delivered += len(frames)
+
+
+class BrokerServer:
+    """Routes messages between ``RemoteBroker`` clients over a Unix socket."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_SOCKET_PATH,
+        queue_size: int = 1024,
+        overflow: str = "block"
+    ):
+        if overflow not in _OVERFLOW_POLICIES:
+            raise ValueError(
+                f"overflow must be one of {_OVERFLOW_POLICIES}, got {overflow!r}"
+            )
+        self.path = path
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self._subscriptions: Dict[str, _Subscription] = {}
+        self._handlers: Set[asyncio.Task] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connection_count = 0
+
+    async def start(self) -> None:
+        """Start listening on the socket."""
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection, path=self.path
+        )
+
+    async def serve_forever(self) -> None:
+        """Start listening if needed, and serve until cancelled."""
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stop listening and disconnect all clients."""
+        if self._server is not None:
+            self._server.close()
+        # the handlers close their sockets and wait for them to be closed;
+        # cancelling also ends those blocked on a full queue
+        for handler in list(self._handlers):
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Delivered, dropped and queued message counts per connection."""
+        return {
+            name: {
+                "delivered": s.delivered,
+                "dropped": s.dropped,
+                "queued": s.queue.qsize(),
+            }
+            for name, s in self._subscriptions.items()
+        }
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        self._connection_count += 1
+        name = f"connection-{self._connection_count}"
+        subscription = _Subscription(name, writer, self.queue_size)
+        self._subscriptions[name] = subscription
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                kind, body = await _read_frame(reader)
+                if kind == _PUBLISH:
+                    await self._route(*_split_publish(body))
+                elif kind == _HELLO:
+                    subscription.encodings = [
+                        e for e in json.loads(body) if e in SUPPORTED_ENCODINGS
+                    ] or ["json"]
+                    subscription.queue.put_nowait(_encode_hello(SUPPORTED_ENCODINGS))
+                elif kind == _SUBSCRIBE:
+                    subscription.topics.add(body.decode())
+                elif kind == _UNSUBSCRIBE:
+                    subscription.topics.discard(body.decode())
+                else:
+                    logger.error(f"Unknown frame kind {kind} from {name}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._subscriptions.pop(name, None)
+            self._handlers.discard(asyncio.current_task())
+            subscription.task.cancel()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _route(self, topic: str, data: bytes) -> None:
+        # the publish frame of the message in each encoding, converted once
+        frames: Dict[str, bytes] = {}
+        encoding = detect_encoding(data)
+        frames[encoding] = _encode_publish(topic, data)
+        message: Optional[Message] = None
+
+        for subscription in list(self._subscriptions.values()):
+            if topic not in subscription.topics:
+                continue
+            if encoding in subscription.encodings:
+                frame = frames[encoding]
+            else:
+                target = subscription.encodings[0]
+                if target not in frames:
+                    if message is None:
+                        message = Message.from_bytes(data)
+                    frames[target] = _encode_publish(topic, message.to_bytes(target))
+                frame = frames[target]
+            queue = subscription.queue
+            if not queue.full():
+                queue.put_nowait(frame)
+            elif self.overflow == "drop_oldest":
+                queue.get_nowait()
+                queue.put_nowait(frame)
+                subscription.dropped += 1
+            else:
+                await queue.put(frame)
+
+
+class RemoteBroker:
+    """A ``broker.Broker`` whose subscribers may live in other processes.
+
+    Messages are delivered to the local callbacks one at a time, in the
+    order the server sent them. A slow callback therefore slows down the
+    reading of this connection, and the server applies its overflow
+    policy to it rather than to other subscribers.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_SOCKET_PATH,
+        encodings: Sequence[str] = SUPPORTED_ENCODINGS
+    ):
+        self.path = path
+        self.encodings = list(encodings)
+        # until the server has said otherwise
+        self.encoding = "json"
+        self._subscribers: Dict[MessageType, Set[Callable[[Message], Awaitable[None]]]] = {
+            msg_type: set() for msg_type in MessageType
+        }
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        """Connect, agree on an encoding and send the current subscriptions."""
+        self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+        self._writer.write(_encode_hello(self.encodings))
+        try:
+            kind, body = await asyncio.wait_for(
+                _read_frame(self._reader), HELLO_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            kind, body = None, b""
+        if kind == _HELLO:
+            self.encoding = negotiate_encoding(self.encodings, json.loads(body))
+        else:
+            logger.warning("The broker server did not negotiate; sending JSON")
+            self.encoding = "json"
+
+        for msg_type, callbacks in self._subscribers.items():
+            if callbacks:
+                self._send_control(_SUBSCRIBE, msg_type)
+        await self._writer.drain()
+        self._read_task = asyncio.ensure_future(self._read_loop())
+
+    async def close(self) -> None:
+        """Send the pending messages, then disconnect from the server."""
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._writer = None
+
+    async def publish(self, message: Message) -> None:
+        """Publish a message, waiting while the server applies backpressure."""
+        if self._writer is None:
+            raise RuntimeError("RemoteBroker is not connected")
+        self._writer.write(_encode_publish(
+            message.message_type.value, message.to_bytes(self.encoding)
+        ))
+        await self._writer.drain()
+
+    def subscribe(
+        self,
+        message_type: MessageType,
+        callback: Callable[[Message], Awaitable[None]]
+    ) -> None:
+        """Subscribe to messages of a specific type."""
+        callbacks = self._subscribers[message_type]
+        if not callbacks and self._writer is not None:
+            self._send_control(_SUBSCRIBE, message_type)
+        callbacks.add(callback)
+
+    def unsubscribe(
+        self,
+        message_type: MessageType,
+        callback: Callable[[Message], Awaitable[None]]
+    ) -> None:
+        """Unsubscribe from messages of a specific type."""
+        callbacks = self._subscribers[message_type]
+        callbacks.discard(callback)
+        if not callbacks and self._writer is not None:
+            self._send_control(_UNSUBSCRIBE, message_type)
+
+    def _send_control(self, kind: int, message_type: MessageType) -> None:
+        self._writer.write(_encode_frame(kind, message_type.value.encode()))
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                kind, body = await _read_frame(self._reader)
+                if kind != _PUBLISH:
+                    continue
+                message = Message.from_bytes(_split_publish(body)[1])
+                subscribers = self._subscribers[message.message_type]
+                results = await asyncio.gather(
+                    *(subscriber(message) for subscriber in subscribers),
+                    return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(f"Error handling message: {str(result)}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.info("Disconnected from the broker server")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run a broker server: ``python -m shared.transport --path ...``."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--path", default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--queue-size", type=int, default=1024)
+    parser.add_argument("--overflow", choices=_OVERFLOW_POLICIES, default="block")
+    args = parser.parse_args(argv)
+
+    server = BrokerServer(args.path, args.queue_size, args.overflow)
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
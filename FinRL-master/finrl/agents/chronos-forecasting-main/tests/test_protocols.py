@@ -0,0 +1,131 @@
+"""Round trips of messages through the JSON and binary encodings."""
+
+import datetime
+
+import numpy as np
+import pytest
+
+from shared.protocols import (
+    Message,
+    MessageType,
+    SUPPORTED_ENCODINGS,
+    detect_encoding,
+    negotiate_encoding,
+)
+
+
+def make_message(payload=None, error=None):
+    return Message(
+        message_type=MessageType.DATA_RESPONSE,
+        sender="data_agent",
+        timestamp=datetime.datetime(2024, 1, 2, 3, 4, 5),
+        message_id="message-1",
+        correlation_id="request-1",
+        payload=payload,
+        error=error,
+    )
+
+
+def binary_round_trip(payload=None, error=None):
+    message = make_message(payload, error)
+    decoded = Message.from_bytes(message.to_bytes("binary"))
+    assert decoded.message_type == message.message_type
+    assert decoded.timestamp == message.timestamp
+    assert decoded.correlation_id == message.correlation_id
+    return decoded
+
+
+@pytest.mark.parametrize(
+    "array",
+    [
+        np.array(3.0),
+        np.array(7, dtype=np.int16),
+        np.zeros((2, 0)),
+        np.zeros(0, dtype=np.int64),
+        np.arange(12, dtype=">f8").reshape(3, 4),
+        np.arange(12, dtype=">i4").reshape(3, 4),
+        np.asfortranarray(np.arange(12.0).reshape(3, 4)),
+        np.arange(12.0)[::3],
+        np.array([True, False, True]),
+    ],
+)
+def test_binary_round_trip_keeps_arrays(array):
+    decoded = binary_round_trip({"values": array})
+    values = decoded.payload["values"]
+    assert isinstance(values, np.ndarray)
+    assert values.shape == array.shape
+    assert values.dtype == array.dtype.newbyteorder("=")
+    np.testing.assert_array_equal(values, array)
+
+
+def test_binary_round_trip_nested_payload():
+    prices = list(np.linspace(100, 120, 20))
+    payload = {
+        "symbols": ["AAPL", "GOOGL"],
+        "series": [
+            {"symbol": "AAPL", "close": prices, "volume": list(range(20))},
+            {"symbol": "GOOGL", "close": np.arange(20.0), "short": [1.5, 2.5]},
+        ],
+        "meta": {"window": 20, "empty": [], "matrix": np.eye(3, dtype=np.float32)},
+    }
+    error = {"code": "partial", "missing": list(range(30))}
+    decoded = binary_round_trip(payload, error)
+
+    series = decoded.payload["series"]
+    assert decoded.payload["symbols"] == ["AAPL", "GOOGL"]
+    assert series[0]["close"] == prices
+    assert series[0]["volume"] == list(range(20))
+    assert all(isinstance(v, int) for v in series[0]["volume"])
+    np.testing.assert_array_equal(series[1]["close"], np.arange(20.0))
+    assert series[1]["short"] == [1.5, 2.5]
+    assert decoded.payload["meta"]["window"] == 20
+    assert decoded.payload["meta"]["empty"] == []
+    np.testing.assert_array_equal(decoded.payload["meta"]["matrix"], np.eye(3))
+    assert decoded.error == error
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"__array__": 0},
+        {"__array__": 5, "other": 1},
+        {"__dict__": {"__array__": 0}},
+        {"nested": [{"__array__": np.arange(3.0)}], "__dict__": None},
+    ],
+)
+def test_binary_round_trip_keeps_reserved_keys(payload):
+    decoded = binary_round_trip(payload)
+    assert decoded.payload.keys() == payload.keys()
+    np.testing.assert_equal(decoded.payload, payload)
+
+
+def test_json_round_trip_turns_arrays_into_lists():
+    message = make_message({"values": np.arange(4.0), "scalar": np.float32(1.5)})
+    data = message.to_bytes("json")
+    assert detect_encoding(data) == "json"
+    decoded = Message.from_bytes(data)
+    assert decoded.payload == {"values": [0.0, 1.0, 2.0, 3.0], "scalar": 1.5}
+
+
+def test_encodings_are_detected():
+    message = make_message({"values": list(range(20))})
+    assert detect_encoding(message.to_bytes("binary")) == "binary"
+    assert detect_encoding(message.to_bytes("json")) == "json"
+    with pytest.raises(ValueError):
+        message.to_bytes("msgpack")
+
+
+@pytest.mark.parametrize(
+    "preferred, accepted, expected",
+    [
+        (SUPPORTED_ENCODINGS, SUPPORTED_ENCODINGS, "binary"),
+        (["json", "binary"], SUPPORTED_ENCODINGS, "json"),
+        (SUPPORTED_ENCODINGS, ["json"], "json"),
+        (["binary"], ["json"], "json"),
+        (["msgpack", "binary"], ["msgpack", "binary"], "binary"),
+        (["msgpack"], ["msgpack"], "json"),
+        ([], SUPPORTED_ENCODINGS, "json"),
+    ],
+)
+def test_negotiate_encoding(preferred, accepted, expected):
+    assert negotiate_encoding(preferred, accepted) == expected
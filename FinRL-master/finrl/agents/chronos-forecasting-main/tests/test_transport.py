@@ -0,0 +1,228 @@
+"""Brokering between ``RemoteBroker`` clients over a Unix socket."""
+
+import asyncio
+import datetime
+import itertools
+
+import numpy as np
+import pytest
+
+from shared.protocols import Message, MessageType
+from shared.transport import BrokerServer, RemoteBroker
+
+TIMEOUT = 5.0
+_message_ids = itertools.count()
+
+
+def make_message(message_type, payload=None, correlation_id=None, size=0):
+    if size:
+        payload = {**(payload or {}), "values": np.zeros(size)}
+    return Message(
+        message_type=message_type,
+        sender="test",
+        timestamp=datetime.datetime.now(),
+        message_id=f"{message_type.value}-{next(_message_ids)}",
+        correlation_id=correlation_id,
+        payload=payload,
+    )
+
+
+async def wait_until(condition):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), TIMEOUT)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "broker.sock")
+
+
+def test_request_response_correlation(path):
+    async def scenario():
+        server = BrokerServer(path)
+        await server.start()
+        requester = RemoteBroker(path)
+        # a JSON-only responder makes the server convert between encodings
+        responder = RemoteBroker(path, encodings=["json"])
+
+        async def respond(request):
+            await responder.publish(make_message(
+                MessageType.DATA_RESPONSE,
+                {"echo": request.payload["n"]},
+                correlation_id=request.message_id,
+            ))
+
+        pending = {}
+
+        async def collect(response):
+            pending[response.correlation_id].set_result(response)
+
+        responder.subscribe(MessageType.DATA_REQUEST, respond)
+        requester.subscribe(MessageType.DATA_RESPONSE, collect)
+        await responder.connect()
+        await requester.connect()
+        assert requester.encoding == "binary"
+        assert responder.encoding == "json"
+
+        requests = [
+            Message(
+                message_type=MessageType.DATA_REQUEST,
+                sender="requester",
+                timestamp=datetime.datetime.now(),
+                message_id=f"request-{n}",
+                payload={"n": n},
+            )
+            for n in range(10)
+        ]
+        loop = asyncio.get_running_loop()
+        for request in requests:
+            pending[request.message_id] = loop.create_future()
+            await requester.publish(request)
+        responses = await asyncio.wait_for(
+            asyncio.gather(*pending.values()), TIMEOUT
+        )
+
+        for request, response in zip(requests, responses):
+            assert response.correlation_id == request.message_id
+            assert response.payload["echo"] == request.payload["n"]
+
+        await requester.close()
+        await responder.close()
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+async def flood(path, overflow, queue_size, count):
+    """Publish ``count`` large messages to a subscriber that does not read.
+
+    Returns the server, the publishing task, the received messages and
+    the event that lets the subscriber read again.
+    """
+    server = BrokerServer(path, queue_size=queue_size, overflow=overflow)
+    await server.start()
+    received = []
+    release = asyncio.Event()
+
+    async def slow(message):
+        await release.wait()
+        received.append(message.payload["n"])
+
+    subscriber = RemoteBroker(path)
+    subscriber.subscribe(MessageType.ACTION_REQUEST, slow)
+    await subscriber.connect()
+    publisher = RemoteBroker(path)
+    await publisher.connect()
+
+    async def publish_all():
+        for n in range(count):
+            await publisher.publish(make_message(
+                MessageType.ACTION_REQUEST, {"n": n}, size=12_500
+            ))
+
+    task = asyncio.ensure_future(publish_all())
+    return server, task, received, release, (subscriber, publisher)
+
+
+def queue_stats(server):
+    return [s for s in server.stats().values() if s["queued"] or s["dropped"]]
+
+
+def test_block_policy_holds_back_the_publisher(path):
+    async def scenario():
+        server, task, received, release, clients = await flood(
+            path, "block", queue_size=4, count=200
+        )
+        # the subscriber's queue fills, then the server stops reading the
+        # publisher and the publisher's socket buffers fill up
+        await wait_until(lambda: any(
+            s["queued"] == 4 for s in server.stats().values()
+        ))
+        await asyncio.sleep(0.2)
+        assert not task.done()
+        stats = queue_stats(server)
+        assert [s["queued"] for s in stats] == [4]
+        assert stats[0]["dropped"] == 0
+
+        release.set()
+        await asyncio.wait_for(task, TIMEOUT)
+        await wait_until(lambda: len(received) == 200)
+        assert received == list(range(200))
+        assert all(s["queued"] <= 4 for s in server.stats().values())
+
+        for client in clients:
+            await client.close()
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_drop_oldest_policy_keeps_the_publisher_going(path):
+    async def scenario():
+        server, task, received, release, clients = await flood(
+            path, "drop_oldest", queue_size=4, count=200
+        )
+        await asyncio.wait_for(task, TIMEOUT)
+        await wait_until(lambda: any(
+            s["dropped"] and s["queued"] == 4 for s in server.stats().values()
+        ))
+        stats = queue_stats(server)
+        assert len(stats) == 1
+        assert stats[0]["queued"] == 4
+        assert stats[0]["dropped"] > 0
+
+        release.set()
+        # whatever got through arrives in order and ends with the newest
+        await wait_until(lambda: received and received[-1] == 199)
+        assert received == sorted(received)
+        assert len(received) + stats[0]["dropped"] == 200
+
+        for client in clients:
+            await client.close()
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        BrokerServer(overflow="drop_newest")
+
+
+def test_subscriber_disconnect(path):
+    async def scenario():
+        server = BrokerServer(path)
+        await server.start()
+        received = {"stays": [], "leaves": []}
+
+        def recorder(name):
+            async def record(message):
+                received[name].append(message.payload["n"])
+            return record
+
+        stays, leaves = RemoteBroker(path), RemoteBroker(path)
+        stays.subscribe(MessageType.STRATEGY_REQUEST, recorder("stays"))
+        leaves.subscribe(MessageType.STRATEGY_REQUEST, recorder("leaves"))
+        publisher = RemoteBroker(path)
+        for client in (stays, leaves, publisher):
+            await client.connect()
+        assert len(server.stats()) == 3
+
+        await publisher.publish(make_message(MessageType.STRATEGY_REQUEST, {"n": 0}))
+        await wait_until(lambda: received["leaves"] == [0])
+        await leaves.close()
+        await wait_until(lambda: len(server.stats()) == 2)
+
+        await publisher.publish(make_message(MessageType.STRATEGY_REQUEST, {"n": 1}))
+        await wait_until(lambda: received["stays"] == [0, 1])
+        assert received["leaves"] == [0]
+
+        # closing the server disconnects the remaining clients
+        await asyncio.wait_for(server.close(), TIMEOUT)
+        assert server.stats() == {}
+        await stays.close()
+        await publisher.close()
+
+    asyncio.run(scenario())
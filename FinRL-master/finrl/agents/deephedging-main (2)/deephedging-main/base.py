@@ -336,45 +336,75 @@ def mean_cum_bins( x : np.ndarray, bins : int, weights = None ) -> np.ndarray:
     if bins == 1:
         return w_mean(x,weights,l)
 
+    # cumulative sums over the bins, computed from one sum per bin
     ixs  = np.linspace(0,l,bins+1, endpoint=True, dtype=np.int32)
-    bins = np.array( [ w_mean(x,weights,ixs[i+1]) for i in range(bins) ] )
-    return bins
+    if weights is None:
+        return np.cumsum( np.add.reduceat( x, ixs[:-1], dtype=np.float64 ) ) / ixs[1:]
+    return np.cumsum( np.add.reduceat( x*weights, ixs[:-1], dtype=np.float64 ) ) / np.cumsum( np.add.reduceat( weights, ixs[:-1], dtype=np.float64 ) )
+
+PERCT_EXP_ELEMENTS = 2**22   # maximum number of elements sorted at a time by perct_exp()
+
+def _first_k( x : np.ndarray, xs : np.ndarray, k : int ) -> np.ndarray:
+    """ Returns a mask of the first 'k' elements of each row of 'x' in the order of np.argsort(x, kind='stable'), given the sorted rows 'xs' """
+    if k <= 0:
+        return np.zeros( x.shape, dtype=bool )
+    t    = xs[:,k-1:k]
+    less = x < t
+    eq   = x == t
+    if np.all( np.sum( eq, axis=1 ) <= 1 ):
+        return less | eq
+    # split ties at the k'th element in the order of the samples
+    return less | ( eq & ( np.cumsum( eq, axis=1 ) <= k - np.sum( less, axis=1, keepdims=True ) ) )
 
 def perct_exp( x : np.ndarray, lo : float, hi : float, weights : np.ndarray = None ) -> np.ndarray:
     """
     Compute the expectation over a percentile i.e. it will sort x and then compute np.mean( x[:len*lo] ) and np.mean( x[hi*len:] ).
     If a matrix instead of vector is given it will assume that the first dim is the sample dimension.
+    
+    Only the values of x are sorted. With weights, the samples below and above the percentiles are selected by comparing
+    with the respective order statistics, where ties are split as np.argsort(x, kind='stable') would.
+    Matrices are processed in blocks of columns with at most PERCT_EXP_ELEMENTS elements.
         
     Parameters
     ----------
-        x  : array
-        lo : lower percentile [0,1]
-        hi : higher percentile [0,1]
-        weights: sample weights or 1/n
+        x : vector or matrix
+        lo : float
+        hi : float
+        weights : vector, optional
         
     Returns
     -------
         If x is a vector, the function returns a 2-dimensional vector.
-        If x is a matrix of second dimension n2, then the function returns a matrix of dimension [2,n2].
+        If x is a matrix of second dimension n2, then the function returns a matrix of dimension [n2,2].
     """    
     lo   = float(lo)
     hi   = float(hi)
     assert lo >= 0. and lo <= 1., "Percentiles must be betwee 0 and 1, not %g" % lo
     assert hi >= 0. and hi <= 1., "Percentiles must be betwee 0 and 1, not %g" % hi
+    x    = np.asarray(x)
+    assert len(x.shape) in [1,2], "Can only handle matrices or vectors"
     
-    if len(x.shape) == 2:
-        return np.array( [ perct_exp( x[:,i], lo=lo, hi=hi, weights=weights ) for i in range(x.shape[1]) ] )
-    assert len(x.shape) == 1, "Can only handle matrices or vectors"
+    n       = x.shape[0]
+    ixLo    = min( math.ceil(  n * lo ), n-1 )
+    ixHi    = max( math.floor( n * hi ), 0 )
+    x2      = x[:,np.newaxis] if len(x.shape) == 1 else x
+    result  = np.empty( (x2.shape[1],2) )
+    chunk   = max( 1, PERCT_EXP_ELEMENTS // max(n,1) )
+    w64     = np.asarray( weights, dtype=np.float64 ) if not weights is None else None
     
-    ixLo    = min( math.ceil(  x.shape[0] * lo ), x.shape[0]-1 )
-    ixHi    = max( math.floor( x.shape[0] * hi ), 0 )
-    ixs     = np.argsort(x)
-    x       = x[ixs]
-    weights = weights[ixs] if not weights is None else None
-        
-    return  np.array( [ np.sum( (weights*x)[:ixLo] ) / np.sum( weights[:ixLo] ) if not weights is None else np.mean( x[:ixLo] ), \
-                        np.sum( (weights*x)[ixHi:] ) / np.sum( weights[ixHi:] ) if not weights is None else np.mean( x[ixHi:] ) ] )
-               
+    for j in range(0, x2.shape[1], chunk):
+        xT = np.ascontiguousarray( x2[:,j:j+chunk].T )      # sorting contiguous rows is much faster than sorting columns
+        xs = np.sort( xT, axis=1 )
+        if weights is None:
+            result[j:j+chunk,0] = np.mean( xs[:,:ixLo], axis=1, dtype=np.float64 )
+            result[j:j+chunk,1] = np.mean( xs[:,ixHi:], axis=1, dtype=np.float64 )
+        else:
+            mlo  = _first_k( xT, xs, ixLo )
+            mhi  = ~_first_k( xT, xs, ixHi )
+            result[j:j+chunk,0] = ( ( xT * mlo ) @ w64 ) / ( mlo @ w64 )
+            result[j:j+chunk,1] = ( ( xT * mhi ) @ w64 ) / ( mhi @ w64 )
+    return result[0] if len(x.shape) == 1 else result
+
 # -------------------------------------------------
 # Generic basicsassert 
 # -------------------------------------------------
@@ -84,6 +84,38 @@ class Strip(object):
         gamma = ( fup - 2*f + fdn ) / (dx**2)
         return delta, gamma
 
+def _fd_inputs( spots, times, cn_factor ) -> tuple:
+    """ Validates the inputs of bs_fd() and bs_fd_batch(). Returns spots as a list per time step, times, and cn_factor as float """
+    if isinstance( spots, np.ndarray ):
+        if len(spots.shape) == 1:
+            spots = [spots]*len(times)
+        else:
+            _log.verify( len(spots.shape) == 2, "'spots': if a numpy array is provied, it must have dimension 1 or 2. Found %ld dimensions", len(spots.shape) )
+            n     = spots.shape[1]
+            spots = [ np_unique_tol( spots[:,t], tol=1E-8, is_sorted=False ) for t in range(n) ]
+    
+    # basics
+    nSteps   = len(spots)-1
+    times    = np.asarray( times )
+    _log.verify( times.shape == (nSteps+1,), "'times': must have shape %s, found shape %s", (nSteps+1,), times.shape)
+    if isinstance(cn_factor, str):
+        if cn_factor == "implicit":
+            cn_factor = 0.
+        elif cn_factor == "explicit":
+            cn_factor = 1.
+        else:
+            _log.throw("Unknown 'cn_factor' '%s'. Must be 'implicit', 'explicit', or a Crank-Nicolson factor.", cn_factor)
+    else:
+        cn_factor = float(cn_factor)
+        _log.verify( cn_factor >= 0. and cn_factor <= 1., "'cn_factor' must be from [0,1]. Found %g", cn_factor )
+    return spots, times, cn_factor
+
+def _interp_rows( x : np.ndarray, xp : np.ndarray, F : np.ndarray ) -> np.ndarray:
+    """ Returns np.interp( x, xp, F[i] ) for all rows 'i' of 'F' """
+    j = np.clip( np.searchsorted( xp, x, side='right' ), 1, len(xp)-1 )
+    w = np.clip( ( x - xp[j-1] ) / ( xp[j] - xp[j-1] ), 0., 1. )
+    return F[:,j-1] * (1.-w) + F[:,j] * w
+
 def bs_fd( *, spots : list, times : np.array, payoff, vol : float = 0.2, cn_factor = "implicit" ) -> list:
     """
     Finite difference solver for American and Barrier options wuth simple Black & Scholes
@@ -141,28 +173,8 @@ def bs_fd( *, spots : list, times : np.array, payoff, vol : float = 0.2, cn_fact
                 -   f(km) (wu + wd)
 
     """
-    if isinstance( spots, np.ndarray ):
-        if len(spots.shape) == 1:
-            spots = [spots]*len(times)
-        else:
-            _log.verify( len(spots.shape) == 2, "'spots': if a numpy array is provied, it must have dimension 1 or 2. Found %ld dimensions", len(spots.shape) )
-            n     = spots.shape[1]
-            spots = [ np_unique_tol( spots[:,t], tol=1E-8, is_sorted=False ) for t in range(n) ]
-    
-    # basics
+    spots, times, cn_factor = _fd_inputs( spots, times, cn_factor )
     nSteps   = len(spots)-1
-    times    = np.asarray( times )
-    _log.verify( times.shape == (nSteps+1,), "'times': must have shape %s, found shape %s", (nSteps+1,), times.shape)
-    if isinstance(cn_factor, str):
-        if cn_factor == "implicit":
-            cn_factor = 0.
-        elif cn_factor == "explicit":
-            cn_factor = 1.
-        else:
-            _log.throw("Unknown 'cn_factor' '%s'. Must be 'implicit', 'explicit', or a Crank-Nicolson factor.", cn_factor)
-    else:
-        cn_factor = float(cn_factor)
-        _log.verify( cn_factor >= 0. and cn_factor <= 1., "'cn_factor' must be from [0,1]. Found %g", cn_factor )
     
     # compute terminal value
     X          = np.asarray( spots[-1] )
@@ -207,6 +219,8 @@ def bs_fd( *, spots : list, times : np.array, payoff, vol : float = 0.2, cn_fact
             # formally it assumes that the outer derivative equals the inner
             # derivative and therefore that the value of F does not change.
             # That is correct if F is far out enough to be linear.
+            # 'F' is referenced by the Strip of the previous step, hence we do not write into it.
+            F        = np.array( F, dtype=np.float64 )
             F[1:-1]  = xi__u * F[2:] + xi__d * F[:-2] + xi1_m * F[1:-1]
 
         # implicit
@@ -257,3 +271,105 @@ def bs_fd( *, spots : list, times : np.array, payoff, vol : float = 0.2, cn_fact
     # return final functional value and 
     output.reverse()                        
     return output
+
+def bs_fd_batch( *, spots : list, times : np.array, payoff, vols, cn_factor = "implicit" ) -> list:
+    """
+    Batched version of bs_fd() for a stack of volatilities and payoffs on the same spot grids.
+    At each time step the tridiagonal systems of all batch members are solved with one call to
+    scipy.linalg.solve_banded: their matrices are stacked into one block diagonal banded matrix,
+    which works because the boundary rows of each system do not refer to their neighbours.
+    
+    Parameters
+    ----------
+        spots[nSteps+1]  : list of spots per time step, shared by all batch members. See bs_fd().
+        times[nSteps+1]  : times
+        payoff           : either a function payoff(X, F, t) which computes new values F[nBatch,nSpots] for spots X at time t for all batch members at once.
+                           'F' represents the current values with shape [nBatch,nSpots] and is None at maturity. The function may return values which broadcast to [nBatch,nSpots].
+                           Or a list of nBatch functions as used for bs_fd(), one per batch member.
+        vols[nBatch]     : BS vol per batch member. A single vol is used for all members.
+        cn_factor        : crank-nicolson factor. 0 for fully implicit, 1 for fully explicit
+                           you can also use 'implicit' or 'explicit'
+                           
+    Returns
+    -------
+        paths
+            list of nBatch paths as returned by bs_fd(), i.e. paths[i][t] is the Strip of batch member 'i' at times[t].
+            The Strips of all members at the same time share the same 'X'.
+    """
+    spots, times, cn_factor = _fd_inputs( spots, times, cn_factor )
+    nSteps   = len(spots)-1
+    vols     = np.asarray( vols, dtype=np.float64 ).reshape((-1,))
+    if callable( payoff ):
+        nBatch = len(vols)
+    else:
+        nBatch = len(payoff)
+        _log.verify( len(vols) in [1,nBatch], "'vols' must have one entry, or one per payoff (%ld). Found %ld", nBatch, len(vols) )
+    vols     = np.broadcast_to( vols, (nBatch,) )
+    
+    def apply_payoff( X, F, t ):
+        if callable( payoff ):
+            F = payoff( X=X, F=F, t=t )
+        else:
+            F = [ payoff_i( X=X, F=None if F is None else F[i], t=t ) for i, payoff_i in enumerate(payoff) ]
+        return np.array( np.broadcast_to( F, (nBatch,len(X)) ), dtype=np.float64 )
+    
+    # compute terminal value
+    X        = np.asarray( spots[-1] )
+    F        = apply_payoff( X, None, times[-1] )
+    output   = [ [ Strip(F=F[i], X=X, t=times[-1]) ] for i in range(nBatch) ]
+
+    for t in range(nSteps-1,-1,-1):
+        _log.verify( len(X) >= 3, "spots[%ld] must be at least of length 3. Found %ld", t+1, len(X) )
+        _log.verify( np.min(X[1:]-X[:-1]) > 1E-10, "spots[%ld] must be increasing", t+1 )
+        dt     = times[t+1] - times[t]
+            
+        # compute transition operators; see bs_fd()
+        # the grid terms are shared, 'xi' has one row per batch member
+        ku     = X[2:]
+        km     = X[1:-1]
+        kd     = X[:-2]
+        dku    = ku - km
+        dkd    = km - kd
+        w_u    = 2. / ( dku * ( ku - kd ) )
+        w_d    = 2. / ( dkd * ( ku - kd ) )
+        varXdt = np.exp( vols * vols * dt ) - 1.
+        xi     = 0.5 * (km**2)[np.newaxis,:] * varXdt[:,np.newaxis]
+        xi_u   = w_u * xi
+        xi_d   = w_d * xi
+        
+        # explicit
+        # F of the previous step is referenced by 'output', hence we do not write into it
+        if cn_factor > 0.:
+            xi1_m       = 1. - ( xi_u + xi_d ) * cn_factor
+            F_          = F.copy()
+            F_[:,1:-1]  = cn_factor * xi_u * F[:,2:] + cn_factor * xi_d * F[:,:-2] + xi1_m * F[:,1:-1]
+            F           = F_
+            
+        # implicit
+        # MI[:,i,:] is the banded matrix of batch member 'i'. Its entries MI[0,i,:2] and MI[2,i,-2:]
+        # are zero, hence the concatenated bands describe a block diagonal matrix.
+        if cn_factor < 1.:
+            MI           = np.zeros((3,nBatch,len(X)))
+            MI[1]        = 1.
+            MI[1,:,1:-1] = 1. + (xi_u + xi_d ) * (1. - cn_factor)
+            MI[0,:,2:]   = - xi_u * (1. - cn_factor)
+            MI[2,:,:-2]  = - xi_d * (1. - cn_factor)
+            F            = linalg.solve_banded( (1,1), MI.reshape((3,-1)), F.reshape((-1,)) ).reshape((nBatch,len(X)))
+
+        # interpolate to next spots
+        X_   = np.asarray( spots[t] )
+        if len(X) != len(X_) or np.max( np.abs(X-X_) ) > 1E-8:
+            _log.verify_warn( X_[0] >= X[0]-1E-8, "spots[%ld][0] must not be less than spots[%ld][0]. Found %g and %g, respectively", t,t+1,X_[0],X[0] )
+            _log.verify_warn( X_[-1] <= X[-1]+1E-8, "spots[%ld][-1] must not be greater than spots[%ld][-1]. Found %g and %g, respectively", t,t+1,X_[-1],X[-1] )
+            F    = _interp_rows( X_, X, F )
+        X    = X_
+
+        # compute exercise and/or barrier 
+        F      = apply_payoff( X, F, times[t] )
+        assert np.isfinite(F).all(), "'f' is not finite: %s" % F
+        for i in range(nBatch):
+            output[i].append( Strip(F=F[i], X=X, t=times[t]) )
+    
+    for path in output:
+        path.reverse()
+    return output
@@ -451,3 +451,231 @@ def oce_utility( utility : str, lmbda : float, X : np.ndarray, sample_weights :
                 verbose = 0)
 
     return -np.mean(model(X))
+
+# -------------------------------------------------------------------------
+# Vectorized OCE solver
+# -------------------------------------------------------------------------
+
+OCE_BATCH_ELEMENTS = 2**22    # maximum number of lambda x sample elements held in memory at a time
+
+def _np_utility( utility : str, lmbda : np.ndarray, gains : np.ndarray, with_u : bool = True ) -> tuple:
+    """
+    Numpy version of tf_utility() for y=0 which also returns the second derivative.
+    Returns u(gains), u'(gains), u''(gains); u is None if 'with_u' is False. 'lmbda' must broadcast against 'gains'.
+    """
+    if utility == "quad":
+        x0 = 1./lmbda
+        xx = np.minimum( 0., gains-x0 )
+        u  = - 0.5 * lmbda * (xx**2) + 0.5 * lmbda * (x0**2) if with_u else None
+        d  = - lmbda * xx
+        dd = np.where( gains < x0, -lmbda, 0. )
+    elif utility == "exp2":
+        g1  = np.maximum(gains,0.)
+        g2  = np.minimum(gains,0.)
+        eg1 = np.exp( - lmbda * g1)
+        u   = np.where( gains > 0., (1. - eg1 ) / lmbda, g2 - 0.5 * lmbda * g2 * g2 ) if with_u else None
+        d   = np.where( gains > 0., eg1, 1. - lmbda * g2 )
+        dd  = np.where( gains > 0., -lmbda * eg1, -lmbda )
+    elif utility == "vicky":
+        lg  = lmbda * gains
+        s   = np.sqrt( 1. + lg ** 2 )
+        u   = (1. + lg - s) / lmbda if with_u else None
+        d   = 1. - lg / s
+        dd  = - lmbda / (s ** 3)
+    else:
+        _log.throw( "Utility '%s' has no numpy implementation. Use one of %s", utility, fmt_list( ['quad', 'exp2', 'vicky'] ) )
+    return u, d, dd
+
+def _oce_exp( X : np.ndarray, P : np.ndarray, lmbdas : np.ndarray ) -> np.ndarray:
+    """ -log E[ exp(-lambda X) ] / lambda for all 'lmbdas', shifted by min(X) to avoid overflows """
+    inf    = np.min(X)
+    result = np.empty_like( lmbdas )
+    chunk  = max( 1, OCE_BATCH_ELEMENTS // len(X) )
+    for i in range(0, len(lmbdas), chunk):
+        lm   = lmbdas[i:i+chunk,np.newaxis]
+        expX = np.exp( - lm * ( X[np.newaxis,:] - inf ) )
+        eexp = expX @ P if not P is None else np.mean( expX, axis=1 )
+        result[i:i+chunk] = inf - np.log( eexp ) / lm[:,0]
+    return result
+
+def _oce_cvar( X : np.ndarray, P : np.ndarray, lmbdas : np.ndarray ) -> np.ndarray:
+    """ CVaR at percentiles 1/(1+lambda) for all 'lmbdas' from one sort of 'X'. Follows the definitions in oce_utility() """
+    p = 1./(1. + lmbdas)
+    if P is None:
+        # mean of the samples not above the percentile, as in oce_utility()
+        pcnt  = np.percentile( X, p*100. )
+        X     = np.sort( X )
+        ix    = np.searchsorted( X, pcnt, side='right' )
+        return np.cumsum( X )[ix-1] / ix
+    
+    ixs       = np.argsort(X)
+    X         = X[ixs]
+    P         = P[ixs]
+    cumP      = np.cumsum(P)
+    assert abs(cumP[-1]-1.)<1E-4, "Internal error: cumsum(P)[-1]-1 = %g" % (cumP[-1]-1.)
+    cumP_     = cumP.copy()
+    cumP_[-1] = 1.
+    ix        = np.clip( np.searchsorted( cumP_, p ), 0, len(X)-1 )
+    return np.where( p <= cumP_[0], X[0], np.cumsum( P * X )[ix] / cumP[ix] )
+
+def _newton( h_dh, lo : np.ndarray, hi : np.ndarray, y : np.ndarray, tol : float, max_iter : int ) -> tuple:
+    """
+    Solves h(y) = 0 for a vector of decreasing functions 'h' with Newton steps. 'h_dh(act, y)' returns h and h' of the entries 'act' at 'y'.
+    The solutions must lie in the brackets [lo,hi]. Steps which leave the current bracket are replaced by bisection.
+    Returns the solutions and the indices of the entries which did not converge.
+    """
+    act = np.arange( len(y) )
+    for _ in range(max_iter):
+        h, dh    = h_dh( act, y[act] )
+        lo[act]  = np.where( h > 0., y[act], lo[act] )
+        hi[act]  = np.where( h > 0., hi[act], y[act] )
+        with np.errstate( divide='ignore', invalid='ignore' ):
+            y_   = y[act] - h / dh
+        bisect   = ~np.isfinite( y_ ) | ( y_ < lo[act] ) | ( y_ > hi[act] )
+        y_       = np.where( bisect, 0.5 * ( lo[act] + hi[act] ), y_ )
+        eps      = tol * ( 1. + np.abs( y[act] ) )
+        done     = ( np.abs( y_ - y[act] ) <= eps ) | ( hi[act] - lo[act] <= eps ) | ( h == 0. )
+        y[act]   = y_
+        act      = act[~done]
+        if len(act) == 0:
+            break
+    return y, act
+
+def _oce_newton( utility : str, X : np.ndarray, P : np.ndarray, lmbdas : np.ndarray, tol : float, max_iter : int ) -> np.ndarray:
+    """
+    Solves the first order condition E[ u'(X+y) ] = 1 for the OCE intercept 'y' of all 'lmbdas' with Newton steps,
+    evaluating u' and u'' over all samples at each step.
+    The intercepts remain in the bracket [-max(X), -min(X)], which contains the solution for any concave 'u' with u'(0) = 1.
+    """
+    expectation = ( lambda A : A @ P ) if not P is None else ( lambda A : np.mean( A, axis=1 ) )
+    result      = np.empty_like( lmbdas )
+    chunk       = max( 1, OCE_BATCH_ELEMENTS // len(X) )
+    mean        = X @ P if not P is None else np.mean(X)
+    for i in range(0, len(lmbdas), chunk):
+        lm   = lmbdas[i:i+chunk]
+        def h_dh( act, y ):
+            _, d, dd = _np_utility( utility, lm[act,np.newaxis], X[np.newaxis,:] + y[:,np.newaxis], with_u=False )
+            return expectation( d ) - 1., expectation( dd )
+        lo      = np.full( lm.shape, -np.max(X) )
+        hi      = np.full( lm.shape, -np.min(X) )
+        y, act  = _newton( h_dh, lo, hi, np.clip( np.full( lm.shape, -mean ), lo, hi ), tol=tol, max_iter=max_iter )
+        if len(act) > 0: _log.error( "Failed to find optimal intercept 'y' for utility %s for %ld risk aversions, e.g. %g", utility, len(act), lm[act[0]] )
+        u, _, _ = _np_utility( utility, lm[:,np.newaxis], X[np.newaxis,:] + y[:,np.newaxis] )
+        result[i:i+chunk] = expectation( u ) - y
+    return result
+
+def _log_tail_sums( X : np.ndarray, P : np.ndarray, lmbda : float ) -> np.ndarray:
+    """ Returns L[k] = log sum_{j>=k} P[j] exp(-lmbda X[j]) for sorted 'X' and k=0...n, with L[n] = -inf """
+    c = 0.5 * ( X[0] + X[-1] )
+    with np.errstate( divide='ignore' ):
+        if lmbda * ( X[-1] - X[0] ) < 1400.:
+            # exponents are within +-700 after shifting by 'c'
+            L = np.log( np.cumsum( ( P * np.exp( - lmbda * ( X - c ) ) )[::-1] )[::-1] ) - lmbda * c
+        else:
+            L = np.logaddexp.accumulate( ( np.log( P ) - lmbda * X )[::-1] )[::-1]
+    return np.append( L, -np.inf )
+
+def _oce_sorted( utility : str, X : np.ndarray, P : np.ndarray, lmbdas : np.ndarray, tol : float, max_iter : int ) -> np.ndarray:
+    """
+    Solves the first order condition for the OCE intercept 'y' of 'quad' and 'exp2' with Newton steps for all 'lmbdas'.
+    Both utilities are quadratic in the gains on one side of a kink, at 'x0' for quad and at 0 for exp2.
+    Above the kink, 'quad' is constant and 'exp2' is exponential.
+    With the samples sorted once, E[u'(X+y)] and E[u''(X+y)] then follow from cumulative sums of P and P X below the kink,
+    and for 'exp2' from the tail sums of P exp(-lambda X), which are computed once per lambda.
+    Each Newton step hence only requires a binary search for the kink.
+    The utility itself is evaluated over all samples at the solution, which avoids cancellation for small 'lmbdas'.
+    """
+    n    = len(X)
+    P    = np.full( (n,), 1./float(n) ) if P is None else P
+    ixs  = np.argsort( X )
+    X    = X[ixs]
+    P    = P[ixs]
+    C0   = np.append( 0., np.cumsum( P ) )        # C0[k] = sum_{j<k} P[j]
+    C1   = np.append( 0., np.cumsum( P * X ) )
+    result = np.empty_like( lmbdas )
+    chunk  = max( 1, OCE_BATCH_ELEMENTS // n )
+    
+    for i in range(0, len(lmbdas), chunk):
+        lm    = lmbdas[i:i+chunk]
+        if utility == "quad":
+            # u'(g) = 1 - lambda g for g < 1/lambda, else 0
+            def h_dh( act, y ):
+                k  = np.searchsorted( X, 1./lm[act] - y, side='left' )
+                return C0[k] - lm[act] * ( C1[k] + y * C0[k] ) - 1., - lm[act] * C0[k]
+        else:
+            # u'(g) = 1 - lambda g for g <= 0, else exp(-lambda g)
+            L  = np.array( [ _log_tail_sums( X, P, l ) for l in lm ] )
+            def h_dh( act, y ):
+                k  = np.searchsorted( X, -y, side='right' )
+                e  = np.exp( L[act,k] - lm[act] * y )                # E[exp(-lambda(X+y));X>-y] <= 1
+                return C0[k] - lm[act] * ( C1[k] + y * C0[k] ) + e - 1., - lm[act] * ( C0[k] + e )
+            
+        lo      = np.full( lm.shape, -X[-1] )
+        hi      = np.full( lm.shape, -X[0] )
+        y, act  = _newton( h_dh, lo, hi, np.clip( np.full( lm.shape, -C1[-1]/C0[-1] ), lo, hi ), tol=tol, max_iter=max_iter )
+        if len(act) > 0: _log.error( "Failed to find optimal intercept 'y' for utility %s for %ld risk aversions, e.g. %g", utility, len(act), lm[act[0]] )
+        u, _, _ = _np_utility( utility, lm[:,np.newaxis], X[np.newaxis,:] + y[:,np.newaxis] )
+        result[i:i+chunk] = u @ P - y
+    return result
+
+def oce_utility_batch( utility : str, lmbdas, X : np.ndarray, sample_weights : np.ndarray = None, tol : float = 1E-10, max_iter : int = 100 ) -> np.ndarray:
+    """
+    Vectorized OCE utility calculation for many payoffs and risk aversions at once.
+    Computes the same values as oce_utility() with method=None:
+        mean, exp   : closed forms
+        cvar        : closed form from one sort of each payoff for all risk aversions
+        quad, exp2  : the first order condition for the intercept is solved with safeguarded Newton steps for all risk aversions together,
+                      using cumulative sums over the sorted samples
+        vicky       : as above, but evaluating the derivatives over all samples at each Newton step
+    Computations are in float64. Risk aversions are processed in chunks with at most OCE_BATCH_ELEMENTS elements in memory.
+    
+    Parameters
+    ----------
+        utility:
+            Name of the utility function, see MonetaryUtility.UTILITIES
+        lmbdas:
+            Vector of risk aversions
+        X:
+            Vector of samples of one payoff, or matrix [nPayoffs,nSamples]
+        sample_weights:
+            Sample weights of the samples, shared by all payoffs, or None for 1/n
+        tol, max_iter:
+            Relative tolerance and maximum number of Newton steps for the intercept
+            
+    Returns
+    -------
+        Utilities of shape [nLmbdas] if 'X' is a vector, or [nPayoffs,nLmbdas]
+    """
+    utility  = str(utility)
+    lmbdas   = np.asarray( lmbdas, dtype=np.float64 ).reshape((-1,))
+    X        = np.asarray( X, dtype=np.float64 )
+    vector   = len(X.shape) == 1
+    X        = X[np.newaxis,:] if vector else X
+    _log.verify( len(X.shape) == 2, "'X' must be a vector or a matrix, found shape %s", X.shape )
+    _log.verify( np.all( lmbdas >= 0. ), "Risk aversion 'lmbdas' cannot be negative. Found %g", np.min(lmbdas) )
+    _log.verify( utility in MonetaryUtility.UTILITIES + ["expectation", "entropy"], "Unknown utility function '%s'. Use one of %s", utility, fmt_list( MonetaryUtility.UTILITIES ) )
+    
+    P = None
+    if not sample_weights is None:
+        P = np.asarray( sample_weights, dtype=np.float64 )
+        P = P[:,0] if len(P.shape) == 2 and P.shape[1] == 1 else P
+        _log.verify( P.shape == (X.shape[1],), "'sample_weights' must be a vector of length %ld. Found shape %s", X.shape[1], P.shape )
+        P = P / np.sum( P )
+
+    # zero risk aversion => mean, c.f. tf_utility()
+    is_mean = np.full( lmbdas.shape, utility in ["mean", "expectation"] ) | ( lmbdas < 1E-12 )
+    lm      = lmbdas[~is_mean]
+    result  = np.empty( (len(X), len(lmbdas)) )
+    for i, x in enumerate(X):
+        result[i,is_mean] = x @ P if not P is None else np.mean(x)
+        if len(lm) == 0:
+            continue
+        if utility in ["exp", "entropy"]:
+            result[i,~is_mean] = _oce_exp( x, P, lm )
+        elif utility == "cvar":
+            result[i,~is_mean] = _oce_cvar( x, P, lm )
+        elif utility in ["quad", "exp2"]:
+            result[i,~is_mean] = _oce_sorted( utility, x, P, lm, tol=tol, max_iter=max_iter )
+        else:
+            result[i,~is_mean] = _oce_newton( utility, x, P, lm, tol=tol, max_iter=max_iter )
+    return result[0] if vector else result
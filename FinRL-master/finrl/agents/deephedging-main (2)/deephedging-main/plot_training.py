@@ -238,6 +238,7 @@ class Plot_Returns_By_Spot_Ret(object): # NOQA
         gains    = gains[ixs]
         hedge    = hedge[ixs]
         payoff   = payoff[ixs]
+        P        = P[ixs]
         x                  = mean_bins( x, bins=self.bins, weights=P, return_std=False )
         gains, gains_std   = mean_bins( gains, bins=self.bins, weights=P, return_std=True )
         hedge, hedge_std   = mean_bins( hedge, bins=self.bins, weights=P, return_std=True )
@@ -289,10 +290,15 @@ class Plot_Utility_By_CumPercentile(object): # NOQA
         # percentiles
         # -----------
         bins     = min(self.bins, len(utility))      
-        utility  = np.sort(utility)
-        utility0 = np.sort(utility0)
-        utility  = mean_cum_bins(utility, bins=self.bins, weights=P )
-        utility0 = mean_cum_bins(utility0, bins=self.bins, weights=P  )
+        if np.all( P == P[0] ):
+            # equal weights: sorting the values suffices
+            utility  = mean_cum_bins(np.sort(utility), bins=self.bins, weights=P )
+            utility0 = mean_cum_bins(np.sort(utility0), bins=self.bins, weights=P )
+        else:
+            ixs      = np.argsort(utility)
+            ixs0     = np.argsort(utility0)
+            utility  = mean_cum_bins(utility[ixs], bins=self.bins, weights=P[ixs] )
+            utility0 = mean_cum_bins(utility0[ixs0], bins=self.bins, weights=P[ixs0] )
         x        = np.linspace(0.,1.,bins, endpoint=True)
         
         if self.line is None:
@@ -359,10 +365,11 @@ class Plot_Activity_By_Spot_and_Time(object): # NOQA
             x     = spot_all[:,t] / spot_all[:,0] - 1.
             ixs   = np.argsort( x )
             x     = x[ixs]
-            x     = mean_bins( x, bins=self.bins, weights=P )
+            P_t   = P[ixs]
+            x     = mean_bins( x, bins=self.bins, weights=P_t )
 
             act_t,\
-            std_t = mean_bins( actions[:,t][ixs], bins=self.bins, weights=P, return_std=True )
+            std_t = mean_bins( actions[:,t][ixs], bins=self.bins, weights=P_t, return_std=True )
             r     = 2. * (1. - float(t+1) / float(actions.shape[1]))
             c1    = max(min(r-1.,1.0),0.)
             c2    = max(min(r,1.0),0.) 
@@ -9,9 +9,10 @@ June 30, 2022
 """
 
 #from .base import Logger, npCast, fmt_seconds, mean, err, tf, mean_bins, mean_cum_bins, perct_exp, Int, Float, fmt_big_number, fmt_list
-from .base import Logger, Config, tf, Int, Float, mean, err, npCast, fmt_list, fmt_big_number, fmt_seconds, fmt_now, create_optimizer, TF_VERSION#NOQA
+from .base import Logger, Config, tf, tf_dict, Int, Float, mean, err, npCast, fmt_list, fmt_big_number, fmt_seconds, fmt_now, create_optimizer, TF_VERSION#NOQA
 from .plot_training import Plotter
 from .gym import VanillaDeepHedgingGym
+from .world import WorldBlocks
 from cdxbasics.prettydict import PrettyDict as pdct
 from cdxbasics.util import uniqueHash
 from cdxbasics.config import Config
@@ -38,6 +39,43 @@ class TrainingInfo(object):
         self.num_weights  = num_weights  # number of trainable weights
         assert self.output_level in ['quiet', 'text', 'all'], "Invalid 'output_level': should be 'quiet', 'text', or 'all'. Found %s" % output_level
 
+class EvaluationSet(object):
+    """
+    Fixed random subsample of a world on which the gym is evaluated after each epoch.
+    Provides the members of a world which are used by the Monitor and the Plotter.
+    The sample weights of the subsample are normalized to one, hence the std errors
+    computed with them are those of the subsample.
+    For a WorldBlocks, the samples are chosen from its first block.
+    """
+    
+    def __init__(self, world, samples : int = None, seed : int = 0 ):
+        """
+        Parameters
+        ----------
+            world : world or WorldBlocks
+            samples : int
+                Number of samples. If None, or if the world has no more samples, use the whole world.
+            seed : int
+                Seed for choosing the samples
+        """
+        self.unique_id  = world.unique_id
+        world           = world.block(0) if isinstance( world, WorldBlocks ) else world
+        self.inst_names = world.inst_names
+        if samples is None or samples >= world.nSamples:
+            self.tf_data        = world.tf_data
+            self.sample_weights = world.sample_weights
+            self.details        = world.details
+            self.nSamples       = world.nSamples
+            return
+        _log.verify( samples > 0, "'samples' must be positive; found %ld", samples )
+        
+        # sorted, as worlds may be sorted by spot
+        ixs                 = np.sort( np.random.default_rng(seed).choice( world.nSamples, size=samples, replace=False ) )
+        self.tf_data        = tf_dict( dtype=world.tf_dtype, **world.np_data( ixs ) )
+        self.sample_weights = world.sample_weights[ixs] / np.sum( world.sample_weights[ixs] )
+        self.details        = pdct( { k: v[ixs] for k, v in world.details.items() } )
+        self.nSamples       = samples
+
 class TrainingProgressData(object):
     """
     Class to keep track of data for printing progress during training
@@ -87,11 +125,23 @@ class TrainingProgressData(object):
         """ Returns the current epoch. Returns -1 if no epoch was yet recorded """
         return len(self.times)-1
 
-    def on_epoch_end( self, *, gym, world, val_world, loop_epoch, time_epoch, batch_loss ):
-        """ Update data set with the latest results """
+    def on_epoch_end( self, *, gym, world, val_world, loop_epoch, time_epoch, batch_loss, evaluate = True ):
+        """
+        Update data set with the latest results
+        If 'evaluate' is False, the gym is not evaluated and the losses and utilities of the last evaluated epoch are repeated.
+        """
+        self.times.append( time_epoch )
+        if not evaluate and self.epoch > 0:
+            self.losses.batch.append( batch_loss )
+            for d in [ self.losses, self.losses_err, self.utilities ]:
+                for k in d:
+                    if k != 'batch':
+                        d[k].append( d[k][-1] )
+            self._record_memory()
+            return
+
         self.training_result = npCast( gym(world.tf_data) )
         self.val_result      = npCast( gym(val_world.tf_data) )
-        self.times.append( time_epoch )
 
         # losses
         # Note that we apply world.sample_weights to all calculations
@@ -117,7 +167,10 @@ class TrainingProgressData(object):
             self.best_weights      = gym.get_weights()
             self.best_epoch        = self.epoch
             
-        # memory usage
+        self._record_memory()
+
+    def _record_memory(self):
+        """ Record memory usage """
         p = psutil.Process()
         with p.oneshot():
             self.process.memory_rss.append( p.memory_info().rss / (1024.*1024.))
@@ -158,19 +211,26 @@ class Monitor(tf.keras.callbacks.Callback):
         self.cache_mode       = config.caching("mode", CacheMode.ON, CacheMode.MODES, "Caching strategy: %s" % CacheMode.HELP)
         self.cache_freq       = config.caching("epoch_freq", 10, Int>0, "How often to cache results, in number of epochs")
         cache_file_name       = config.caching("debug_file_name", None, help="Allows overwriting the filename for debugging an explicit cached state")
+        eval_samples          = config.evaluation("samples", None, help="Number of samples of the training and of the validation set used to compute losses and utilities after each epoch. Use None for all samples")
+        self.eval_freq        = config.evaluation("epoch_freq", 1, Int>0, "How often to compute losses and utilities, in number of epochs. The first and the last epoch are always evaluated")
+        eval_seed             = config.evaluation("seed", 1234, int, "Seed for choosing the samples used to compute losses and utilities")
+        self.eval_world       = EvaluationSet( world, eval_samples, eval_seed )
+        self.eval_val_world   = EvaluationSet( val_world, eval_samples, eval_seed+1 )
         self.no_graphics      = training_info.output_level != 'all'
         self.print_text       = training_info.output_level != 'quiet'
         self.plotter          = remote_plotter
         if self.plotter is None and training_info.output_level != 'quiet':
-            self.plotter      = Plotter(world, val_world, training_info.output_level == 'all', config.visual)
+            self.plotter      = Plotter(self.eval_world, self.eval_val_world, training_info.output_level == 'all', config.visual)
         else:
             config.visual.mark_done()
         config.done()
                 
+        if result0 is None or self.eval_world.nSamples < world.nSamples:
+            result0           = npCast( gym(self.eval_world.tf_data) )
         self.progress_data    = TrainingProgressData(    
                                         gym            = gym, 
-                                        world          = world, 
-                                        val_world      = val_world,
+                                        world          = self.eval_world, 
+                                        val_world      = self.eval_val_world,
                                         result0        = result0
                                         )
         
@@ -242,13 +302,15 @@ class Monitor(tf.keras.callbacks.Callback):
             if self.print_text: print("\r\33[2K "+empty+"\r", end='')
         
         time_now = time.time()
+        epoch    = self.progress_data.epoch+1
         self.progress_data.on_epoch_end( 
                                 gym        = self.gym, 
-                                world      = self.world, 
-                                val_world  = self.val_world,
+                                world      = self.eval_world, 
+                                val_world  = self.eval_val_world,
                                 loop_epoch = loop_epoch,
                                 time_epoch = time_now - self.time_start,
                                 batch_loss = float( logs['loss_default_loss'] ), # we read the metric instead of 'loss' as this appears to be weighted properly
+                                evaluate   = (epoch+1) % self.eval_freq == 0 or epoch+1 >= self.training_info.epochs
                                 )
         assert self.progress_data.epoch >= 0, "Internal error"
         self.time_start = time_now
@@ -286,7 +348,7 @@ class Monitor(tf.keras.callbacks.Callback):
             cached_msg = " State of training until epoch %ld cached into %s\n" % (self.cache_last_epoch+1, self.full_cache_file)
 
         # restore best weights
-        self.progress_data.set_best_weights( gym=self.gym, world=self.world, val_world=self.val_world )
+        self.progress_data.set_best_weights( gym=self.gym, world=self.eval_world, val_world=self.eval_val_world )
 
         # upgrade plot
         if not self.plotter is None:
@@ -332,7 +394,8 @@ def train(  gym,
     Parameters
     ----------
         gym       : VanillaDeepHedgingGym or similar interface
-        world     : world with training data
+        world     : world with training data, or a WorldBlocks.
+                    A WorldBlocks is always streamed, i.e. its blocks are generated while training.
         val_world : world with validation data (e.g. computed using world.clone())
         config    : configuration
 
@@ -357,6 +420,8 @@ def train(  gym,
     run_eagerly      = config.train("run_eagerly", False, help="Keras model run_eagerly. Turn to True for debugging. This slows down training. Use None for default.")
     learning_rate    = config.train("learing_rate", None, help="Manually set the learning rate of the optimizer")
     tf_verbose       = config.train("tf_verbose", 0, Int>=0, "Verbosity for TensorFlow fit()")
+    stream           = config.train("stream", False, bool, help="Whether to stream batches of the training world into fit() instead of passing all of its samples as tensors. Use with 'evaluation.samples' to avoid creating tensors for the whole training world. Always True for a WorldBlocks")
+    prefetch         = config.train("prefetch", 2, Int>=0, help="Number of batches prepared in the background while training with 'stream'")
     optimzier        = create_optimizer(config.train)
     
     # tensorboard: have not been able to use it .. good luck.
@@ -368,7 +433,13 @@ def train(  gym,
     # -------
     
     t0               = time.time()
-    result0          = gym(world.tf_data)   # builds the model
+    stream           = stream or isinstance( world, WorldBlocks )
+    if stream:
+        dataset      = world.tf_dataset( batch_size=batch_size if not batch_size is None else 32 ).prefetch( prefetch )
+    # build the model on one sample: the Monitor computes the initial results on its evaluation set,
+    # which avoids a pass over the whole training world if 'evaluation.samples' is set
+    sample_world     = world.sample_world if isinstance( world, WorldBlocks ) else world
+    gym( tf_dict( dtype=sample_world.tf_dtype, **sample_world.np_data( np.arange(1) ) ) )
     gym.compile(    optimizer        = optimzier, 
                     loss             = dict( loss=default_loss ),
                     weighted_metrics = dict( loss=default_loss ),
@@ -390,7 +461,7 @@ def train(  gym,
     monitor          = Monitor( gym            = gym, 
                                 world          = world, 
                                 val_world      = val_world,
-                                result0        = result0, 
+                                result0        = None, 
                                 training_info  = training_info,
                                 remote_plotter = remote_plotter,
                                 config         = config,
@@ -424,7 +495,13 @@ def train(  gym,
 
         why_stopped = "Training complete"
         try:
-            gym.fit(        x              = world.tf_data,
+            if stream:
+                gym.fit(    x              = dataset,    # batches of ( data, y, sample_weights ) with sample_weights scaled as below
+                            epochs         = epochs - (monitor.current_epoch+1),
+                            callbacks      = monitor if tboard is None else [ monitor, tboard ],
+                            verbose        = tf_verbose )
+            else:
+                gym.fit(    x              = world.tf_data,
                             y              = world.tf_y,
                             batch_size     = batch_size,
                             sample_weight  = world.tf_sample_weights * float(world.nSamples),  # sample_weights are poorly handled in TF
@@ -10,13 +10,181 @@ June 30, 2022
 from deephedging.base import Logger, Config, dh_dtype, tf, tfCast, pdct, tf_dict, assert_iter_not_is_nan, DIM_DUMMY
 from cdxbasics.dynaplot import figure, colors_tableau
 from cdxbasics.util import uniqueHash
+from cdxbasics.subdir import SubDir, CacheMode
 from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import math as math
+import os as os
+import json as json
+import shutil as shutil
 #from tqdm import tqdm
-from scipy.stats import norm
+from scipy.signal import lfilter
+from scipy.special import ndtr
 _log = Logger(__file__)
 
+SIM_BLOCK_SIZE = 2048   # number of samples simulated at a time
+
+# =========================================================================================
+# Caching
+# =========================================================================================
+
+def _write_world_cache( path : str, arrays : dict ):
+    """
+    Write the numpy arrays in the nested dictionary 'arrays' into the directory 'path', one .npy file per array.
+    Arrays which appear several times are written once.
+    The directory is first written under a temporary name, so that readers never see a partial cache.
+    """
+    files   = {}   # id(array) -> file name
+    index   = []   # (key, file name)
+    tmp     = "%s.tmp%ld" % (path, os.getpid())
+    shutil.rmtree( tmp, ignore_errors=True )
+    os.makedirs( tmp )
+    
+    def write( prefix, d ):
+        for k, v in d.items():
+            key = prefix + [k]
+            if isinstance(v, Mapping):
+                write( key, v )
+                continue
+            if not id(v) in files:
+                files[id(v)] = "%ld.npy" % len(files)
+                np.save( os.path.join( tmp, files[id(v)] ), np.asarray(v) )
+            index.append( ( key, files[id(v)] ) )
+    write( [], arrays )
+    
+    with open( os.path.join( tmp, "index.json" ), "w" ) as f:
+        json.dump( index, f )
+    try:
+        os.rename( tmp, path )
+    except OSError:
+        # another process wrote the same cache first
+        shutil.rmtree( tmp, ignore_errors=True )
+
+def _read_world_cache( path : str ) -> dict:
+    """
+    Read a cache written with _write_world_cache() as a nested dictionary of read-only memory mapped arrays.
+    Returns None if there is no such cache.
+    """
+    try:
+        with open( os.path.join( path, "index.json" ), "r" ) as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    
+    arrays = {}    # file name -> array
+    result = pdct()
+    for key, file in index:
+        if not file in arrays:
+            arrays[file] = np.load( os.path.join( path, file ), mmap_mode="r" )
+        d = result
+        for k in key[:-1]:
+            d = d.setdefault( k, pdct() )
+        d[key[-1]] = arrays[file]
+    return result
+
+# =========================================================================================
+# Simulation
+# =========================================================================================
+
+def _ar1( a : float, x : np.ndarray ) -> np.ndarray:
+    """ Returns y with y[:,0] = x[:,0] and y[:,j] = a * y[:,j-1] + x[:,j] """
+    return lfilter( np.ones((1,), dtype=x.dtype), np.array( [1., -a], dtype=x.dtype ), x, axis=1 )
+
+def _simulate_spot_drift_vol( *, seed : int, nSamples : int, nTotal : int, nIvSteps : int, nSteps : int, dt : float,
+                                 drift : float, kappa_m : float, xi_m : float,
+                                 rvol_init : float, ivol_init : float, kappa_v : float, kappa_i : float, xi_v : float, xi_i : float,
+                                 rho_ms : float, rho_vs : float, rho_vi : float, rho_vs_r : float,
+                                 dtype, block_size : int = SIM_BLOCK_SIZE ):
+    """
+    Simulate the spot, drift and volatilities of SimpleWorld_Spot_ATM over 'nTotal' time points, and throw away the first 'nIvSteps'.
+    
+    The samples are simulated 'block_size' at a time, over the whole time axis at once:
+    log-vols and the drift are linear recursions in time, and the log-spot is a cumulative sum.
+    The cross-sectional normalization of spot and drift at each time step only shifts all samples by the same amount,
+    hence it is applied once all blocks were simulated.
+    The random numbers are drawn in the same order as when simulating all samples at once.
+    
+    Returns
+    -------
+        spot, rdrift, rvol, ivol : np.ndarray
+            spot of dimension [nSamples,nTotal-nIvSteps], and the others of dimension [nSamples,nSteps].
+            Samples are not sorted.
+    """
+    nKeep          = nTotal - nIvSteps
+    spot           = np.empty( (nSamples,nKeep), dtype=dtype )
+    rdrift         = np.full( (nSamples,nSteps), drift, dtype=dtype )
+    rvol           = np.full( (nSamples,nSteps), rvol_init, dtype=dtype )
+    ivol           = np.full( (nSamples,nSteps), ivol_init, dtype=dtype )
+    sum_spot       = np.zeros( (nKeep,) )
+    sum_drift      = np.zeros( (nSteps,) )
+    
+    sqrtDt         = math.sqrt(dt)
+    log_ivol_init  = math.log( ivol_init )
+    log_rvol_init  = math.log( rvol_init )
+    bStochDrift    = kappa_m != 0. or xi_m != 0.
+    bStochVol      = kappa_v != 0. or xi_v != 0.  or kappa_i != 0. or xi_i != 0.
+    rng            = np.random.RandomState( seed )
+    
+    for i0 in range(0,nSamples,block_size):
+        i1          = min( i0 + block_size, nSamples )
+        dW          = rng.normal(size=(i1-i0,nTotal-1,4)).astype( dtype ) * sqrtDt
+        dW_s        = dW[:,:,0]
+        x           = np.zeros( (i1-i0,nTotal), dtype=dtype )
+        
+        # vols
+        if bStochVol:
+            dW_v        = dW[:,:,0] * rho_vs + math.sqrt(1. - rho_vs**2) * dW[:,:,2]
+            dW_i        = dW[:,:,2] * rho_vi + math.sqrt(1. - rho_vi**2) * ( dW[:,:,0] * rho_vs_r + math.sqrt(1. - rho_vs_r**2) * dW[:,:,3] )
+            x[:,0]      = log_ivol_init
+            x[:,1:]     = kappa_i * log_ivol_init * dt + xi_i * dW_i - 0.5 * (xi_i ** 2) * dt
+            log_ivol    = _ar1( 1. - kappa_i * dt, x )
+            x[:,0]      = log_rvol_init
+            x[:,1:]     = kappa_v * log_ivol[:,:-1] * dt + xi_v * dW_v - 0.5 * (xi_v ** 2) * dt
+            b_rvol      = np.exp( _ar1( 1. - kappa_v * dt, x ) )
+            rvol[i0:i1] = b_rvol[:,nIvSteps:nIvSteps+nSteps]
+            ivol[i0:i1] = np.exp( log_ivol[:,nIvSteps:nIvSteps+nSteps] )
+        else:
+            b_rvol      = np.full( (i1-i0,nTotal), rvol_init, dtype=dtype )
+        
+        # drift
+        # 'mrdrift' is the stochastic drift before normalization to 'drift' on average
+        if bStochDrift:
+            dW_m        = dW[:,:,0] * rho_ms + math.sqrt(1. - rho_ms**2) * dW[:,:,1]
+            x[:,0]      = 0.
+            x[:,1:]     = xi_m * dW_m
+            mrdrift     = _ar1( 1. - kappa_m * dt, x )
+            rdrift[i0:i1] = mrdrift[:,nIvSteps:nIvSteps+nSteps]
+            sum_drift   += np.sum( np.exp( rdrift[i0:i1] * dt ), axis=0, dtype=np.float64 )
+        else:
+            mrdrift     = 0.
+        
+        # spot, before normalization
+        x[:,0]      = 0.
+        x[:,1:]     = mrdrift[:,:-1] * dt if bStochDrift else 0.
+        x[:,1:]     += b_rvol[:,:-1] * dW_s - 0.5 * (b_rvol[:,:-1] ** 2) * dt
+        b_spot      = np.exp( np.cumsum( x, axis=1 )[:,nIvSteps:] )
+        spot[i0:i1] = b_spot
+        sum_spot    += np.sum( b_spot, axis=0, dtype=np.float64 )
+    
+    # normalize spot to grow with 'drift' on average, and the stochastic drift to be 'drift' on average
+    # the initial spot is 1.
+    spot_scale     = math.exp( drift * dt ) * float(nSamples) / sum_spot
+    if nIvSteps == 0:
+        spot_scale[0] = 1.
+    spot_scale     = spot_scale.astype( dtype )
+    drift_shift    = ( drift - np.log( sum_drift / float(nSamples) ) / dt ).astype( dtype ) if bStochDrift else None
+    for i0 in range(0,nSamples,block_size):
+        i1          = min( i0 + block_size, nSamples )
+        spot[i0:i1] *= spot_scale
+        if bStochDrift:
+            rdrift[i0:i1] += drift_shift
+    return spot, rdrift, rvol, ivol
+
+# =========================================================================================
+# Worlds
+# =========================================================================================
+
 class SimpleWorld_Spot_ATM(object):
     """
     Simple World with one asset and one floating ATM option.
@@ -26,6 +194,8 @@ class SimpleWorld_Spot_ATM(object):
     * To use black & scholes mode use hard overwrite black_scholes = True
     * To turn off stochastic vol use no_stoch_vol = True
     * To turn off mean reverrsion of the drift set no_stoch_drift = True
+    * To store generated worlds on disk set caching.mode = 'on'. A world with the same config is
+      then read from 'caching.directory' as read-only memory mapped arrays instead of being simulated.
 
     Members
     -------
@@ -185,10 +355,26 @@ class SimpleWorld_Spot_ATM(object):
         _log.verify( abs(rho_vi) <= 1., "'rho_vi' must be between -1 and +1. Found %g", rho_vi )
         _log.verify( abs(rho_vs_r) <= 1., "'rho_vs_r' must be between -1 and +1. Found %g", rho_vs_r )
         
+        # caching
+        cache_dir  = config.caching("directory", "./.deephedging_cache", str, help="If specified, will use the directory to store generated worlds")
+        cache_mode = config.caching("mode", CacheMode.OFF, CacheMode.MODES, help="Caching strategy for generated worlds: %s" % CacheMode.HELP)
+        
         # close config
         config.done()
         self.usage_report = config.usage_report()
         self.input_report = config.input_report()
+        self.seed         = seed
+        self.clones       = 0
+
+        # -----------------------------
+        # unique_id
+        # -----------------------------
+        # Default handling for configs will ignore any function definitions, e.g. in this case 'payoff'.
+        # we therefore manually generate a sufficient hash.
+        # Caching does not change the world, hence its settings are ignored.
+        input_dict = config.input_dict()
+        input_dict.pop('caching', None)
+        self.unique_id = uniqueHash( [ input_dict, payoff_f, self.tf_dtype.name ],parse_functions = True )
         
         # black scholes
         if bs_mode:
@@ -206,8 +392,21 @@ class SimpleWorld_Spot_ATM(object):
             xi_v      = 0.
             xi_i      = 0.
 
+        # -----------------------------
+        # read cache
+        # -----------------------------
+        cache_mode = CacheMode( cache_mode )
+        cache_path = os.path.join( SubDir(cache_dir, "!").path, "world_" + self.unique_id ) if not cache_mode.is_off else None
+        if not cache_path is None and cache_mode.delete:
+            shutil.rmtree( cache_path, ignore_errors=True )
+        elif not cache_path is None and cache_mode.read:
+            cache = _read_world_cache( cache_path )
+            if not cache is None:
+                self.data, self.details = cache['data'], cache['details']
+                self._init_from_data( nSamples=nSamples, nSteps=nSteps, strike=strike, dt=dt )
+                return
+        
         # pre compute        
-        sqrtDt      = math.sqrt(dt)
         ttm_steps   = ttm_steps if strike > 0. else 1
         ttm         = ttm_steps * dt 
         sqrtTTM     = math.sqrt(ttm)
@@ -219,57 +418,28 @@ class SimpleWorld_Spot_ATM(object):
         
         # simulate
         # --------
-        # Not the most efficient simulator, but easier to read this way
         
-        np.random.seed(seed)
-        dW          = np.random.normal(size=(nSamples,nSteps+nIvSteps+ttm_steps-1,4)).astype( self.np_dtype ) * sqrtDt
-        dW_s        = dW[:,:,0]
-        dW_m        = dW[:,:,0] * rho_ms + math.sqrt(1. - rho_ms**2) * dW[:,:,1]
-        dW_v        = dW[:,:,0] * rho_vs + math.sqrt(1. - rho_vs**2) * dW[:,:,2]
-        dW_i        = dW[:,:,2] * rho_vi + math.sqrt(1. - rho_vi**2) * ( dW[:,:,0] * rho_vs_r + math.sqrt(1. - rho_vs_r**2) * dW[:,:,3] )
-
-        spot            = np.zeros((nSamples,nSteps+nIvSteps+ttm_steps), dtype=self.np_dtype)
-        rdrift          = np.full((nSamples,nSteps+nIvSteps+ttm_steps), drift, dtype=self.np_dtype)
-        rvol            = np.full((nSamples,nSteps+nIvSteps+ttm_steps), rvol_init, dtype=self.np_dtype)
-        ivol            = np.full((nSamples,nSteps+nIvSteps+ttm_steps), ivol_init, dtype=self.np_dtype)
-        
-        spot[:,0]       = 1.
-        log_ivol_init   = np.log( ivol_init )
-        log_rvol        = np.log( rvol_init )
-        log_ivol        = log_ivol_init
-        rvol[:,0]       = rvol_init
-        ivol[:,0]       = ivol_init
-        mrdrift         = 0. * dW_m[:,0]
-        expdriftdt      = np.exp( drift * dt )
-        bStochDrift     = kappa_m != 0. or xi_m != 0.
-        bStochVol       = kappa_v != 0. or xi_v != 0.  or kappa_i != 0. or xi_i != 0.
-        
-        for j in range(1,nSteps+nIvSteps+ttm_steps):
-            # spot
-            spot[:,j]      = spot[:,j-1] * np.exp( rdrift[:,j-1] * dt + rvol[:,j-1] * dW_s[:,j-1] - 0.5 * (rvol[:,j-1] ** 2) * dt )
-            spot[:,j]      *= expdriftdt / np.mean( spot[:,j] )
-
-            # drift
-            # we normalize the stochastic drift to 'drift' on average.
-            if bStochDrift:
-                mrdrift        = mrdrift - kappa_m * mrdrift * dt + xi_m * dW_m[:,j-1]
-                mrdrift        = np.exp( mrdrift * dt )
-                mrdrift        = np.log( mrdrift / np.mean( mrdrift ) ) / dt
-                rdrift[:,j]    = drift + mrdrift
-
-            # vols
-            if bStochVol:
-                log_rvol       += kappa_v * ( log_ivol      - log_rvol ) * dt + xi_v * dW_v[:,j-1] - 0.5 * (xi_v ** 2) * dt
-                log_ivol       += kappa_i * ( log_ivol_init - log_ivol ) * dt + xi_i * dW_i[:,j-1] - 0.5 * (xi_i ** 2) * dt
-                rvol[:,j]      = np.exp( log_rvol )
-                ivol[:,j]      = np.exp( log_ivol )
-
-        # throw away the first nInvSteps 
-        # so we start in an invariant distribution
-        spot       = spot[:,nIvSteps:]
-        rdrift     = rdrift[:,nIvSteps:nIvSteps+nSteps]
-        rvol       = rvol[:,nIvSteps:nIvSteps+nSteps]
-        ivol       = ivol[:,nIvSteps:nIvSteps+nSteps]
+        spot, rdrift, rvol, ivol = _simulate_spot_drift_vol(
+                seed      = seed,
+                nSamples  = nSamples,
+                nTotal    = nSteps+nIvSteps+ttm_steps,
+                nIvSteps  = nIvSteps,
+                nSteps    = nSteps,
+                dt        = dt,
+                drift     = drift,
+                kappa_m   = kappa_m,
+                xi_m      = xi_m,
+                rvol_init = rvol_init,
+                ivol_init = ivol_init,
+                kappa_v   = kappa_v,
+                kappa_i   = kappa_i,
+                xi_v      = xi_v,
+                xi_i      = xi_i,
+                rho_ms    = rho_ms,
+                rho_vs    = rho_vs,
+                rho_vi    = rho_vi,
+                rho_vs_r  = rho_vs_r,
+                dtype     = self.np_dtype )
 
         # sort
         ixs        = np.argsort( spot[:,nSteps] )
@@ -287,8 +457,8 @@ class SimpleWorld_Spot_ATM(object):
             dInsts     = dS[:,:,np.newaxis]
             cost       = cost_dS[:,:,np.newaxis]
             price      = spot[:,:nSteps]
-            ubnd_a     = np.full( (nSamples,nSteps,1), ubnd_as )
-            lbnd_a     = np.full( (nSamples,nSteps,1), lbnd_as )
+            ubnd_a     = np.full( (nSamples,nSteps,1), ubnd_as, dtype=self.np_dtype )
+            lbnd_a     = np.full( (nSamples,nSteps,1), lbnd_as, dtype=self.np_dtype )
             
             call_price = None
             call_delta = None
@@ -297,18 +467,27 @@ class SimpleWorld_Spot_ATM(object):
             
         else:
             # add hedging instrument: calls
-            mat_spot   = spot[:,ttm_steps:ttm_steps+nSteps]   # spot at maturity of each option
-            opt_spot   = spot[:,:nSteps]                      # spot at trading date of each option
-            payoffs    = np.maximum( 0, mat_spot - strike * opt_spot )
-            d1         = ( - np.log( strike ) + 0.5 * ivol * ivol * ttm) / ( ivol * sqrtTTM )
-            d2         = d1 - ivol * sqrtTTM
-            N1         = norm.cdf(d1)
-            N2         = norm.cdf(d2)
-            call_price = N1 * opt_spot - N2 * strike * opt_spot
-            dC         = payoffs - call_price
-            call_delta = N1
-            call_vega  = opt_spot * norm.pdf(d1) * sqrtTTM
-            cost_dC    = cost_v * np.abs(call_vega) + cost_s * np.abs(call_delta) + cost_p * abs(call_price) # note: for a call vega and delta are positive, but we apply abs() anyway to illusteate the point
+            # priced SIM_BLOCK_SIZE samples at a time
+            call_price = np.empty((nSamples,nSteps), dtype=self.np_dtype)
+            call_delta = np.empty((nSamples,nSteps), dtype=self.np_dtype)
+            call_vega  = np.empty((nSamples,nSteps), dtype=self.np_dtype)
+            cost_dC    = np.empty((nSamples,nSteps), dtype=self.np_dtype)
+            dC         = np.empty((nSamples,nSteps), dtype=self.np_dtype)
+            for i0 in range(0,nSamples,SIM_BLOCK_SIZE):
+                i1         = min( i0 + SIM_BLOCK_SIZE, nSamples )
+                mat_spot   = spot[i0:i1,ttm_steps:ttm_steps+nSteps]   # spot at maturity of each option
+                opt_spot   = spot[i0:i1,:nSteps]                      # spot at trading date of each option
+                b_ivol     = ivol[i0:i1]
+                payoffs    = np.maximum( 0, mat_spot - strike * opt_spot )
+                d1         = ( - math.log( strike ) + 0.5 * b_ivol * b_ivol * ttm) / ( b_ivol * sqrtTTM )
+                d2         = d1 - b_ivol * sqrtTTM
+                N1         = ndtr(d1)
+                N2         = ndtr(d2)
+                call_price[i0:i1] = N1 * opt_spot - N2 * strike * opt_spot
+                dC[i0:i1]         = payoffs - call_price[i0:i1]
+                call_delta[i0:i1] = N1
+                call_vega[i0:i1]  = opt_spot * np.exp( -0.5 * d1 * d1 ) * ( sqrtTTM / math.sqrt( 2. * math.pi ) )
+                cost_dC[i0:i1]    = cost_v * np.abs(call_vega[i0:i1]) + cost_s * np.abs(call_delta[i0:i1]) + cost_p * abs(call_price[i0:i1]) # note: for a call vega and delta are positive, but we apply abs() anyway to illusteate the point
     
             dInsts         = np.ones((nSamples,nSteps,2), dtype=self.np_dtype)
             cost           = np.ones((nSamples,nSteps,2), dtype=self.np_dtype)
@@ -351,13 +530,6 @@ class SimpleWorld_Spot_ATM(object):
             payoff     = payoff_f
             py_feat    = None
             
-        # -----------------------------
-        # unique_id
-        # -----------------------------
-        # Default handling for configs will ignore any function definitions, e.g. in this case 'payoff'.
-        # we therefore manually generate a sufficient hash
-        self.unique_id = uniqueHash( [ config.input_dict(), payoff_f, self.tf_dtype.name ],parse_functions = True )
-            
         # -----------------------------
         # store data
         # -----------------------------
@@ -411,15 +583,6 @@ class SimpleWorld_Spot_ATM(object):
         # check numerics
         assert_iter_not_is_nan( self.data, "data" )
  
-        # data
-        # what gym() gets
-        
-        self.tf_data = tf_dict(
-            features = self.data.features,
-            market   = self.data.market,
-            dtype    = self.tf_dtype
-            )
-    
         # details
         # variables for visualization, but not available for the agent
         self.details = pdct(
@@ -433,6 +596,20 @@ class SimpleWorld_Spot_ATM(object):
         # check numerics
         assert_iter_not_is_nan( self.details, "details" )
         
+        # write cache
+        if not cache_path is None and cache_mode.write:
+            _write_world_cache( cache_path, dict( data=self.data, details=self.details ) )
+        
+        self._init_from_data( nSamples=nSamples, nSteps=nSteps, strike=strike, dt=dt )
+
+    def _init_from_data(self, *, nSamples : int, nSteps : int, strike : float, dt : float ):
+        """ Initialize the members derived from 'data' and 'details' """
+        # data
+        # what gym() gets
+        
+        # created on first use, see tf_data
+        self._tf_data = None
+    
         # generating sample weights
         # the tf_sample_weights is passed to keras train and must be of size [nSamples,1]
         # https://stackoverflow.com/questions/60399983/how-to-create-and-use-weighted-metrics-in-keras
@@ -451,6 +628,53 @@ class SimpleWorld_Spot_ATM(object):
         if strike > 0.:
             self.inst_names.append( "ATM Call" )
         
+    @property
+    def tf_data(self) -> dict:
+        """
+        Dictionary of TF tensors of 'data' for the use of gym.call() or train().
+        The tensors are created on first use. Training with config.train.stream = True does not use them.
+        """
+        if self._tf_data is None:
+            self._tf_data = tf_dict(
+                features = self.data.features,
+                market   = self.data.market,
+                dtype    = self.tf_dtype
+                )
+        return self._tf_data
+
+    def np_data(self, ixs : np.ndarray = None ) -> dict:
+        """
+        Returns 'data' as a dictionary of numpy arrays with the same structure as 'tf_data'.
+        If 'ixs' is provided, only the samples 'ixs' are returned.
+        """
+        take = ( lambda x : np.asarray( x, dtype=self.np_dtype ) ) if ixs is None else ( lambda x : np.asarray( x[ixs], dtype=self.np_dtype ) )
+        return dict( features = dict( per_step = { k: take(v) for k, v in self.data.features.per_step.items() },
+                                      per_path = { k: take(v) for k, v in self.data.features.per_path.items() } ),
+                     market   = { k: take(v) for k, v in self.data.market.items() } )
+
+    def tf_dataset(self, batch_size : int = 32, seed : int = None ):
+        """
+        Returns a tf.data.Dataset of batches of ( data, y, sample_weights ) as expected by keras fit().
+        The batches are gathered from 'data' while the dataset is iterated over, hence 'tf_data' is not created.
+        The samples are shuffled differently for each pass over the dataset, i.e. for each epoch.
+        
+        Following train(), the sample weights are scaled by the number of samples, e.g. they are
+        1 for equally weighted samples.
+        """
+        _log.verify( batch_size > 0, "'batch_size' must be positive; found %ld", batch_size )
+        seed    = self.seed if seed is None else seed
+        weights = ( self.sample_weights * float(self.nSamples) ).astype( self.np_dtype )[:,np.newaxis]
+        passes  = [0]
+        
+        def generate():
+            ixs        = np.random.default_rng( [ seed, passes[0] ] ).permutation( self.nSamples )
+            passes[0] += 1
+            for j in range(0, len(ixs), batch_size):
+                bixs = np.sort( ixs[j:j+batch_size] )
+                yield self.np_data( bixs ), np.zeros( (len(bixs),), dtype=self.np_dtype ), weights[bixs]
+
+        return tf.data.Dataset.from_generator( generate, output_signature=_batch_signature( self.np_data( np.arange(1) ), self.tf_dtype ) )
+
     def clone(self, config_overwrite = Config(), **kwargs ):
         """
         Create a copy of this world with the same config, except for the seed.
@@ -463,14 +687,16 @@ class SimpleWorld_Spot_ATM(object):
             **kwargs
                 Allows specifying additional overwrites of specific config values, e.g.
                     world.clone( seed=222, samples=10 )
-                If seed is not specified, a random seed is generated.
+                If seed is not specified, a new seed is derived from the seed of this world and the number of clones created so far.
+                Repeated runs hence create the same clones, which allows caching them.
 
         Returns
         -------
             New world
         """
         if not 'seed' in kwargs:
-            kwargs['seed'] = int(np.random.randint(0,0x7FFFFFFF))
+            kwargs['seed'] = int( np.random.SeedSequence( self.seed, spawn_key=(self.clones,) ).generate_state(1)[0] & 0x7FFFFFFF )
+            self.clones    += 1
         config = self.config.copy()
         config.update( config_overwrite, **kwargs )        
         return SimpleWorld_Spot_ATM( config )
@@ -553,3 +779,146 @@ class SimpleWorld_Spot_ATM(object):
         if print_input:
             print("Config settings:\n%s" % self.input_report)
 
+
+# =========================================================================================
+# Streaming
+# =========================================================================================
+
+def _batch_signature( np_data : dict, dtype ) -> tuple:
+    """ Signature of the ( data, y, sample_weights ) batches for keras fit() with data such as returned by np_data() """
+    spec = lambda x : tf.TensorSpec( shape=(None,)+x.shape[1:], dtype=dtype )
+    return ( tf.nest.map_structure( spec, np_data ),
+             tf.TensorSpec( shape=(None,), dtype=dtype ),
+             tf.TensorSpec( shape=(None,1), dtype=dtype ) )
+
+class WorldBlocks(object):
+    """
+    Large world generated as a sequence of independent blocks with a fixed number of samples.
+    Use this class for sample sizes whose full world does not fit into memory.
+    
+    Block 'i' is a world of 'block_size' samples, created with the same config as the full
+    world except for its seed, which is derived from the config seed and 'i'.
+    Each block can therefore be regenerated on its own, in any order.
+    Note that a world such as SimpleWorld_Spot_ATM normalizes spots and drifts over its
+    samples, so this normalization now happens per block.
+    
+        config  = Config()
+        config.samples    = 10000000
+        config.block_size = 100000
+        blocks  = WorldBlocks( config )
+        for world in blocks:
+            ...
+        
+    Attributes
+    ----------
+        nSamples : int
+            Total number of samples
+            
+        block_size : int
+            Number of samples per block. The last block may be smaller.
+            
+        nBlocks : int
+            Number of blocks
+            
+        config : Config
+            Copy of the config file
+            
+        unique_id : str
+            Unique ID generate off the config file, for serialization
+    """
+    
+    def __init__(self, config : Config, world_class = SimpleWorld_Spot_ATM, dtype=dh_dtype ):
+        """
+        Parameters
+        ----------
+        config : Config
+            Config of the world, with two additional entries:
+                samples    - total number of samples
+                block_size - number of samples per block
+        world_class : type
+            Class of the world for each block.
+        dtype : tf.DType
+            Type
+        """
+        self.world_class = world_class
+        self.tf_dtype    = dtype
+        self.np_dtype    = dtype.as_numpy_dtype()
+        self.config      = config.copy()
+        
+        nSamples         = config("samples", 1000, int, help="Total number of samples")
+        block_size       = config("block_size", 100000, int, help="Number of samples per block")
+        seed             = config("seed", 2312414312, int, help="Random seed. The seed of each block is derived from this seed and the block number")
+        _log.verify( nSamples > 0,  "'samples' must be positive; found %ld", nSamples )
+        _log.verify( block_size > 1, "'block_size' must be at least 2; found %ld", block_size )
+        
+        self.nSamples    = nSamples
+        self.block_size  = min( block_size, nSamples )
+        self.nBlocks     = ( nSamples + self.block_size - 1 ) // self.block_size
+        self.seed        = seed
+        self.config.pop('block_size', None)
+        
+        # a small world to validate the config, and to determine the shapes of the data
+        self.sample_world = world_class( self._block_config( self.seed, 2 ), dtype=dtype )
+        self.nSteps       = self.sample_world.nSteps
+        self.nInst        = self.sample_world.nInst
+        self.unique_id    = uniqueHash( [ world_class.__name__, self.sample_world.unique_id, nSamples, block_size ] )
+        config.mark_done()
+        
+    def _block_config(self, seed : int, samples : int ) -> Config:
+        config = self.config.copy()
+        config.update( seed=seed, samples=samples )
+        return config
+    
+    def block_seed(self, i : int ) -> int:
+        """ Returns the seed of block 'i' """
+        _log.verify( i >= 0 and i < self.nBlocks, "Block %ld out of range [0,%ld]", i, self.nBlocks-1 )
+        return int( np.random.SeedSequence( [ self.seed, i ] ).generate_state(1)[0] & 0x7FFFFFFF )
+    
+    def block_samples(self, i : int ) -> int:
+        """ Returns the number of samples of block 'i' """
+        _log.verify( i >= 0 and i < self.nBlocks, "Block %ld out of range [0,%ld]", i, self.nBlocks-1 )
+        return min( self.block_size, self.nSamples - i * self.block_size )
+        
+    def block(self, i : int ):
+        """ Generate block 'i' as a world """
+        return self.world_class( self._block_config( self.block_seed(i), self.block_samples(i) ), dtype=self.tf_dtype )
+    
+    def __iter__(self):
+        """ Generate all blocks in order """
+        for i in range(self.nBlocks):
+            yield self.block(i)
+            
+    def __len__(self):
+        return self.nBlocks
+
+    def tf_dataset(self, batch_size : int = 32, prefetch_blocks : bool = True ):
+        """
+        Returns a tf.data.Dataset which generates the blocks while it is iterated over, and
+        returns batches of ( data, y, sample_weights ) as expected by keras fit().
+        Within each block the samples are batched in a random order which is fixed by the block seed.
+        If 'prefetch_blocks' is True, the next block is generated in a background thread while
+        the batches of the current block are consumed. This holds two blocks in memory.
+        
+        Following train(), the sample weights of each block are scaled by its number of samples,
+        e.g. they are 1 for equally weighted samples.
+        """
+        _log.verify( batch_size > 0, "'batch_size' must be positive; found %ld", batch_size )
+        
+        def load( i ):
+            world   = self.block(i)
+            weights = ( world.sample_weights * float(world.nSamples) ).astype( self.np_dtype )[:,np.newaxis]
+            ixs     = np.random.default_rng( self.block_seed(i) ).permutation( world.nSamples )
+            return world.np_data(), weights, ixs
+        
+        def generate():
+            with ThreadPoolExecutor( max_workers=1 ) as executor:
+                nxt = executor.submit( load, 0 ) if prefetch_blocks else None
+                for i in range(self.nBlocks):
+                    data, weights, ixs = nxt.result() if prefetch_blocks else load(i)
+                    nxt = executor.submit( load, i+1 ) if prefetch_blocks and i+1 < self.nBlocks else None
+                    for j in range(0, len(ixs), batch_size):
+                        bixs = np.sort( ixs[j:j+batch_size] )
+                        yield tf.nest.map_structure( lambda x : x[bixs], data ), np.zeros( (len(bixs),), dtype=self.np_dtype ), weights[bixs]
+                    del data, weights, ixs
+        
+        return tf.data.Dataset.from_generator( generate, output_signature=_batch_signature( self.sample_world.np_data(), self.tf_dtype ) )
@@ -42,6 +42,7 @@ class PolicyGradient:
         action_noise=0,
         optimizer=AdamW,
         device="cpu",
+        use_dataloader=True,
     ):
         """Initializes Policy Gradient for portfolio optimization.
 
@@ -56,6 +57,10 @@ class PolicyGradient:
             during training.
           optimizer: Optimizer of neural network.
           device: Device where neural network is run.
+          use_dataloader: If True, batches of experiences are loaded through
+            a pytorch DataLoader. If False, they are taken directly from the
+            replay buffer's arrays, which avoids collating the experiences one
+            by one. Both modes perform the same gradient steps.
         """
         self.policy = policy
         self.policy_kwargs = {} if policy_kwargs is None else policy_kwargs
@@ -65,6 +70,7 @@ class PolicyGradient:
         self.action_noise = action_noise
         self.optimizer = optimizer
         self.device = device
+        self.use_dataloader = use_dataloader
         self._setup_train(env, self.policy, self.batch_size, self.lr, self.optimizer)
 
     def _setup_train(self, env, policy, batch_size, lr, optimizer):
@@ -95,12 +101,25 @@ class PolicyGradient:
             dataset=dataset, batch_size=batch_size, shuffle=False, pin_memory=True
         )
 
-    def train(self, episodes=100):
+    def train(self, episodes=100, start_offsets=None, episode_length=None):
         """Training sequence.
 
         Args:
             episodes: Number of episodes to simulate.
+            start_offsets: If not None, each episode simulates in parallel one
+              trajectory of the training environment per start offset (in time
+              indexes) and the policy receives the stacked observations of all
+              of them at each timestep. After each period of batch_size
+              timesteps, the policy is updated with the experiences of that
+              period of all trajectories.
+            episode_length: Number of timesteps of each trajectory when
+              start_offsets is used. If None, the largest length allowed by the
+              latest start is used.
         """
+        if start_offsets is not None:
+            self._train_batch(episodes, start_offsets, episode_length)
+            return
+
         for i in tqdm(range(1, episodes + 1)):
             obs = self.train_env.reset()  # observation
             self.train_pvm.reset()  # reset portfolio vector memory
@@ -136,7 +155,72 @@ class PolicyGradient:
             if self.validation_env:
                 self.test(self.validation_env)
 
-    def _setup_test(self, env, policy, batch_size, lr, optimizer):
+    def _train_batch(self, episodes, start_offsets, episode_length):
+        """Training sequence over a batch of trajectories simulated in parallel.
+
+        Args:
+            episodes: Number of episodes to simulate.
+            start_offsets: Start offset (in time indexes) of each trajectory.
+            episode_length: Number of timesteps of each trajectory.
+        """
+        env = self.train_env.get_batch_env(start_offsets, episode_length)
+        pvm = PVM(env.episode_length, env.portfolio_size, env.num_trajectories)
+        buffer = ReplayBuffer(capacity=self.train_batch_size * env.num_trajectories)
+
+        for i in tqdm(range(1, episodes + 1)):
+            obs = env.reset()  # observations of all trajectories
+            pvm.reset()  # reset portfolio vector memory
+            done = False
+            steps = 0
+
+            while not done:
+                steps += 1
+                # define last_actions and actions and update portfolio vector memory
+                last_action = pvm.retrieve()
+                action = apply_portfolio_noise(
+                    self._batch_action(self.train_policy, obs, last_action),
+                    self.action_noise,
+                )
+                pvm.add(action)
+
+                # run simulation step
+                next_obs, reward, done, info = env.step(action)
+
+                # add experiences of all trajectories to replay buffer
+                buffer.extend(
+                    (obs, last_action, info["price_variation"], info["trf_mu"])
+                )
+
+                # update policy networks
+                if steps % self.train_batch_size == 0:
+                    self._gradient_ascent(batch=buffer.sample_batch())
+
+                obs = next_obs
+
+            # gradient ascent with episode remaining buffer data
+            if len(buffer) > 0:
+                self._gradient_ascent(batch=buffer.sample_batch())
+
+            # validation step
+            if self.validation_env:
+                self.test(self.validation_env)
+
+    def _batch_action(self, policy, obs, last_action):
+        """Computes the actions of a batch of observations without tracking
+        gradients.
+
+        Args:
+            policy: Policy network.
+            obs: Batch of observations.
+            last_action: Batch of last actions.
+
+        Returns:
+            Array of actions, one per observation.
+        """
+        with torch.no_grad():
+            return policy.mu(obs, last_action).cpu().numpy()
+
+    def _setup_test(self, env, policy, batch_size, lr, optimizer, num_portfolios=None):
         """Initializes algorithm before testing.
 
         Args:
@@ -145,6 +229,8 @@ class PolicyGradient:
           batch_size: batch size to train neural network.
           lr: policy neural network learning rate.
           optimizer: Optimizer of neural network.
+          num_portfolios: Number of trajectories simulated in parallel by env,
+            if it is a batch of trajectories.
         """
         # environment
         self.test_env = env
@@ -160,8 +246,13 @@ class PolicyGradient:
         self.test_optimizer = optimizer(self.test_policy.parameters(), lr=lr)
 
         # replay buffer and portfolio vector memory
-        self.test_buffer = ReplayBuffer(capacity=batch_size)
-        self.test_pvm = PVM(self.test_env.episode_length, env.portfolio_size)
+        buffer_size = (
+            batch_size if num_portfolios is None else batch_size * num_portfolios
+        )
+        self.test_buffer = ReplayBuffer(capacity=buffer_size)
+        self.test_pvm = PVM(
+            self.test_env.episode_length, env.portfolio_size, num_portfolios
+        )
 
         # dataset and dataloader
         dataset = RLDataset(self.test_buffer)
@@ -170,7 +261,14 @@ class PolicyGradient:
         )
 
     def test(
-        self, env, policy=None, online_training_period=10, lr=None, optimizer=None
+        self,
+        env,
+        policy=None,
+        online_training_period=10,
+        lr=None,
+        optimizer=None,
+        start_offsets=None,
+        episode_length=None,
     ):
         """Tests the policy with online learning.
 
@@ -186,11 +284,31 @@ class PolicyGradient:
             learning rate
           optimizer: Optimizer of neural network. If None, it will use the training
             optimizer
+          start_offsets: If not None, one trajectory of the environment per start
+            offset (in time indexes) is simulated in parallel and the online
+            learning uses the experiences of all trajectories.
+          episode_length: Number of timesteps of each trajectory when start_offsets
+            is used. If None, the largest length allowed by the latest start is used.
 
         Note:
             To disable online learning, set learning rate to 0 or a very big online
             training period.
+
+        Returns:
+            If start_offsets is used, an array of shape (batch, episode_length + 1)
+            with the portfolio values of each trajectory after each timestep.
         """
+        if start_offsets is not None:
+            return self._test_batch(
+                env,
+                policy,
+                online_training_period,
+                lr,
+                optimizer,
+                start_offsets,
+                episode_length,
+            )
+
         self._setup_test(env, policy, online_training_period, lr, optimizer)
 
         obs = self.test_env.reset()  # observation
@@ -220,18 +338,83 @@ class PolicyGradient:
 
             obs = next_obs
 
-    def _gradient_ascent(self, test=False):
+    def _test_batch(
+        self,
+        env,
+        policy,
+        online_training_period,
+        lr,
+        optimizer,
+        start_offsets,
+        episode_length,
+    ):
+        """Tests the policy with online learning over a batch of trajectories
+        simulated in parallel.
+
+        Returns:
+            Array of shape (batch, episode_length + 1) with the portfolio values
+            of each trajectory after each timestep.
+        """
+        env = env.get_batch_env(start_offsets, episode_length)
+        self._setup_test(
+            env, policy, online_training_period, lr, optimizer, env.num_trajectories
+        )
+
+        obs = self.test_env.reset()  # observations of all trajectories
+        self.test_pvm.reset()  # reset portfolio vector memory
+        done = False
+        steps = 0
+
+        while not done:
+            steps += 1
+            # define last_actions and actions and update portfolio vector memory
+            last_action = self.test_pvm.retrieve()
+            action = self._batch_action(self.test_policy, obs, last_action)
+            self.test_pvm.add(action)
+
+            # run simulation step
+            next_obs, reward, done, info = self.test_env.step(action)
+
+            # add experiences of all trajectories to replay buffer
+            self.test_buffer.extend(
+                (obs, last_action, info["price_variation"], info["trf_mu"])
+            )
+
+            # update policy networks
+            if steps % online_training_period == 0:
+                self._gradient_ascent(test=True, batch=self.test_buffer.sample_batch())
+
+            obs = next_obs
+
+        return self.test_env.portfolio_values
+
+    def _gradient_ascent(self, test=False, batch=None):
         """Performs the gradient ascent step in the policy gradient algorithm.
 
         Args:
             test: If true, it uses the test dataloader and policy.
+            batch: If not None, tuple of arrays with the observations, last
+              actions, price variations and transaction remainder factors to be
+              used instead of sampling the replay buffer.
         """
-        # get batch data from dataloader
-        obs, last_actions, price_variations, trf_mu = (
-            next(iter(self.test_dataloader))
-            if test
-            else next(iter(self.train_dataloader))
-        )
+        # get batch data from dataloader or directly from replay buffer
+        if batch is not None:
+            obs, last_actions, price_variations, trf_mu = (
+                torch.from_numpy(array) for array in batch
+            )
+        elif self.use_dataloader:
+            obs, last_actions, price_variations, trf_mu = (
+                next(iter(self.test_dataloader))
+                if test
+                else next(iter(self.train_dataloader))
+            )
+        else:
+            buffer = self.test_buffer if test else self.train_buffer
+            if len(buffer) == 0:
+                return
+            obs, last_actions, price_variations, trf_mu = (
+                torch.from_numpy(array) for array in buffer.sample_batch()
+            )
         obs = obs.to(self.device)
         last_actions = last_actions.to(self.device)
         price_variations = price_variations.to(self.device)
@@ -1,34 +1,37 @@
 from __future__ import annotations
 
-from collections import deque
-from random import randint
-from random import random
-
 import numpy as np
 from torch.utils.data.dataset import IterableDataset
 
 
 class PVM:
-    def __init__(self, capacity, portfolio_size):
+    def __init__(self, capacity, portfolio_size, num_portfolios=None):
         """Initializes portfolio vector memory.
 
         Args:
           capacity: Max capacity of memory.
           portfolio_size: Portfolio size.
+          num_portfolios: If not None, the memory stores, at each position, the
+            portfolio vectors of this number of simulated portfolios.
         """
         # initially, memory will have the same actions
         self.capacity = capacity
         self.portfolio_size = portfolio_size
+        self.num_portfolios = num_portfolios
         self.reset()
 
     def reset(self):
-        self.memory = [np.array([1] + [0] * self.portfolio_size, dtype=np.float32)] * (
-            self.capacity + 1
+        # one row per portfolio vector, all money initially allocated in cash
+        batch_shape = () if self.num_portfolios is None else (self.num_portfolios,)
+        self.memory = np.zeros(
+            (self.capacity + 1,) + batch_shape + (self.portfolio_size + 1,),
+            dtype=np.float32,
         )
+        self.memory[..., 0] = 1
         self.index = 0  # initial index to retrieve data
 
     def retrieve(self):
-        last_action = self.memory[self.index]
+        last_action = self.memory[self.index].copy()
         self.index = 0 if self.index == self.capacity else self.index + 1
         return last_action
 
@@ -42,8 +45,16 @@ class ReplayBuffer:
 
         Args:
           capacity: Max capacity of buffer.
+
+        Note:
+            Experiences are stored in one preallocated array per experience
+            element, which is used as a ring buffer. The arrays are allocated
+            when the first experience is appended.
         """
-        self.buffer = deque(maxlen=capacity)
+        self.capacity = capacity
+        self.storage = None
+        self._start = 0  # index of the oldest experience
+        self._size = 0
 
     def __len__(self):
         """Represents the size of the buffer
@@ -51,7 +62,7 @@ class ReplayBuffer:
         Returns:
           Size of the buffer.
         """
-        return len(self.buffer)
+        return self._size
 
     def append(self, experience):
         """Append experience to buffer. When buffer is full, it pops
@@ -60,7 +71,52 @@ class ReplayBuffer:
         Args:
           experience: experience to be saved.
         """
-        self.buffer.append(experience)
+        if self.storage is None:
+            self.storage = tuple(
+                np.empty(
+                    (self.capacity,) + np.shape(item), dtype=np.asarray(item).dtype
+                )
+                for item in experience
+            )
+        index = (self._start + self._size) % self.capacity
+        for array, item in zip(self.storage, experience):
+            array[index] = item
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def extend(self, experiences):
+        """Append a batch of experiences to buffer. When buffer is full, it
+           pops the oldest experiences.
+
+        Args:
+          experiences: Tuple with one array per experience element, whose
+            first dimension indexes the experiences.
+        """
+        count = len(experiences[0])
+        if count > self.capacity:
+            experiences = tuple(items[-self.capacity :] for items in experiences)
+            count = self.capacity
+        if self.storage is None:
+            self.storage = tuple(
+                np.empty(
+                    (self.capacity,) + np.shape(items)[1:],
+                    dtype=np.asarray(items).dtype,
+                )
+                for items in experiences
+            )
+        positions = (self._start + self._size + np.arange(count)) % self.capacity
+        for array, items in zip(self.storage, experiences):
+            array[positions] = items
+        overflow = max(self._size + count - self.capacity, 0)
+        self._size += count - overflow
+        self._start = (self._start + overflow) % self.capacity
+
+    def clear(self):
+        """Removes all experiences from the buffer."""
+        self._start = 0
+        self._size = 0
 
     def sample(self):
         """Sample from replay buffer. All data from replay buffer is
@@ -69,9 +125,30 @@ class ReplayBuffer:
         Returns:
           Sample of batch_size size.
         """
-        buffer = list(self.buffer)
-        self.buffer.clear()
-        return buffer
+        if self._size == 0:
+            return []
+        batch = self.sample_batch()
+        return list(zip(*batch))
+
+    def sample_batch(self, indices=None):
+        """Sample from replay buffer as stacked arrays.
+
+        Args:
+          indices: Indices of the experiences to be sampled, where 0 is the
+            oldest experience in the buffer. If None, all data from replay
+            buffer is returned and the buffer is cleared.
+
+        Returns:
+          Tuple with one array per experience element, whose first dimension
+          indexes the sampled experiences.
+        """
+        clear = indices is None
+        indices = np.arange(self._size) if clear else np.asarray(indices)
+        positions = (self._start + indices) % self.capacity
+        batch = tuple(array[positions] for array in self.storage)
+        if clear:
+            self.clear()
+        return batch
 
 
 class RLDataset(IterableDataset):
@@ -99,22 +176,33 @@ class RLDataset(IterableDataset):
 def apply_portfolio_noise(portfolio, epsilon=0.0):
     """Apply noise to portfolio distribution considering its constrains.
 
+    Each weight moves a random fraction of epsilon, at most the weight
+    itself, to a randomly chosen weight of the same portfolio. The new
+    weights are therefore non-negative and keep their sum.
+
     Arg:
-        portfolio: initial portfolio distribution.
+        portfolio: initial portfolio distribution. It can also be an array
+          of portfolios whose last dimension holds the weights.
         epsilon: maximum rebalancing.
 
     Returns:
         New portolio distribution with noise applied.
     """
-    portfolio_size = portfolio.shape[0]
-    new_portfolio = portfolio.copy()
-    for i in range(portfolio_size):
-        target_index = randint(0, portfolio_size - 1)
-        difference = epsilon * random()
-        # check constrains
-        max_diff = min(new_portfolio[i], 1 - new_portfolio[target_index])
-        difference = min(difference, max_diff)
-        # apply difference
-        new_portfolio[i] -= difference
-        new_portfolio[target_index] += difference
+    new_portfolio = np.array(portfolio, copy=True)
+    if epsilon == 0:
+        return new_portfolio
+    portfolio_size = new_portfolio.shape[-1]
+    weights = new_portfolio.reshape(-1, portfolio_size)
+    # one draw for the target indexes and one for the differences
+    draws = np.random.random((2,) + weights.shape)
+    target_index = (draws[0] * portfolio_size).astype(np.intp)
+    difference = np.minimum(epsilon * draws[1], weights)
+    # sum the differences received by each weight of each portfolio
+    if weights.shape[0] > 1:
+        target_index += portfolio_size * np.arange(weights.shape[0])[:, np.newaxis]
+    received = np.bincount(
+        target_index.ravel(), weights=difference.ravel(), minlength=weights.size
+    )
+    weights -= difference
+    weights += received.reshape(weights.shape)
     return new_portfolio
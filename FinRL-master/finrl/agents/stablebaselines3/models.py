@@ -51,6 +51,10 @@ class TensorboardCallback(BaseCallback):
                 # Print the original error and the inner error for debugging
                 print("Original Error:", error)
                 print("Inner Error:", inner_error)
+        # per-episode metrics that environments return on their terminal step
+        for info in self.locals.get("infos", []):
+            for key, value in info.get("episode_metrics", {}).items():
+                self.logger.record(key, value)
         return True
 
 
@@ -122,8 +126,15 @@ class DRLAgent:
         return model
 
     @staticmethod
-    def DRL_prediction(model, environment, deterministic=True):
-        """make a prediction and get results"""
+    def DRL_prediction(model, environment, deterministic=True, direct_policy=False):
+        """make a prediction and get results
+
+        With ``direct_policy=True`` the policy network is run on the raw
+        environment instead of through ``DummyVecEnv`` and ``model.predict``,
+        see ``DRL_prediction_direct``.
+        """
+        if direct_policy:
+            return DRLAgent.DRL_prediction_direct(model, environment, deterministic)
         test_env, test_obs = environment.get_sb_env()
         account_memory = None  # This help avoid unnecessary list creation
         actions_memory = None  # optimize memory consumption
@@ -151,6 +162,35 @@ class DRLAgent:
                 break
         return account_memory[0], actions_memory[0]
 
+    @staticmethod
+    def DRL_prediction_direct(model, environment, deterministic=True):
+        """backtest by stepping the environment directly with the policy network
+
+        Observations are written into a preallocated (1, state_space) batch and
+        passed to ``model.policy.predict``, which unscales or clips the actions
+        like ``model.predict``, without the ``DummyVecEnv`` round trip.
+        The account and action memories are read from the environment once, at
+        the end, so the results match ``DRL_prediction``.
+        """
+        policy = model.policy
+        policy.set_training_mode(False)
+
+        n_days = len(environment.df.index.unique())
+        obs_batch = np.empty((1, *policy.observation_space.shape), dtype=np.float32)
+
+        state, _ = environment.reset()
+        for i in range(n_days):
+            obs_batch[0] = state
+            action, _ = policy.predict(obs_batch, deterministic=deterministic)
+
+            state, _, terminal, truncated, _ = environment.step(action[0])
+            if terminal or truncated:
+                print("hit end!")
+                break
+        account_memory = environment.save_asset_memory()
+        actions_memory = environment.save_action_memory()
+        return account_memory, actions_memory
+
     @staticmethod
     def DRL_prediction_load_from_file(model_name, environment, cwd, deterministic=True):
         if model_name not in MODELS:
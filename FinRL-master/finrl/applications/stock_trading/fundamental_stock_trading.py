@@ -1,6 +1,31 @@
 from __future__ import annotations
 
 
+def trailing_quarters_sum(fund_data, column, quarters=3):
+    """Sums, for every row, the values of a column in the previous quarters.
+
+    For each row i, the result is the sum of ``fund_data[column].iloc[i - quarters : i]``
+    (missing values count as zero), or NaN if row i - quarters belongs to another
+    ticker. All rows and tickers are computed at once with shifted columns, adding the
+    quarters in the same order as a row by row sum.
+
+    Args:
+        fund_data: Fundamental data, with one row per ticker and quarter and a "tic"
+            column.
+        column: Name of the column to be summed.
+        quarters: Number of previous quarters in the sum.
+
+    Returns:
+        A float Series with the same index as fund_data.
+    """
+    values = fund_data[column]
+    total = values.shift(quarters).fillna(0)
+    for lag in range(quarters - 1, 0, -1):
+        total = total + values.shift(lag).fillna(0)
+    same_tic = fund_data["tic"].eq(fund_data["tic"].shift(quarters))
+    return total.where(same_tic)
+
+
 def main():
     import pandas as pd
     import numpy as np
@@ -128,56 +153,28 @@ def main():
 
     # Profitability ratios
     # Operating Margin
-    OPM = pd.Series(np.empty(fund_data.shape[0], dtype=object), name="OPM")
-    for i in range(0, fund_data.shape[0]):
-        if i - 3 < 0:
-            OPM[i] = np.nan
-        elif fund_data.iloc[i, 1] != fund_data.iloc[i - 3, 1]:
-            OPM.iloc[i] = np.nan
-        else:
-            OPM.iloc[i] = np.sum(fund_data["op_inc_q"].iloc[i - 3 : i]) / np.sum(
-                fund_data["rev_q"].iloc[i - 3 : i]
-            )
+    OPM = (
+        trailing_quarters_sum(fund_data, "op_inc_q")
+        / trailing_quarters_sum(fund_data, "rev_q")
+    ).rename("OPM")
 
     # Net Profit Margin
-    NPM = pd.Series(np.empty(fund_data.shape[0], dtype=object), name="NPM")
-    for i in range(0, fund_data.shape[0]):
-        if i - 3 < 0:
-            NPM[i] = np.nan
-        elif fund_data.iloc[i, 1] != fund_data.iloc[i - 3, 1]:
-            NPM.iloc[i] = np.nan
-        else:
-            NPM.iloc[i] = np.sum(fund_data["net_inc_q"].iloc[i - 3 : i]) / np.sum(
-                fund_data["rev_q"].iloc[i - 3 : i]
-            )
+    NPM = (
+        trailing_quarters_sum(fund_data, "net_inc_q")
+        / trailing_quarters_sum(fund_data, "rev_q")
+    ).rename("NPM")
 
     # Return On Assets
-    ROA = pd.Series(np.empty(fund_data.shape[0], dtype=object), name="ROA")
-    for i in range(0, fund_data.shape[0]):
-        if i - 3 < 0:
-            ROA[i] = np.nan
-        elif fund_data.iloc[i, 1] != fund_data.iloc[i - 3, 1]:
-            ROA.iloc[i] = np.nan
-        else:
-            ROA.iloc[i] = (
-                np.sum(fund_data["net_inc_q"].iloc[i - 3 : i])
-                / fund_data["tot_assets"].iloc[i]
-            )
+    ROA = (
+        trailing_quarters_sum(fund_data, "net_inc_q") / fund_data["tot_assets"]
+    ).rename("ROA")
 
     # Return on Equity
-    ROE = pd.Series(np.empty(fund_data.shape[0], dtype=object), name="ROE")
-    for i in range(0, fund_data.shape[0]):
-        if i - 3 < 0:
-            ROE[i] = np.nan
-        elif fund_data.iloc[i, 1] != fund_data.iloc[i - 3, 1]:
-            ROE.iloc[i] = np.nan
-        else:
-            ROE.iloc[i] = (
-                np.sum(fund_data["net_inc_q"].iloc[i - 3 : i])
-                / fund_data["sh_equity"].iloc[i]
-            )
+    ROE = (
+        trailing_quarters_sum(fund_data, "net_inc_q") / fund_data["sh_equity"]
+    ).rename("ROE")
 
-            # For calculating valuation ratios in the next subpart, calculate per share items in advance
+    # For calculating valuation ratios in the next subpart, calculate per share items in advance
     # Earnings Per Share
     EPS = fund_data["eps_incl_ex"].to_frame("EPS")
 
@@ -207,49 +204,19 @@ def main():
 
     # Efficiency ratios
     # Inventory turnover ratio
-    inv_turnover = pd.Series(
-        np.empty(fund_data.shape[0], dtype=object), name="inv_turnover"
-    )
-    for i in range(0, fund_data.shape[0]):
-        if i - 3 < 0:
-            inv_turnover[i] = np.nan
-        elif fund_data.iloc[i, 1] != fund_data.iloc[i - 3, 1]:
-            inv_turnover.iloc[i] = np.nan
-        else:
-            inv_turnover.iloc[i] = (
-                np.sum(fund_data["cogs_q"].iloc[i - 3 : i])
-                / fund_data["inventories"].iloc[i]
-            )
+    inv_turnover = (
+        trailing_quarters_sum(fund_data, "cogs_q") / fund_data["inventories"]
+    ).rename("inv_turnover")
 
     # Receivables turnover ratio
-    acc_rec_turnover = pd.Series(
-        np.empty(fund_data.shape[0], dtype=object), name="acc_rec_turnover"
-    )
-    for i in range(0, fund_data.shape[0]):
-        if i - 3 < 0:
-            acc_rec_turnover[i] = np.nan
-        elif fund_data.iloc[i, 1] != fund_data.iloc[i - 3, 1]:
-            acc_rec_turnover.iloc[i] = np.nan
-        else:
-            acc_rec_turnover.iloc[i] = (
-                np.sum(fund_data["rev_q"].iloc[i - 3 : i])
-                / fund_data["receivables"].iloc[i]
-            )
+    acc_rec_turnover = (
+        trailing_quarters_sum(fund_data, "rev_q") / fund_data["receivables"]
+    ).rename("acc_rec_turnover")
 
     # Payable turnover ratio
-    acc_pay_turnover = pd.Series(
-        np.empty(fund_data.shape[0], dtype=object), name="acc_pay_turnover"
-    )
-    for i in range(0, fund_data.shape[0]):
-        if i - 3 < 0:
-            acc_pay_turnover[i] = np.nan
-        elif fund_data.iloc[i, 1] != fund_data.iloc[i - 3, 1]:
-            acc_pay_turnover.iloc[i] = np.nan
-        else:
-            acc_pay_turnover.iloc[i] = (
-                np.sum(fund_data["cogs_q"].iloc[i - 3 : i])
-                / fund_data["payables"].iloc[i]
-            )
+    acc_pay_turnover = (
+        trailing_quarters_sum(fund_data, "cogs_q") / fund_data["payables"]
+    ).rename("acc_pay_turnover")
 
     ## Leverage financial ratios
     # Debt ratio
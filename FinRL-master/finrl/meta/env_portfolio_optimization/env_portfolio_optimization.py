@@ -655,3 +655,234 @@ class PortfolioOptimizationEnv(gym.Env):
         e = DummyVecEnv([lambda: self] * env_number)
         obs = e.reset()
         return e, obs
+
+    def get_batch_env(self, start_offsets, episode_length=None):
+        """Generates a batch of trajectories of this environment that start at
+        different time offsets and are simulated in parallel.
+
+        Args:
+            start_offsets: List of time offsets (in time indexes) from the first
+                possible start of the environment, one per trajectory.
+            episode_length: Number of timesteps of each trajectory. If None, the
+                largest length allowed by the latest start is used.
+
+        Returns:
+            A PortfolioOptimizationBatchEnv instance.
+        """
+        return PortfolioOptimizationBatchEnv(self, start_offsets, episode_length)
+
+
+class PortfolioOptimizationBatchEnv:
+    """A batch of portfolio trajectories simulated in parallel.
+
+    The trajectories share the (already preprocessed) data, initial amount and
+    comission fee model of a PortfolioOptimizationEnv, but each one starts at its
+    own time offset. Every step receives one action per trajectory and simulates
+    all of them at once over arrays of shape (f, n, T) with the features and
+    (T, portfolio_size + 1) with the price variations, instead of selecting rows
+    of the dataframe as PortfolioOptimizationEnv does. The observations are
+    stacked Boxes of shape (batch, f, n, t) and the rewards, terminal flag and
+    informations also refer to the whole batch. Unlike PortfolioOptimizationEnv,
+    the last step of the trajectories is already terminal and no plots are saved.
+
+    Attributes:
+        num_trajectories: Number of trajectories in the batch.
+        start_offsets: Time offset of each trajectory.
+        episode_length: Number of timesteps of each trajectory.
+        portfolio_size: Number of stocks in the portfolio.
+        portfolio_values: Array of shape (batch, episode_length + 1) with the
+            portfolio value of each trajectory after each timestep.
+    """
+
+    def __init__(self, env, start_offsets, episode_length=None):
+        """Initializes the batch of trajectories.
+
+        Args:
+            env: PortfolioOptimizationEnv whose data and settings are used. It
+                must not return the last action in its observations.
+            start_offsets: List of time offsets (in time indexes) from the first
+                possible start of the environment, one per trajectory.
+            episode_length: Number of timesteps of each trajectory. If None, the
+                largest length allowed by the latest start is used.
+        """
+        if env._return_last_action:
+            raise ValueError(
+                "Batches of trajectories only support Box observations, create the "
+                "environment with return_last_action set to False."
+            )
+        self._time_window = env._time_window
+        self._initial_amount = env._initial_amount
+        self._reward_scaling = env._reward_scaling
+        self._comission_fee_pct = env._comission_fee_pct
+        self._comission_fee_model = env._comission_fee_model
+        self._sorted_times = env._sorted_times
+        self.portfolio_size = env.portfolio_size
+
+        # features array of shape (f, n, T)
+        times = pd.DatetimeIndex(self._sorted_times)
+        self._data = np.stack(
+            [
+                env._df.pivot(
+                    index=env._time_column, columns=env._tic_column, values=feature
+                )
+                .reindex(index=times, columns=env._tic_list)
+                .to_numpy(dtype=np.float32)
+                .T
+                for feature in env._features
+            ]
+        )
+        # price variations of shape (T, portfolio_size + 1), cash comes first
+        df_price_variation = env._df_price_variation
+        price_variation = (
+            df_price_variation.pivot(
+                index=env._time_column,
+                columns=env._tic_column,
+                values=env._valuation_feature,
+            )
+            .reindex(index=times, columns=df_price_variation[env._tic_column].unique())
+            .to_numpy(dtype=np.float32)
+        )
+        self._price_variation = np.insert(price_variation, 0, 1, axis=1)
+
+        self.start_offsets = np.asarray(start_offsets, dtype=np.intp)
+        self.num_trajectories = len(self.start_offsets)
+        max_length = len(self._sorted_times) - self._time_window
+        if self.start_offsets.min(initial=0) < 0 or (
+            self.start_offsets.max(initial=0) >= max_length
+        ):
+            raise ValueError(f"Start offsets must be between 0 and {max_length - 1}.")
+        if episode_length is None:
+            episode_length = max_length - self.start_offsets.max()
+        elif self.start_offsets.max() + episode_length > max_length:
+            raise ValueError(
+                "The latest start offset leaves only "
+                f"{max_length - self.start_offsets.max()} timesteps."
+            )
+        self.episode_length = int(episode_length)
+        self.reset()
+
+    def reset(self):
+        """Resets all trajectories to their start time.
+
+        Returns:
+            Initial states of shape (batch, f, n, t).
+        """
+        self._step = 0
+        self._time_index = self._time_window - 1 + self.start_offsets
+        self._portfolio_value = np.full(
+            self.num_trajectories, self._initial_amount, dtype=np.float64
+        )
+        self._final_weights = np.zeros(
+            (self.num_trajectories, self.portfolio_size + 1), dtype=np.float64
+        )
+        self._final_weights[:, 0] = 1
+        self.portfolio_values = np.empty(
+            (self.num_trajectories, self.episode_length + 1), dtype=np.float64
+        )
+        self.portfolio_values[:, 0] = self._portfolio_value
+        return self._get_states(self._time_index)
+
+    def step(self, actions):
+        """Performs a simulation step in all trajectories.
+
+        Args:
+            actions: Array of shape (batch, portfolio_size + 1) with the new
+                portfolio weights of each trajectory.
+
+        Returns:
+            A tuple (states, rewards, terminal, info), where states has shape
+            (batch, f, n, t), rewards has shape (batch,) and info is a dictionary
+            with the arrays "end_time_index", "price_variation" and "trf_mu" of
+            the trajectories. The transaction remainder factors are 1 if the "trf"
+            model is not used.
+        """
+        actions = np.array(actions, dtype=np.float32).reshape(self.num_trajectories, -1)
+
+        # if necessary, normalize weights of each trajectory
+        valid = (np.abs(np.sum(actions, axis=1) - 1) <= 1e-6) & (
+            np.min(actions, axis=1) >= 0
+        )
+        exp_actions = np.exp(actions)
+        weights = np.where(
+            valid[:, np.newaxis],
+            actions,
+            exp_actions / np.sum(exp_actions, axis=1, keepdims=True),
+        )
+        last_weights = self._final_weights
+        last_portfolio_value = self._portfolio_value
+
+        # load next states
+        self._step += 1
+        self._time_index = self._time_index + 1
+        states = self._get_states(self._time_index)
+        price_variation = self._price_variation[self._time_index]
+
+        mu = np.ones(self.num_trajectories, dtype=np.float64)
+        if self._comission_fee_model == "wvm":
+            delta_assets = (weights - last_weights)[:, 1:]
+            fees = np.sum(
+                np.abs(delta_assets * self._portfolio_value[:, np.newaxis]), axis=1
+            )
+            keep = fees > weights[:, 0] * self._portfolio_value
+            portfolio = weights * self._portfolio_value[:, np.newaxis]
+            portfolio[:, 0] -= fees
+            portfolio_value = np.sum(portfolio, axis=1)
+            weights = np.where(
+                keep[:, np.newaxis],
+                last_weights,
+                portfolio / portfolio_value[:, np.newaxis],
+            )
+            self._portfolio_value = np.where(
+                keep, self._portfolio_value, portfolio_value
+            )
+        elif self._comission_fee_model == "trf":
+            # fixed point iteration of each trajectory until its own convergence
+            c = self._comission_fee_pct
+            last_mu = mu
+            mu = np.full(self.num_trajectories, 1 - 2 * c + c**2)
+            active = np.abs(mu - last_mu) > 1e-10
+            while np.any(active):
+                last_mu = mu[active]
+                mu[active] = (
+                    1
+                    - c * weights[active, 0]
+                    - (2 * c - c**2)
+                    * np.sum(
+                        np.maximum(
+                            last_weights[active, 1:]
+                            - last_mu[:, np.newaxis] * weights[active, 1:],
+                            0,
+                        ),
+                        axis=1,
+                    )
+                ) / (1 - c * weights[active, 0])
+                active[active] = np.abs(mu[active] - last_mu) > 1e-10
+            self._portfolio_value = mu * self._portfolio_value
+
+        # time passes and time variation changes the portfolio distribution
+        portfolio = self._portfolio_value[:, np.newaxis] * (weights * price_variation)
+        self._portfolio_value = np.sum(portfolio, axis=1)
+        self._final_weights = portfolio / self._portfolio_value[:, np.newaxis]
+        self.portfolio_values[:, self._step] = self._portfolio_value
+
+        rewards = (
+            np.log(self._portfolio_value / last_portfolio_value) * self._reward_scaling
+        )
+        info = {
+            "end_time_index": self._time_index,
+            "price_variation": price_variation,
+            "trf_mu": mu,
+        }
+        return states, rewards, self._step >= self.episode_length, info
+
+    def _get_states(self, time_index):
+        """Gets the states of the trajectories given their time indexes.
+
+        Args:
+            time_index: Array with the current time index of each trajectory.
+
+        Returns:
+            States of shape (batch, f, n, t).
+        """
+        window = time_index[:, np.newaxis] + np.arange(1 - self._time_window, 1)
+        return np.ascontiguousarray(self._data[:, :, window].transpose(2, 0, 1, 3))
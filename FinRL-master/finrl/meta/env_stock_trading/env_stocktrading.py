@@ -4,18 +4,56 @@ from typing import List
 
 import gymnasium as gym
 import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from gymnasium import spaces
 from gymnasium.utils import seeding
 from stable_baselines3.common.vec_env import DummyVecEnv
 
+from finrl.meta.env_stock_trading.reporting import EpisodeReport
+from finrl.meta.env_stock_trading.reporting import FileReporter
+from finrl.meta.env_stock_trading.reporting import NullReporter
+
 matplotlib.use("Agg")
 
 # from stable_baselines3.common.logger import Logger, KVWriter, CSVOutputFormat
 
 
+class ArrayMemory:
+    """List-like episode memory backed by an array preallocated to the episode length
+
+    ``append`` writes into the next row and ``clear`` rewinds, so an episode
+    neither allocates per step nor keeps Python objects for every value.
+    Indexing, ``len`` and iteration see only the rows written so far.
+    """
+
+    def __init__(self, capacity, shape=(), dtype=np.float64):
+        self.buffer = np.zeros((capacity, *shape), dtype=dtype)
+        self.size = 0
+
+    def append(self, value):
+        self.buffer[self.size] = value
+        self.size += 1
+
+    def clear(self):
+        self.size = 0
+
+    def to_numpy(self):
+        return self.buffer[: self.size]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.to_numpy(), dtype=dtype)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return self.to_numpy()[index]
+
+    def __iter__(self):
+        return iter(self.to_numpy())
+
+
 class StockTradingEnv(gym.Env):
     """A stock trading environment for OpenAI gym"""
 
@@ -44,6 +82,8 @@ class StockTradingEnv(gym.Env):
         model_name="",
         mode="",
         iteration="",
+        reporter=None,
+        record_state_memory=True,
     ):
         self.day = day
         self.df = df
@@ -61,7 +101,6 @@ class StockTradingEnv(gym.Env):
         self.observation_space = spaces.Box(
             low=-np.inf, high=np.inf, shape=(self.state_space,)
         )
-        self.data = self.df.loc[self.day, :]
         self.terminal = False
         self.make_plots = make_plots
         self.print_verbosity = print_verbosity
@@ -72,6 +111,17 @@ class StockTradingEnv(gym.Env):
         self.model_name = model_name
         self.mode = mode
         self.iteration = iteration
+        # terminal reports are written to results/ only for plots or named runs
+        if reporter is None:
+            reporter = (
+                FileReporter()
+                if make_plots or (model_name != "" and mode != "")
+                else NullReporter()
+            )
+        self.reporter = reporter
+        # array fast path: per-day prices, indicators and dates looked up by step()
+        self.multiple_stock = len(self.df.tic.unique()) > 1
+        self._init_day_arrays()
         # initalize state
         self.state = self._initiate_state()
 
@@ -81,20 +131,27 @@ class StockTradingEnv(gym.Env):
         self.cost = 0
         self.trades = 0
         self.episode = 0
+        # episode memories, preallocated to the number of days in df
+        n_days = len(self.date_ary)
+        self.asset_memory = ArrayMemory(n_days)
+        self.rewards_memory = ArrayMemory(n_days)
+        self.actions_memory = ArrayMemory(n_days, (self.stock_dim,), dtype=np.int64)
+        # we need sometimes to preserve the state in the middle of trading process,
+        # training can save the memory with record_state_memory=False
+        self.record_state_memory = record_state_memory
+        self.state_memory = ArrayMemory(
+            n_days if record_state_memory else 0, (len(self.state),)
+        )
+        self.date_memory = ArrayMemory(n_days, dtype=self.date_ary.dtype)
         # memorize all the total balance change
-        self.asset_memory = [
+        self.asset_memory.append(
             self.initial_amount
             + np.sum(
                 np.array(self.num_stock_shares)
                 * np.array(self.state[1 : 1 + self.stock_dim])
             )
-        ]  # the initial total asset is calculated by cash + sum (num_share_stock_i * price_stock_i)
-        self.rewards_memory = []
-        self.actions_memory = []
-        self.state_memory = (
-            []
-        )  # we need sometimes to preserve the state in the middle of trading process
-        self.date_memory = [self._get_date()]
+        )  # the initial total asset is calculated by cash + sum (num_share_stock_i * price_stock_i)
+        self.date_memory.append(self._get_date())
         #         self.logger = Logger('results',[CSVOutputFormat])
         # self.reset()
         self._seed()
@@ -212,83 +269,34 @@ class StockTradingEnv(gym.Env):
 
         return buy_num_shares
 
-    def _make_plot(self):
-        plt.plot(self.asset_memory, "r")
-        plt.savefig(f"results/account_value_trade_{self.episode}.png")
-        plt.close()
-
     def step(self, actions):
-        self.terminal = self.day >= len(self.df.index.unique()) - 1
+        self.terminal = self.day >= len(self.date_ary) - 1
         if self.terminal:
             # print(f"Episode: {self.episode}")
-            if self.make_plots:
-                self._make_plot()
-            end_total_asset = self.state[0] + sum(
-                np.array(self.state[1 : (self.stock_dim + 1)])
-                * np.array(self.state[(self.stock_dim + 1) : (self.stock_dim * 2 + 1)])
-            )
-            df_total_value = pd.DataFrame(self.asset_memory)
-            tot_reward = (
-                self.state[0]
-                + sum(
+            episode_report = self._get_episode_report()
+            if self.episode % self.print_verbosity == 0:
+                end_total_asset = self.state[0] + sum(
                     np.array(self.state[1 : (self.stock_dim + 1)])
                     * np.array(
                         self.state[(self.stock_dim + 1) : (self.stock_dim * 2 + 1)]
                     )
                 )
-                - self.asset_memory[0]
-            )  # initial_amount is only cash part of our initial asset
-            df_total_value.columns = ["account_value"]
-            df_total_value["date"] = self.date_memory
-            df_total_value["daily_return"] = df_total_value["account_value"].pct_change(
-                1
-            )
-            if df_total_value["daily_return"].std() != 0:
-                sharpe = (
-                    (252**0.5)
-                    * df_total_value["daily_return"].mean()
-                    / df_total_value["daily_return"].std()
-                )
-            df_rewards = pd.DataFrame(self.rewards_memory)
-            df_rewards.columns = ["account_rewards"]
-            df_rewards["date"] = self.date_memory[:-1]
-            if self.episode % self.print_verbosity == 0:
+                tot_reward = (
+                    end_total_asset - self.asset_memory[0]
+                )  # initial_amount is only cash part of our initial asset
+                sharpe = episode_report.sharpe()
                 print(f"day: {self.day}, episode: {self.episode}")
                 print(f"begin_total_asset: {self.asset_memory[0]:0.2f}")
                 print(f"end_total_asset: {end_total_asset:0.2f}")
                 print(f"total_reward: {tot_reward:0.2f}")
                 print(f"total_cost: {self.cost:0.2f}")
                 print(f"total_trades: {self.trades}")
-                if df_total_value["daily_return"].std() != 0:
+                if sharpe is not None:
                     print(f"Sharpe: {sharpe:0.3f}")
                 print("=================================")
 
-            if (self.model_name != "") and (self.mode != ""):
-                df_actions = self.save_action_memory()
-                df_actions.to_csv(
-                    "results/actions_{}_{}_{}.csv".format(
-                        self.mode, self.model_name, self.iteration
-                    )
-                )
-                df_total_value.to_csv(
-                    "results/account_value_{}_{}_{}.csv".format(
-                        self.mode, self.model_name, self.iteration
-                    ),
-                    index=False,
-                )
-                df_rewards.to_csv(
-                    "results/account_rewards_{}_{}_{}.csv".format(
-                        self.mode, self.model_name, self.iteration
-                    ),
-                    index=False,
-                )
-                plt.plot(self.asset_memory, "r")
-                plt.savefig(
-                    "results/account_value_{}_{}_{}.png".format(
-                        self.mode, self.model_name, self.iteration
-                    )
-                )
-                plt.close()
+            # CSVs and plots are left to the reporter, see reporting.py
+            self.reporter.report(episode_report)
 
             # Add outputs to logger interface
             # logger.record("environment/portfolio_value", end_total_asset)
@@ -332,12 +340,8 @@ class StockTradingEnv(gym.Env):
 
             # state: s -> s+1
             self.day += 1
-            self.data = self.df.loc[self.day, :]
             if self.turbulence_threshold is not None:
-                if len(self.df.tic.unique()) == 1:
-                    self.turbulence = self.data[self.risk_indicator_col]
-                elif len(self.df.tic.unique()) > 1:
-                    self.turbulence = self.data[self.risk_indicator_col].values[0]
+                self.turbulence = self.risk_ary[self.day]
             self.state = self._update_state()
 
             end_total_asset = self.state[0] + sum(
@@ -349,9 +353,9 @@ class StockTradingEnv(gym.Env):
             self.reward = end_total_asset - begin_total_asset
             self.rewards_memory.append(self.reward)
             self.reward = self.reward * self.reward_scaling
-            self.state_memory.append(
-                self.state
-            )  # add current state in state_recorder for each step
+            if self.record_state_memory:
+                # add current state in state_recorder for each step
+                self.state_memory.append(self.state)
 
         return self.state, self.reward, self.terminal, False, {}
 
@@ -363,17 +367,17 @@ class StockTradingEnv(gym.Env):
     ):
         # initiate state
         self.day = 0
-        self.data = self.df.loc[self.day, :]
         self.state = self._initiate_state()
 
+        self.asset_memory.clear()
         if self.initial:
-            self.asset_memory = [
+            self.asset_memory.append(
                 self.initial_amount
                 + np.sum(
                     np.array(self.num_stock_shares)
                     * np.array(self.state[1 : 1 + self.stock_dim])
                 )
-            ]
+            )
         else:
             previous_total_asset = self.previous_state[0] + sum(
                 np.array(self.state[1 : (self.stock_dim + 1)])
@@ -381,16 +385,18 @@ class StockTradingEnv(gym.Env):
                     self.previous_state[(self.stock_dim + 1) : (self.stock_dim * 2 + 1)]
                 )
             )
-            self.asset_memory = [previous_total_asset]
+            self.asset_memory.append(previous_total_asset)
 
         self.turbulence = 0
         self.cost = 0
         self.trades = 0
         self.terminal = False
         # self.iteration=self.iteration
-        self.rewards_memory = []
-        self.actions_memory = []
-        self.date_memory = [self._get_date()]
+        self.rewards_memory.clear()
+        self.actions_memory.clear()
+        self.state_memory.clear()
+        self.date_memory.clear()
+        self.date_memory.append(self._get_date())
 
         self.episode += 1
 
@@ -402,147 +408,132 @@ class StockTradingEnv(gym.Env):
     def _initiate_state(self):
         if self.initial:
             # For Initial State
-            if len(self.df.tic.unique()) > 1:
-                # for multiple stock
-                state = (
-                    [self.initial_amount]
-                    + self.data.close.values.tolist()
-                    + self.num_stock_shares
-                    + sum(
-                        (
-                            self.data[tech].values.tolist()
-                            for tech in self.tech_indicator_list
-                        ),
-                        [],
-                    )
-                )  # append initial stocks_share to initial state, instead of all zero
-            else:
-                # for single stock
-                state = (
-                    [self.initial_amount]
-                    + [self.data.close]
-                    + [0] * self.stock_dim
-                    + sum(([self.data[tech]] for tech in self.tech_indicator_list), [])
-                )
+            cash = self.initial_amount
+            # append initial stocks_share to initial state, instead of all zero
+            holdings = (
+                self.num_stock_shares if self.multiple_stock else [0] * self.stock_dim
+            )
         else:
             # Using Previous State
-            if len(self.df.tic.unique()) > 1:
-                # for multiple stock
-                state = (
-                    [self.previous_state[0]]
-                    + self.data.close.values.tolist()
-                    + self.previous_state[
-                        (self.stock_dim + 1) : (self.stock_dim * 2 + 1)
-                    ]
-                    + sum(
-                        (
-                            self.data[tech].values.tolist()
-                            for tech in self.tech_indicator_list
-                        ),
-                        [],
-                    )
-                )
-            else:
-                # for single stock
-                state = (
-                    [self.previous_state[0]]
-                    + [self.data.close]
-                    + self.previous_state[
-                        (self.stock_dim + 1) : (self.stock_dim * 2 + 1)
-                    ]
-                    + sum(([self.data[tech]] for tech in self.tech_indicator_list), [])
-                )
+            cash = self.previous_state[0]
+            holdings = self.previous_state[
+                (self.stock_dim + 1) : (self.stock_dim * 2 + 1)
+            ]
+        state = (
+            [cash]
+            + self.close_ary[self.day].tolist()
+            + list(holdings)
+            + self.tech_ary[self.day].tolist()
+        )
         return state
 
     def _update_state(self):
-        if len(self.df.tic.unique()) > 1:
-            # for multiple stock
-            state = (
-                [self.state[0]]
-                + self.data.close.values.tolist()
-                + list(self.state[(self.stock_dim + 1) : (self.stock_dim * 2 + 1)])
-                + sum(
-                    (
-                        self.data[tech].values.tolist()
-                        for tech in self.tech_indicator_list
-                    ),
-                    [],
-                )
-            )
+        state = (
+            [self.state[0]]
+            + self.close_ary[self.day].tolist()
+            + list(self.state[(self.stock_dim + 1) : (self.stock_dim * 2 + 1)])
+            + self.tech_ary[self.day].tolist()
+        )
+        return state
 
-        else:
-            # for single stock
-            state = (
-                [self.state[0]]
-                + [self.data.close]
-                + list(self.state[(self.stock_dim + 1) : (self.stock_dim * 2 + 1)])
-                + sum(([self.data[tech]] for tech in self.tech_indicator_list), [])
+    @property
+    def data(self):
+        # rows of the current day; step() itself only reads the day arrays
+        return self.df.loc[self.day, :]
+
+    def _init_day_arrays(self):
+        """gather the per-day columns used by step() into arrays indexed by day"""
+        # rows of day d in the same order as self.df.loc[d, :], one row per stock
+        days, rows_per_day = np.unique(self.df.index.values, return_counts=True)
+        if np.any(rows_per_day != rows_per_day[0]):
+            uneven = days[rows_per_day != rows_per_day[0]]
+            raise ValueError(
+                f"Every day must have the same number of rows (one per stock), but day "
+                f"{days[0]} has {rows_per_day[0]} and days {list(uneven[:5])} differ."
             )
+        rows = np.argsort(self.df.index.values, kind="stable").reshape(len(days), -1)
+
+        self.close_ary = self._get_day_ary("close", rows)
+        # tech_ary[day] == [tech_0 of every stock, tech_1 of every stock, ...]
+        n_stocks = rows.shape[1]
+        self.tech_ary = np.empty((len(days), len(self.tech_indicator_list) * n_stocks))
+        for i, tech in enumerate(self.tech_indicator_list):
+            tech_columns = slice(i * n_stocks, (i + 1) * n_stocks)
+            self.tech_ary[:, tech_columns] = self._get_day_ary(tech, rows)
+        # only the first row of each day for the columns shared by all stocks
+        self.date_ary = self._get_day_ary("date", rows[:, :1])[:, 0]
+        self.risk_ary = (
+            self._get_day_ary(self.risk_indicator_col, rows[:, :1])[:, 0]
+            if self.risk_indicator_col in self.df.columns
+            else None
+        )
 
-        return state
+    def _get_day_ary(self, col, rows):
+        return self.df[col].iloc[rows.ravel()].to_numpy().reshape(rows.shape)
+
+    def _get_episode_report(self):
+        return EpisodeReport(
+            episode=self.episode,
+            # copies, the memories are rewound on reset
+            asset_memory=self.asset_memory.to_numpy().copy(),
+            date_memory=self.date_memory.to_numpy().copy(),
+            rewards_memory=self.rewards_memory.to_numpy().copy(),
+            actions_memory=self.actions_memory.to_numpy().copy(),
+            tics=list(np.atleast_1d(self.data.tic)),
+            cost=self.cost,
+            trades=self.trades,
+            model_name=self.model_name,
+            mode=self.mode,
+            iteration=self.iteration,
+            make_plots=self.make_plots,
+        )
 
     def _get_date(self):
-        if len(self.df.tic.unique()) > 1:
-            date = self.data.date.unique()[0]
-        else:
-            date = self.data.date
-        return date
+        return self.date_ary[self.day]
 
     # add save_state_memory to preserve state in the trading process
     def save_state_memory(self):
-        if len(self.df.tic.unique()) > 1:
+        if not self.record_state_memory:
+            raise ValueError("state memory is not recorded, see record_state_memory")
+        date_list = self.date_memory[:-1]
+        if self.multiple_stock:
             # date and close price length must match actions length
-            date_list = self.date_memory[:-1]
-            df_date = pd.DataFrame(date_list)
-            df_date.columns = ["date"]
-
-            state_list = self.state_memory
+            tics = self.data.tic.values
+            columns = (
+                ["cash"]
+                + [f"{tic}_price" for tic in tics]
+                + [f"{tic}_num" for tic in tics]
+                + [f"{tic}_{tech}" for tech in self.tech_indicator_list for tic in tics]
+            )
             df_states = pd.DataFrame(
-                state_list,
-                columns=[
-                    "cash",
-                    "Bitcoin_price",
-                    "Gold_price",
-                    "Bitcoin_num",
-                    "Gold_num",
-                    "Bitcoin_Disable",
-                    "Gold_Disable",
-                ],
+                self.state_memory.to_numpy(),
+                columns=columns,
+                index=pd.Index(date_list, name="date"),
             )
-            df_states.index = df_date.date
-            # df_actions = pd.DataFrame({'date':date_list,'actions':action_list})
         else:
-            date_list = self.date_memory[:-1]
-            state_list = self.state_memory
+            state_list = self.state_memory.to_numpy().tolist()
             df_states = pd.DataFrame({"date": date_list, "states": state_list})
-        # print(df_states)
         return df_states
 
     def save_asset_memory(self):
-        date_list = self.date_memory
-        asset_list = self.asset_memory
-        # print(len(date_list))
-        # print(len(asset_list))
+        date_list = self.date_memory.to_numpy()
+        asset_list = self.asset_memory.to_numpy()
         df_account_value = pd.DataFrame(
             {"date": date_list, "account_value": asset_list}
         )
         return df_account_value
 
     def save_action_memory(self):
-        if len(self.df.tic.unique()) > 1:
+        date_list = self.date_memory[:-1]
+        if self.multiple_stock:
             # date and close price length must match actions length
-            date_list = self.date_memory[:-1]
-            df_date = pd.DataFrame(date_list)
-            df_date.columns = ["date"]
-
-            action_list = self.actions_memory
-            df_actions = pd.DataFrame(action_list)
-            df_actions.columns = self.data.tic.values
-            df_actions.index = df_date.date
-            # df_actions = pd.DataFrame({'date':date_list,'actions':action_list})
+            df_actions = pd.DataFrame(
+                self.actions_memory.to_numpy(),
+                columns=self.data.tic.values,
+                index=pd.Index(date_list, name="date"),
+            )
         else:
-            date_list = self.date_memory[:-1]
-            action_list = self.actions_memory
+            action_list = list(self.actions_memory)
             df_actions = pd.DataFrame({"date": date_list, "actions": action_list})
         return df_actions
 
@@ -99,13 +99,63 @@ class StockTradingEnvCashpenalty(gym.Env):
         self.cache_indicator_data = cache_indicator_data
         self.cached_data = None
         self.cash_penalty_proportion = cash_penalty_proportion
+        self.cached_cols = None
         if self.cache_indicator_data:
             print("caching data")
-            self.cached_data = [
-                self.get_date_vector(i) for i, _ in enumerate(self.dates)
-            ]
+            self.cache_date_vectors()
             print("data cached!")
 
+    def cache_date_vectors(self):
+        """Pivots the data into a read-only (dates, assets, features) array
+
+        The features are ``daily_information_cols`` followed by the ``close``
+        and ``turbulence`` columns read by ``step``, so every date vector is a
+        slice of ``cached_data`` instead of a ``df.loc`` lookup.
+        """
+        non_numeric = [
+            col
+            for col in self.daily_information_cols
+            if not pd.api.types.is_numeric_dtype(self.df[col])
+        ]
+        if non_numeric:
+            raise ValueError(
+                f"cache_indicator_data needs numeric daily_information_cols, got {non_numeric}"
+            )
+        self.cached_cols = list(self.daily_information_cols)
+        for col in ["close", "turbulence"]:
+            if (
+                col in self.df.columns
+                and col not in self.cached_cols
+                and pd.api.types.is_numeric_dtype(self.df[col])
+            ):
+                self.cached_cols.append(col)
+        date_codes = self.dates.searchsorted(self.df.index.to_numpy())
+        asset_codes = pd.Index(self.assets).get_indexer(self.df[self.stock_col])
+        n_dates, n_assets = len(self.dates), len(self.assets)
+        counts = np.bincount(date_codes * n_assets + asset_codes)
+        if len(counts) != n_dates * n_assets or (counts != 1).any():
+            raise ValueError(
+                "cache_indicator_data needs exactly one row per asset and date"
+            )
+        cached_data = np.empty((n_dates, n_assets, len(self.cached_cols)))
+        cached_data[date_codes, asset_codes] = self.df[self.cached_cols].to_numpy(
+            dtype=np.float64
+        )
+        cached_data.flags.writeable = False
+        self.cached_data = cached_data
+
+    def __deepcopy__(self, memo):
+        # copies made by get_sb_env and get_multiproc_env share the read-only
+        # market data; forked SubprocVecEnv workers never write to its pages
+        memo[id(self.df)] = self.df
+        if self.cached_data is not None:
+            memo[id(self.cached_data)] = self.cached_data
+        env = self.__class__.__new__(self.__class__)
+        memo[id(self)] = env
+        for k, v in self.__dict__.items():
+            setattr(env, k, deepcopy(v, memo))
+        return env
+
     def seed(self, seed=None):
         if seed is None:
             seed = int(round(time.time() * 1000))
@@ -127,7 +177,7 @@ class StockTradingEnvCashpenalty(gym.Env):
 
     @property
     def closings(self):
-        return np.array(self.get_date_vector(self.date_index, cols=["close"]))
+        return self.get_date_array(self.date_index, cols=["close"])
 
     def reset(
         self,
@@ -154,17 +204,31 @@ class StockTradingEnvCashpenalty(gym.Env):
             "total_assets": [],
             "reward": [],
         }
-        init_state = np.array(
-            [self.initial_amount]
-            + [0] * len(self.assets)
-            + self.get_date_vector(self.date_index)
+        init_state = np.concatenate(
+            (
+                [self.initial_amount],
+                np.zeros(len(self.assets)),
+                self.get_date_array(self.date_index),
+            )
         )
         self.state_memory.append(init_state)
         return init_state
 
+    def get_date_array(self, date, cols=None):
+        """``get_date_vector`` as a numpy array, read from the cache if possible"""
+        if self.cached_data is None:
+            return np.array(self.get_date_vector(date, cols))
+        if cols is None:
+            n_cols = len(self.daily_information_cols)
+            return self.cached_data[date, :, :n_cols].reshape(-1)
+        if set(cols) <= set(self.cached_cols):
+            col_index = [self.cached_cols.index(col) for col in cols]
+            return self.cached_data[date][:, col_index].reshape(-1)
+        return np.array(self.get_date_vector(date, cols))
+
     def get_date_vector(self, date, cols=None):
-        if (cols is None) and (self.cached_data is not None):
-            return self.cached_data[date]
+        if self.cached_data is not None and set(cols or []) <= set(self.cached_cols):
+            return self.get_date_array(date, cols).tolist()
         else:
             date = self.dates[date]
             if cols is None:
@@ -365,13 +429,13 @@ class StockTradingEnvCashpenalty(gym.Env):
             holdings_updated = self.holdings + transactions
             self.date_index += 1
             if self.turbulence_threshold is not None:
-                self.turbulence = self.get_date_vector(
+                self.turbulence = self.get_date_array(
                     self.date_index, cols=["turbulence"]
                 )[0]
             # Update State
-            state = (
-                [coh] + list(holdings_updated) + self.get_date_vector(self.date_index)
-            )
+            state = np.concatenate(
+                ([coh], holdings_updated, self.get_date_array(self.date_index))
+            ).tolist()
             self.state_memory.append(state)
             return state, reward, False, {}
 
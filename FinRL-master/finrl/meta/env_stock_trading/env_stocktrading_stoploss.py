@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import random
 import time
+from collections import Counter
 from copy import deepcopy
 
 import gym
@@ -9,7 +10,6 @@ import matplotlib
 import numpy as np
 import pandas as pd
 from gym import spaces
-from stable_baselines3.common import logger
 from stable_baselines3.common.vec_env import DummyVecEnv
 from stable_baselines3.common.vec_env import SubprocVecEnv
 
@@ -46,11 +46,19 @@ class StockTradingEnvStopLoss(gym.Env):
         profit_loss_ratio (int, float): Expected profit/loss ratio. Only applicable when stoploss_penalty < 1.
         turbulence_threshold (float): Maximum turbulence allowed in market for purchases to occur. If exceeded, positions are liquidated
         print_verbosity(int): When iterating (step), how often to print stats about state of env
+        verbose (bool): print the stats every print_verbosity steps and on every event
+            (stop loss, low/high profit, cash shortage, turbulence)
         initial_amount: (int, float): Amount of cash initially available
         daily_information_columns (list(str)): Columns to use when building state space from the dataframe. It could be OHLC columns or any other variables such as technical indicators and turbulence index
         cash_penalty_proportion (int, float): Penalty to apply if the algorithm runs out of cash
         patient (bool): option to choose whether end the cycle when we're running out of cash or just don't buy anything until we got additional cash
     action space: <share_dollar_purchases>
+    logging:
+        Events are buffered in event_memory as (episode, step, reason, cash, total_assets, terminal_reward,
+        gain_loss_pct, cash_pct) and counted once per episode. episode_history keeps the formatted rows of
+        all events and periodic updates, whether or not they are printed.
+        The terminal step returns the episode metrics, event counts included, as info["episode_metrics"];
+        TensorboardCallback records them in the SB3 logger.
     TODO:
         add holdings to memory
         move transactions to after the clip step.
@@ -60,6 +68,13 @@ class StockTradingEnvStopLoss(gym.Env):
     """
 
     metadata = {"render.modes": ["human"]}
+    event_reasons = [
+        "TURBULENCE",
+        "STOP LOSS",
+        "CASH SHORTAGE",
+        "LOW PROFIT",
+        "HIGH PROFIT",
+    ]
 
     def __init__(
         self,
@@ -74,6 +89,7 @@ class StockTradingEnvStopLoss(gym.Env):
         profit_loss_ratio=2,
         turbulence_threshold=None,
         print_verbosity=10,
+        verbose=False,
         initial_amount=1e6,
         daily_information_cols=["open", "close", "high", "low", "volume"],
         cache_indicator_data=True,
@@ -95,6 +111,7 @@ class StockTradingEnvStopLoss(gym.Env):
         self.hmax = hmax
         self.initial_amount = initial_amount
         self.print_verbosity = print_verbosity
+        self.verbose = verbose
         self.buy_cost_pct = buy_cost_pct
         self.sell_cost_pct = sell_cost_pct
         self.stoploss_penalty = stoploss_penalty
@@ -110,7 +127,8 @@ class StockTradingEnvStopLoss(gym.Env):
         )
         self.turbulence = 0
         self.episode = -1  # initialize so we can call reset
-        self.episode_history = []
+        self.history_records = []
+        self.episode_metrics = {}
         self.printed_header = False
         self.cache_indicator_data = cache_indicator_data
         self.cached_data = None
@@ -155,6 +173,7 @@ class StockTradingEnvStopLoss(gym.Env):
         self.actions_memory = []
         self.transaction_memory = []
         self.state_memory = []
+        self.event_memory = []
         self.account_information = {
             "cash": [],
             "asset_value": [],
@@ -186,60 +205,86 @@ class StockTradingEnvStopLoss(gym.Env):
 
     def return_terminal(self, reason="Last Date", reward=0):
         state = self.state_memory[-1]
-        self.log_step(reason=reason, terminal_reward=reward)
-        # Add outputs to logger interface
-        gl_pct = self.account_information["total_assets"][-1] / self.initial_amount
-        logger.record("environment/GainLoss_pct", (gl_pct - 1) * 100)
-        logger.record(
-            "environment/total_assets",
-            int(self.account_information["total_assets"][-1]),
-        )
-        reward_pct = self.account_information["total_assets"][-1] / self.initial_amount
-        logger.record("environment/total_reward_pct", (reward_pct - 1) * 100)
-        logger.record("environment/total_trades", self.sum_trades)
-        logger.record(
-            "environment/actual_num_trades",
-            self.actual_num_trades,
-        )
-        logger.record(
-            "environment/avg_daily_trades",
-            self.sum_trades / (self.current_step),
-        )
-        logger.record(
-            "environment/avg_daily_trades_per_asset",
-            self.sum_trades / (self.current_step) / len(self.assets),
-        )
-        logger.record("environment/completed_steps", self.current_step)
-        logger.record(
-            "environment/sum_rewards", np.sum(self.account_information["reward"])
-        )
-        logger.record(
-            "environment/cash_proportion",
-            self.account_information["cash"][-1]
-            / self.account_information["total_assets"][-1],
-        )
-        return state, reward, True, {}
+        self.log_event(reason=reason, terminal_reward=reward)
+        # aggregate the episode once, for the SB3 logger (see TensorboardCallback)
+        total_assets = self.account_information["total_assets"][-1]
+        gl_pct = total_assets / self.initial_amount
+        self.episode_metrics = {
+            "environment/GainLoss_pct": (gl_pct - 1) * 100,
+            "environment/total_assets": int(total_assets),
+            "environment/total_reward_pct": (gl_pct - 1) * 100,
+            "environment/total_trades": self.sum_trades,
+            "environment/actual_num_trades": self.actual_num_trades,
+            "environment/avg_daily_trades": self.sum_trades / (self.current_step),
+            "environment/avg_daily_trades_per_asset": self.sum_trades
+            / (self.current_step)
+            / len(self.assets),
+            "environment/completed_steps": self.current_step,
+            "environment/sum_rewards": np.sum(self.account_information["reward"]),
+            "environment/cash_proportion": self.account_information["cash"][-1]
+            / total_assets,
+        }
+        event_counts = Counter(event[2] for event in self.event_memory)
+        for event_reason in self.event_reasons:
+            key = event_reason.lower().replace(" ", "_")
+            self.episode_metrics[f"environment/events/{key}"] = event_counts[
+                event_reason
+            ]
+        return state, reward, True, {"episode_metrics": self.episode_metrics}
+
+    def log_event(self, reason, terminal_reward=None):
+        # buffered instead of printed; log_step prints it only when verbose
+        self.event_memory.append(self.log_step(reason, terminal_reward))
 
     def log_step(self, reason, terminal_reward=None):
         if terminal_reward is None:
             terminal_reward = self.account_information["reward"][-1]
-        cash_pct = (
-            self.account_information["cash"][-1]
-            / self.account_information["total_assets"][-1]
-        )
-        gl_pct = self.account_information["total_assets"][-1] / self.initial_amount
-        rec = [
+        cash = self.account_information["cash"][-1]
+        total_assets = self.account_information["total_assets"][-1]
+        record = (
             self.episode,
             self.date_index - self.starting_point,
             reason,
-            f"{self.currency}{'{:0,.0f}'.format(float(self.account_information['cash'][-1]))}",
-            f"{self.currency}{'{:0,.0f}'.format(float(self.account_information['total_assets'][-1]))}",
+            cash,
+            total_assets,
+            terminal_reward,
+            (total_assets / self.initial_amount - 1) * 100,
+            cash / total_assets * 100,
+        )
+        self.history_records.append(record)
+        if self.verbose:
+            # print header only first time
+            if self.printed_header is False:
+                self.log_header()
+            print(self.template.format(*self.format_record(record)))
+        return record
+
+    def format_record(self, record):
+        (
+            episode,
+            steps,
+            reason,
+            cash,
+            total_assets,
+            terminal_reward,
+            gl_pct,
+            cash_pct,
+        ) = record
+        return [
+            episode,
+            steps,
+            reason,
+            f"{self.currency}{'{:0,.0f}'.format(float(cash))}",
+            f"{self.currency}{'{:0,.0f}'.format(float(total_assets))}",
             f"{terminal_reward*100:0.5f}%",
-            f"{(gl_pct - 1)*100:0.5f}%",
-            f"{cash_pct*100:0.2f}%",
+            f"{gl_pct:0.5f}%",
+            f"{cash_pct:0.2f}%",
         ]
-        self.episode_history.append(rec)
-        print(self.template.format(*rec))
+
+    @property
+    def episode_history(self):
+        # formatted on demand, so unprinted records cost no string formatting
+        return [self.format_record(record) for record in self.history_records]
 
     def log_header(self):
         self.template = "{0:4}|{1:4}|{2:15}|{3:15}|{4:15}|{5:10}|{6:10}|{7:10}"  # column widths: 8, 10, 15, 7, 10
@@ -297,10 +342,7 @@ class StockTradingEnvStopLoss(gym.Env):
     def step(self, actions):
         # let's just log what we're doing in terms of max actions at each step.
         self.sum_trades += np.sum(np.abs(actions))
-        # print header only first time
-        if self.printed_header is False:
-            self.log_header()
-        # print if it's time.
+        # record (and, if verbose, print) if it's time.
         if (self.current_step + 1) % self.print_verbosity == 0:
             self.log_step(reason="update")
         # if we're at the end
@@ -333,7 +375,7 @@ class StockTradingEnvStopLoss(gym.Env):
                 # if turbulence goes over threshold, just clear out all positions
                 if self.turbulence >= self.turbulence_threshold:
                     actions = -(np.array(holdings) * closings)
-                    self.log_step(reason="TURBULENCE")
+                    self.log_event(reason="TURBULENCE")
             # scale cash purchases to asset
             if self.discrete_actions:
                 # convert into integer because we can't buy fraction of shares
@@ -362,7 +404,7 @@ class StockTradingEnvStopLoss(gym.Env):
                 )
 
                 if any(np.clip(self.closing_diff_avg_buy, -np.inf, 0) < 0):
-                    self.log_step(reason="STOP LOSS")
+                    self.log_event(reason="STOP LOSS")
 
             # compute our proceeds from sells, and add to cash
             sells = -np.clip(actions, -np.inf, 0)
@@ -377,7 +419,7 @@ class StockTradingEnvStopLoss(gym.Env):
             if (spend + costs) > coh:
                 if self.patient:
                     # ... just don't buy anything until we got additional cash
-                    self.log_step(reason="CASH SHORTAGE")
+                    self.log_event(reason="CASH SHORTAGE")
                     actions = np.where(actions > 0, 0, actions)
                     spend = 0
                     costs = 0
@@ -404,10 +446,10 @@ class StockTradingEnvStopLoss(gym.Env):
             )
 
             if any(np.clip(self.profit_sell_diff_avg_buy, -np.inf, 0) < 0):
-                self.log_step(reason="LOW PROFIT")
+                self.log_event(reason="LOW PROFIT")
             else:
                 if any(np.clip(self.profit_sell_diff_avg_buy, 0, np.inf) > 0):
-                    self.log_step(reason="HIGH PROFIT")
+                    self.log_event(reason="HIGH PROFIT")
 
             # verify we didn't do anything impossible here
             assert (spend + costs) <= coh
@@ -471,6 +513,21 @@ class StockTradingEnvStopLoss(gym.Env):
             ]
             return pd.DataFrame(self.account_information)
 
+    def save_event_memory(self):
+        return pd.DataFrame(
+            self.event_memory,
+            columns=[
+                "episode",
+                "step",
+                "reason",
+                "cash",
+                "total_assets",
+                "terminal_reward",
+                "gain_loss_pct",
+                "cash_pct",
+            ],
+        )
+
     def save_action_memory(self):
         if self.current_step == 0:
             return None
@@ -0,0 +1,195 @@
+"""End-of-episode reporting sinks for the stock trading environments.
+
+On its terminal step an environment hands an ``EpisodeReport`` to its
+reporter. What happens next is up to the reporter: ``NullReporter`` drops
+it, ``MemoryReporter`` keeps it, and ``FileReporter`` writes the CSVs and
+plots under ``results/``, optionally from a background thread. DataFrames,
+the Sharpe ratio and plots are only computed by the reporter that needs
+them, so ``step`` does no pandas, disk or matplotlib work of its own.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from finrl import config
+
+
+class EpisodeReport:
+    """Memories of one finished episode, converted to DataFrames on request"""
+
+    def __init__(
+        self,
+        episode,
+        asset_memory,
+        date_memory,
+        rewards_memory,
+        actions_memory,
+        tics,
+        cost=0,
+        trades=0,
+        model_name="",
+        mode="",
+        iteration="",
+        make_plots=False,
+    ):
+        self.episode = episode
+        self.asset_memory = asset_memory
+        self.date_memory = date_memory
+        self.rewards_memory = rewards_memory
+        self.actions_memory = actions_memory
+        self.tics = tics
+        self.cost = cost
+        self.trades = trades
+        self.model_name = model_name
+        self.mode = mode
+        self.iteration = iteration
+        self.make_plots = make_plots
+
+    @property
+    def begin_total_asset(self):
+        return self.asset_memory[0]
+
+    @property
+    def end_total_asset(self):
+        return self.asset_memory[-1]
+
+    def sharpe(self):
+        """annualized Sharpe ratio of the daily returns, None if they are constant"""
+        asset = np.asarray(self.asset_memory, dtype=np.float64)
+        daily_return = np.diff(asset) / asset[:-1]
+        if len(daily_return) < 2 or daily_return.std() == 0:
+            return None
+        return (252**0.5) * daily_return.mean() / daily_return.std(ddof=1)
+
+    def account_value(self):
+        df_total_value = pd.DataFrame(
+            {"account_value": self.asset_memory, "date": self.date_memory}
+        )
+        df_total_value["daily_return"] = df_total_value["account_value"].pct_change(1)
+        return df_total_value
+
+    def account_rewards(self):
+        return pd.DataFrame(
+            {"account_rewards": self.rewards_memory, "date": self.date_memory[:-1]}
+        )
+
+    def actions(self):
+        if len(self.tics) > 1:
+            df_actions = pd.DataFrame(self.actions_memory, columns=self.tics)
+            df_actions.index = pd.Index(self.date_memory[:-1], name="date")
+        else:
+            df_actions = pd.DataFrame(
+                {"date": self.date_memory[:-1], "actions": list(self.actions_memory)}
+            )
+        return df_actions
+
+
+class NullReporter:
+    """Discards every report; the default for training"""
+
+    def report(self, episode_report):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryReporter(NullReporter):
+    """Keeps the last ``maxlen`` reports (all of them if None) in memory"""
+
+    def __init__(self, maxlen=None):
+        self.reports = deque(maxlen=maxlen)
+
+    def report(self, episode_report):
+        self.reports.append(episode_report)
+
+
+class FileReporter(NullReporter):
+    """Writes reports to ``results_dir``, in a background thread if asked
+
+    Named runs (``model_name`` and ``mode`` set) get the actions, account
+    value and account rewards CSVs plus an account value plot; episodes of
+    environments created with ``make_plots=True`` get an account value plot.
+    With ``background=True`` the environment only enqueues the report, and
+    ``flush()`` waits until everything queued so far is on disk.
+    """
+
+    def __init__(self, results_dir=config.RESULTS_DIR, background=False):
+        self.results_dir = results_dir
+        self.background = background
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    def report(self, episode_report):
+        if not self.background:
+            self.write(episode_report)
+            return
+        # the thread does not survive fork(), so SubprocVecEnv workers start their own
+        if self._thread is None or self._pid != os.getpid():
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+        self._queue.put(episode_report)
+
+    def flush(self):
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        self.flush()
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join()
+        self._queue = self._thread = self._pid = None
+
+    def _run(self):
+        while True:
+            episode_report = self._queue.get()
+            try:
+                if episode_report is None:
+                    return
+                self.write(episode_report)
+            finally:
+                self._queue.task_done()
+
+    def write(self, episode_report):
+        r = episode_report
+        os.makedirs(self.results_dir, exist_ok=True)
+        if r.make_plots:
+            self._plot(r.asset_memory, f"account_value_trade_{r.episode}.png")
+        if (r.model_name != "") and (r.mode != ""):
+            suffix = f"{r.mode}_{r.model_name}_{r.iteration}"
+            r.actions().to_csv(os.path.join(self.results_dir, f"actions_{suffix}.csv"))
+            r.account_value().to_csv(
+                os.path.join(self.results_dir, f"account_value_{suffix}.csv"),
+                index=False,
+            )
+            r.account_rewards().to_csv(
+                os.path.join(self.results_dir, f"account_rewards_{suffix}.csv"),
+                index=False,
+            )
+            self._plot(r.asset_memory, f"account_value_{suffix}.png")
+
+    def _plot(self, asset_memory, file_name):
+        # a standalone Figure instead of pyplot, which is not thread-safe
+        fig = Figure()
+        fig.subplots().plot(asset_memory, "r")
+        fig.savefig(os.path.join(self.results_dir, file_name))
+
+    def __getstate__(self):  # queues and threads cannot be pickled
+        state = self.__dict__.copy()
+        state.update(_queue=None, _thread=None, _pid=None)
+        return state
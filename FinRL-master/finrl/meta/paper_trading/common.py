@@ -127,6 +127,8 @@ class Config:
             None  # ReplayBuffer size. Empty the ReplayBuffer for on-policy.
         )
         self.repeat_times = 8.0  # repeatedly update network using ReplayBuffer to keep critic's loss small
+        # step num_envs copies of env together while exploring. 1 means no VecEnv
+        self.num_envs = int(1)
 
         """Arguments for evaluate"""
         self.cwd = None  # current working directory to save model. None means set automatically
@@ -187,6 +189,40 @@ def build_env(env_class=None, env_args=None):
     return env
 
 
+class VecEnv:  # steps `num_envs` copies of an env together in the same process
+    def __init__(self, env_class=None, env_args=None, num_envs: int = 8):
+        self.envs = [build_env(env_class, env_args) for _ in range(num_envs)]
+        self.num_envs = num_envs
+        for attr_str in ("env_name", "state_dim", "action_dim", "if_discrete"):
+            setattr(self, attr_str, env_args[attr_str])
+
+    @staticmethod
+    def reset_env(env) -> np.ndarray:
+        state = env.reset()
+        return state[0] if isinstance(state, tuple) else state  # gymnasium API
+
+    def reset(self) -> np.ndarray:
+        return np.stack([self.reset_env(env) for env in self.envs]).astype(np.float32)
+
+    def step(
+        self, actions: np.ndarray
+    ) -> (np.ndarray, np.ndarray, np.ndarray, list):  # done sub-envs are reset
+        states = np.empty((self.num_envs, self.state_dim), dtype=np.float32)
+        rewards = np.empty(self.num_envs, dtype=np.float32)
+        dones = np.empty(self.num_envs, dtype=bool)
+        info_dicts = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            step_result = env.step(action)
+            state, reward, done, info_dict = *step_result[:3], step_result[-1]
+            if len(step_result) == 5:  # gymnasium API: terminated, truncated
+                done = done or step_result[3]
+            states[i] = self.reset_env(env) if done else state
+            rewards[i] = reward
+            dones[i] = done
+            info_dicts.append(info_dict)
+        return states, rewards, dones, info_dicts
+
+
 class AgentBase:
     def __init__(
         self,
@@ -306,22 +342,69 @@ class AgentPPO(AgentBase):
         undones = (1 - dones.type(torch.float32)).unsqueeze(1)
         return states, actions, logprobs, rewards, undones
 
+    def explore_vec_env(self, env: VecEnv, horizon_len: int) -> [Tensor]:
+        num_envs = env.num_envs
+        states = torch.zeros(
+            (horizon_len, num_envs, self.state_dim), dtype=torch.float32
+        ).to(self.device)
+        actions = torch.zeros(
+            (horizon_len, num_envs, self.action_dim), dtype=torch.float32
+        ).to(self.device)
+        logprobs = torch.zeros((horizon_len, num_envs), dtype=torch.float32).to(
+            self.device
+        )
+        rewards = torch.zeros((horizon_len, num_envs), dtype=torch.float32).to(
+            self.device
+        )
+        dones = torch.zeros((horizon_len, num_envs), dtype=torch.bool).to(self.device)
+
+        state = torch.as_tensor(self.states, dtype=torch.float32, device=self.device)
+
+        get_action = self.act.get_action
+        convert = self.act.convert_action_for_env
+        for i in range(horizon_len):
+            action, logprob = get_action(state)[:2]  # one actor call for all envs
+
+            ary_state, reward, done, _ = env.step(
+                convert(action).detach().cpu().numpy()
+            )
+
+            states[i] = state
+            actions[i] = action
+            logprobs[i] = logprob
+            rewards[i] = torch.as_tensor(reward, device=self.device)
+            dones[i] = torch.as_tensor(done, device=self.device)
+            state = torch.as_tensor(ary_state, dtype=torch.float32, device=self.device)
+
+        self.states = ary_state
+        rewards = rewards * self.reward_scale
+        undones = 1 - dones.type(torch.float32)
+        return states, actions, logprobs, rewards, undones
+
     def update_net(self, buffer) -> [float]:
         with torch.no_grad():
             states, actions, logprobs, rewards, undones = buffer
+            # rewards.shape == undones.shape == (horizon_len, num_envs)
+            horizon_len = rewards.shape[0]
+            states = states.reshape(-1, self.state_dim)
+            actions = actions.reshape(-1, self.action_dim)
+            logprobs = logprobs.reshape(-1)
             buffer_size = states.shape[0]
 
             """get advantages reward_sums"""
             bs = 2**10  # set a smaller 'batch_size' when out of GPU memory.
             values = [self.cri(states[i : i + bs]) for i in range(0, buffer_size, bs)]
-            values = torch.cat(values, dim=0).squeeze(
-                1
-            )  # values.shape == (buffer_size, )
+            values = torch.cat(values, dim=0).reshape(
+                horizon_len, -1
+            )  # values.shape == (horizon_len, num_envs)
 
             advantages = self.get_advantages(
                 rewards, undones, values
-            )  # advantages.shape == (buffer_size, )
-            reward_sums = advantages + values  # reward_sums.shape == (buffer_size, )
+            )  # advantages.shape == (horizon_len, num_envs)
+            reward_sums = advantages + values
+            # advantages.shape == reward_sums.shape == (buffer_size, )
+            advantages = advantages.reshape(-1)
+            reward_sums = reward_sums.reshape(-1)
             del rewards, undones, values
 
             advantages = (advantages - advantages.mean()) / (
@@ -368,23 +451,41 @@ class AgentPPO(AgentBase):
         return obj_critics / update_times, obj_actors / update_times, a_std_log.item()
 
     def get_advantages(
-        self, rewards: Tensor, undones: Tensor, values: Tensor
-    ) -> Tensor:
-        advantages = torch.empty_like(values)  # advantage value
-
+        self, rewards: Tensor, undones: Tensor, values: Tensor, chunk_len: int = 64
+    ) -> Tensor:  # all inputs and the output have shape (horizon_len, num_envs)
         masks = undones * self.gamma
-        horizon_len = rewards.shape[0]
+        horizon_len, num_envs = values.shape
 
         next_state = torch.tensor(self.states, dtype=torch.float32).to(self.device)
-        next_value = self.cri(next_state).detach()[0, 0]
+        next_value = self.cri(next_state).detach().reshape(num_envs)
+
+        next_values = torch.cat((values[1:], next_value.unsqueeze(0)), dim=0)
+        deltas = rewards + masks * next_values - values
+        decays = masks * self.lambda_gae_adv
+
+        """GAE recursion `adv[t] = deltas[t] + decays[t] * adv[t + 1]` solved chunk by chunk:
+        weights[n, t, k] = decays[t] * ... * decays[k-1] for k >= t, built with one cumprod"""
+        triu = torch.ones(chunk_len, chunk_len, device=self.device).triu()
+        triu_strict = triu.triu(diagonal=1).bool()
 
-        advantage = 0  # last_gae_lambda
-        for t in range(horizon_len - 1, -1, -1):
-            delta = rewards[t] + masks[t] * next_value - values[t]
-            advantages[t] = advantage = (
-                delta + masks[t] * self.lambda_gae_adv * advantage
+        advantages = torch.empty_like(values)  # advantage value
+        advantage = torch.zeros_like(next_value)  # last_gae_lambda of the next chunk
+        for end in range(horizon_len, 0, -chunk_len):
+            start = max(end - chunk_len, 0)
+            length = end - start
+            decay = decays[start:end]  # decay.shape == (length, num_envs)
+
+            shifted = torch.cat((torch.ones_like(decay[:1]), decay[:-1]), dim=0)
+            factors = torch.where(
+                triu_strict[:length, :length], shifted.t().unsqueeze(1), 1.0
+            )  # factors.shape == (num_envs, length, length)
+            weights = factors.cumprod(dim=2) * triu[:length, :length]
+
+            advantages[start:end] = (
+                torch.einsum("ntk,kn->tn", weights, deltas[start:end])
+                + (weights[:, :, -1] * decay[-1].unsqueeze(1)).t() * advantage
             )
-            next_value = values[t]
+            advantage = advantages[start]
         return advantages
 
 
@@ -419,11 +520,20 @@ class PendulumEnv(gym.Wrapper):  # a demo of custom gym env
 def train_agent(args: Config):
     args.init_before_training()
 
-    env = build_env(args.env_class, args.env_args)
+    num_envs = getattr(args, "num_envs", 1)
+    if num_envs > 1:
+        env = VecEnv(args.env_class, args.env_args, num_envs=num_envs)
+    else:
+        env = build_env(args.env_class, args.env_args)
     agent = args.agent_class(
         args.net_dims, args.state_dim, args.action_dim, gpu_id=args.gpu_id, args=args
     )
-    agent.states = env.reset()[np.newaxis, :]
+    if num_envs > 1:
+        agent.states = env.reset()  # agent.states.shape == (num_envs, state_dim)
+        explore_env = agent.explore_vec_env
+    else:
+        agent.states = env.reset()[np.newaxis, :]
+        explore_env = agent.explore_env
 
     evaluator = Evaluator(
         eval_env=build_env(args.env_class, args.env_args),
@@ -433,13 +543,15 @@ def train_agent(args: Config):
     )
     torch.set_grad_enabled(False)
     while True:  # start training
-        buffer_items = agent.explore_env(env, args.horizon_len)
+        buffer_items = explore_env(env, args.horizon_len)
 
         torch.set_grad_enabled(True)
         logging_tuple = agent.update_net(buffer_items)
         torch.set_grad_enabled(False)
 
-        evaluator.evaluate_and_save(agent.act, args.horizon_len, logging_tuple)
+        evaluator.evaluate_and_save(
+            agent.act, args.horizon_len * num_envs, logging_tuple
+        )
         if (evaluator.total_step > args.break_step) or os.path.exists(
             f"{args.cwd}/stop"
         ):
@@ -626,6 +738,7 @@ class DRLAgent:
                 raise ValueError(
                     "Fail to read arguments, please check 'model_kwargs' input."
                 )
+            model.num_envs = model_kwargs.get("num_envs", model.num_envs)
         return model
 
     def train_model(self, model, cwd, total_timesteps=5000):
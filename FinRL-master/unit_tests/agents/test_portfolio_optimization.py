@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from collections import deque
+
+import numpy as np
+import pytest
+import torch
+
+from finrl.agents.portfolio_optimization.utils import apply_portfolio_noise
+from finrl.agents.portfolio_optimization.utils import PVM
+from finrl.agents.portfolio_optimization.utils import ReplayBuffer
+
+
+def test_pvm_retrieves_added_actions():
+    pvm = PVM(capacity=3, portfolio_size=2)
+    cash = np.array([1, 0, 0], dtype=np.float32)
+    retrieved = []
+    for step in range(6):
+        retrieved.append(pvm.retrieve())
+        pvm.add(np.full(3, step, dtype=np.float32))
+    # the memory has capacity + 1 slots and wraps around
+    expected = [
+        cash,
+        np.full(3, 0),
+        np.full(3, 1),
+        np.full(3, 2),
+        np.full(3, 3),
+        np.full(3, 4),
+    ]
+    for action, expected_action in zip(retrieved, expected):
+        np.testing.assert_array_equal(action, expected_action)
+    pvm.reset()
+    np.testing.assert_array_equal(pvm.retrieve(), cash)
+
+
+def test_replay_buffer_matches_deque():
+    buffer = ReplayBuffer(capacity=4)
+    reference = deque(maxlen=4)
+    rng = np.random.default_rng(0)
+    for step in range(7):
+        experience = (
+            rng.standard_normal((3, 2, 5)).astype(np.float32),
+            rng.uniform(size=3).astype(np.float32),
+            rng.uniform(size=3).astype(np.float32),
+            float(step),
+        )
+        buffer.append(experience)
+        reference.append(experience)
+    assert len(buffer) == 4
+
+    obs, last_actions, price_variations, trf_mu = buffer.sample_batch([0, 3])
+    np.testing.assert_array_equal(obs, np.stack([reference[0][0], reference[3][0]]))
+    np.testing.assert_array_equal(trf_mu, [3.0, 6.0])
+    assert len(buffer) == 4
+
+    sample = buffer.sample()
+    assert len(buffer) == 0
+    assert len(sample) == 4
+    for experience, expected in zip(sample, reference):
+        for item, expected_item in zip(experience, expected):
+            np.testing.assert_array_equal(item, expected_item)
+    assert buffer.sample() == []
+
+
+def test_portfolio_noise_keeps_simplex():
+    rng = np.random.default_rng(0)
+    portfolios = rng.dirichlet(np.ones(6), size=200).astype(np.float32)
+    np.random.seed(0)
+    noisy = apply_portfolio_noise(portfolios, 0.3)
+    assert noisy.shape == portfolios.shape
+    assert noisy.min() >= 0
+    np.testing.assert_allclose(noisy.sum(axis=1), 1, atol=1e-6)
+    assert not np.allclose(noisy, portfolios)
+
+    single = apply_portfolio_noise(portfolios[0], 0.3)
+    assert single.shape == (6,)
+    np.testing.assert_allclose(single.sum(), 1, atol=1e-6)
+    np.testing.assert_array_equal(apply_portfolio_noise(portfolios[0]), portfolios[0])
+
+
+class _EnvDims:
+    """The attributes of PortfolioOptimizationEnv used to set up training."""
+
+    episode_length = 50
+    portfolio_size = 4
+
+
+def test_gradient_ascent_without_dataloader_is_identical():
+    pytest.importorskip("torch_geometric")
+    from finrl.agents.portfolio_optimization.algorithms import PolicyGradient
+
+    rng = np.random.default_rng(0)
+    experiences = [
+        (
+            rng.standard_normal((3, 4, 10)).astype(np.float32),
+            rng.dirichlet(np.ones(5)).astype(np.float32),
+            np.insert(rng.uniform(0.95, 1.05, 4).astype(np.float32), 0, 1),
+            0.999,
+        )
+        for _ in range(30)
+    ]
+    parameters = []
+    for use_dataloader in [True, False]:
+        torch.manual_seed(0)
+        agent = PolicyGradient(
+            _EnvDims(),
+            policy_kwargs={"time_window": 10},
+            batch_size=10,
+            use_dataloader=use_dataloader,
+        )
+        for experience in experiences:
+            agent.train_buffer.append(experience)
+            if len(agent.train_buffer) == 10:
+                agent._gradient_ascent()
+        parameters.append(
+            torch.cat([p.detach().flatten() for p in agent.train_policy.parameters()])
+        )
+    torch.testing.assert_close(parameters[0], parameters[1], rtol=0, atol=0)
+
+
+def test_replay_buffer_extend_matches_append():
+    rng = np.random.default_rng(0)
+    batches = [
+        (
+            rng.standard_normal((3, 2, 5)).astype(np.float32),
+            rng.uniform(size=(3, 4)).astype(np.float32),
+            rng.uniform(size=3),
+        )
+        for _ in range(3)
+    ]
+    extended = ReplayBuffer(capacity=5)
+    appended = ReplayBuffer(capacity=5)
+    for batch in batches:
+        extended.extend(batch)
+        for experience in zip(*batch):
+            appended.append(experience)
+        assert len(extended) == len(appended)
+    for items, expected in zip(extended.sample_batch(), appended.sample_batch()):
+        np.testing.assert_array_equal(items, expected)
+
+    # only the latest experiences are kept when a batch exceeds the capacity
+    trf_mu = np.concatenate([batch[2] for batch in batches])
+    extended.extend(tuple(np.concatenate(items) for items in zip(*batches)))
+    assert len(extended) == 5
+    np.testing.assert_array_equal(extended.sample_batch()[2], trf_mu[-5:])
+
+
+def test_pvm_with_many_portfolios():
+    pvm = PVM(capacity=3, portfolio_size=2, num_portfolios=4)
+    np.testing.assert_array_equal(pvm.retrieve(), np.tile([1, 0, 0], (4, 1)))
+    actions = np.random.default_rng(0).dirichlet(np.ones(3), size=4).astype(np.float32)
+    pvm.add(actions)
+    np.testing.assert_array_equal(pvm.retrieve(), actions)
+
+
+def test_policy_gradient_with_start_offsets(tmp_path):
+    pytest.importorskip("torch_geometric")
+    pytest.importorskip("quantstats")
+    import pandas as pd
+
+    from finrl.agents.portfolio_optimization.algorithms import PolicyGradient
+    from finrl.meta.env_portfolio_optimization.env_portfolio_optimization import (
+        PortfolioOptimizationEnv,
+    )
+
+    rng = np.random.default_rng(0)
+    n_days, tickers = 60, ["AAPL", "GOOG", "MSFT"]
+    close = 100 * np.exp(rng.normal(0, 0.02, (n_days, len(tickers))).cumsum(0))
+    df = pd.DataFrame(
+        {
+            "date": np.repeat(
+                pd.bdate_range("2019-01-01", periods=n_days).strftime("%Y-%m-%d"),
+                len(tickers),
+            ),
+            "tic": np.tile(tickers, n_days),
+            "close": close.ravel(),
+            "high": 1.01 * close.ravel(),
+            "low": 0.99 * close.ravel(),
+        }
+    )
+    env = PortfolioOptimizationEnv(
+        df, initial_amount=1000, comission_fee_pct=0.0025, time_window=10, cwd=tmp_path
+    )
+    torch.manual_seed(0)
+    agent = PolicyGradient(
+        env, policy_kwargs={"time_window": 10}, batch_size=8, action_noise=0.1
+    )
+    parameters = [p.detach().clone() for p in agent.train_policy.parameters()]
+    agent.train(episodes=1, start_offsets=[0, 10, 20], episode_length=20)
+    assert any(
+        not torch.equal(p, q)
+        for p, q in zip(parameters, agent.train_policy.parameters())
+    )
+
+    values = agent.test(
+        env, online_training_period=5, start_offsets=[0, 10, 20, 30], episode_length=15
+    )
+    assert values.shape == (4, 16)
+    np.testing.assert_array_equal(values[:, 0], 1000)
+    assert np.all(np.isfinite(values))
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+from copy import deepcopy
+
 import numpy as np
+import pandas as pd
 import pytest
 
 from finrl.meta.env_stock_trading.env_stocktrading_cashpenalty import (
@@ -26,6 +29,19 @@ def data(ticker_list):
     ).fetch_data()
 
 
+@pytest.fixture(scope="session")
+def synthetic_data(indicator_list):
+    rng = np.random.default_rng(0)
+    n_days, tickers = 30, ["AAPL", "GOOG", "MSFT"]
+    dates = pd.bdate_range("2019-01-01", periods=n_days).strftime("%Y-%m-%d")
+    df = pd.DataFrame(
+        {"date": np.repeat(dates, len(tickers)), "tic": np.tile(tickers, n_days)}
+    )
+    for col in indicator_list + ["turbulence"]:
+        df[col] = rng.uniform(50, 150, len(df))
+    return df.sample(frac=1, random_state=0)  # the cache must not rely on row order
+
+
 def test_zero_step(data, ticker_list):
     # Prove that zero actions results in zero stock buys, and no price changes
     init_amt = 1e6
@@ -90,23 +106,59 @@ def test_gains():
     raise NotImplementedError
 
 
-@pytest.mark.skip(reason="this test is not working correctly")
-def test_validate_caching(data):
+def test_validate_caching(synthetic_data):
     # prove that results with or without caching don't change anything
     init_amt = 1e6
     env_uncached = StockTradingEnvCashpenalty(
-        df=data, initial_amount=init_amt, cache_indicator_data=False
+        df=synthetic_data,
+        initial_amount=init_amt,
+        cache_indicator_data=False,
+        random_start=False,
     )
     env_cached = StockTradingEnvCashpenalty(
-        df=data, initial_amount=init_amt, cache_indicator_data=True
+        df=synthetic_data,
+        initial_amount=init_amt,
+        cache_indicator_data=True,
+        random_start=False,
     )
     _ = env_uncached.reset()
     _ = env_cached.reset()
+    rng = np.random.default_rng(0)
     for i in range(10):
-        actions = np.random.uniform(low=-1, high=1, size=2)
-        print(f"actions: {actions}")
+        actions = rng.uniform(low=-1, high=1, size=3)
         un_state, un_reward, _, _ = env_uncached.step(actions)
         ca_state, ca_reward, _, _ = env_cached.step(actions)
 
+        assert isinstance(ca_state, list)
         assert un_state == ca_state
         assert un_reward == ca_reward
+
+
+def test_cache_needs_numeric_columns(synthetic_data):
+    df = synthetic_data.assign(sector="tech")
+    with pytest.raises(ValueError, match="numeric"):
+        StockTradingEnvCashpenalty(
+            df=df,
+            daily_information_cols=["close", "sector"],
+            cache_indicator_data=True,
+        )
+
+
+def test_cached_date_vectors(synthetic_data):
+    # Prove that the cached date vectors are the ones read from the dataframe
+    kwargs = dict(df=synthetic_data, turbulence_threshold=120, random_start=False)
+    env_cached = StockTradingEnvCashpenalty(cache_indicator_data=True, **kwargs)
+    env_uncached = StockTradingEnvCashpenalty(cache_indicator_data=False, **kwargs)
+    for i in range(len(env_cached.dates)):
+        for cols in [None, ["close"], ["turbulence"], ["volume", "open"]]:
+            assert env_cached.get_date_vector(i, cols) == pytest.approx(
+                env_uncached.get_date_vector(i, cols)
+            )
+
+    # copies made for vectorized environments share the cache
+    env_copy = deepcopy(env_cached)
+    assert env_copy.cached_data is env_cached.cached_data
+    env_copy.reset()
+    env_cached.reset()
+    actions = np.array([0.5, -0.5, 1.0])
+    assert env_copy.step(actions)[0] == pytest.approx(env_cached.step(actions)[0])
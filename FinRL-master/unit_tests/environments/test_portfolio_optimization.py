@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("quantstats")
+from finrl.meta.env_portfolio_optimization.env_portfolio_optimization import (  # noqa: E402
+    PortfolioOptimizationEnv,
+)
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    n_days, tickers = 80, ["AAPL", "GOOG", "MSFT", "NVDA"]
+    dates = pd.bdate_range("2019-01-01", periods=n_days).strftime("%Y-%m-%d")
+    close = 100 * np.exp(rng.normal(0, 0.02, (n_days, len(tickers))).cumsum(0))
+    return pd.DataFrame(
+        {
+            "date": np.repeat(dates, len(tickers)),
+            "tic": np.tile(tickers, n_days),
+            "close": close.ravel(),
+            "high": 1.01 * close.ravel(),
+            "low": 0.99 * close.ravel(),
+        }
+    )
+
+
+@pytest.mark.parametrize("comission_fee_model", ["trf", "wvm"])
+def test_batch_env_matches_sequential_env(data, comission_fee_model, tmp_path):
+    env = PortfolioOptimizationEnv(
+        data,
+        initial_amount=1000,
+        comission_fee_model=comission_fee_model,
+        comission_fee_pct=0.005,
+        time_window=10,
+        cwd=tmp_path,
+    )
+    batch_env = env.get_batch_env([0, 5, 0], episode_length=30)
+    assert batch_env.num_trajectories == 3
+
+    rng = np.random.default_rng(1)
+    state = env.reset()
+    states = batch_env.reset()
+    assert states.shape == (3,) + env.observation_space.shape
+    np.testing.assert_array_equal(states[0], state)
+    np.testing.assert_array_equal(
+        states[1], env._get_state_and_info_from_time_index(9 + 5)[0]
+    )
+    for step in range(30):
+        actions = rng.dirichlet(np.ones(5), size=3).astype(np.float32)
+        if step % 7 == 0:
+            # not a portfolio vector, normalized by softmax
+            actions[0] = rng.normal(size=5)
+        state, reward, terminal, info = env.step(actions[0])
+        states, rewards, batch_terminal, batch_info = batch_env.step(actions)
+        np.testing.assert_array_equal(states[0], state)
+        np.testing.assert_array_equal(
+            batch_info["price_variation"][0], info["price_variation"]
+        )
+        if comission_fee_model == "trf":
+            np.testing.assert_allclose(
+                batch_info["trf_mu"][0], info["trf_mu"], rtol=1e-6
+            )
+        np.testing.assert_allclose(rewards[0], reward, rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(
+            batch_env.portfolio_values[0, step + 1], env._portfolio_value, rtol=1e-6
+        )
+        assert batch_terminal == (step == 29)
+
+    with pytest.raises(ValueError):
+        env.get_batch_env([0, 60], episode_length=30)
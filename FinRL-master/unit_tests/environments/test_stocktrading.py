@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+from stable_baselines3 import PPO
+
+from finrl.agents.stablebaselines3.models import DRLAgent
+from finrl.meta.env_stock_trading.env_stocktrading import StockTradingEnv
+from finrl.meta.env_stock_trading.reporting import FileReporter
+
+
+@pytest.fixture(scope="session")
+def indicator_list():
+    return ["macd", "rsi_30"]
+
+
+@pytest.fixture(scope="session")
+def data(indicator_list):
+    rng = np.random.default_rng(0)
+    n_days, tickers = 60, ["AAPL", "GOOG", "MSFT"]
+    dates = pd.bdate_range("2019-01-01", periods=n_days).strftime("%Y-%m-%d")
+    df = pd.DataFrame(
+        {
+            "date": np.repeat(dates, len(tickers)),
+            "tic": np.tile(tickers, n_days),
+            "close": 100 + rng.normal(size=(n_days, len(tickers))).cumsum(0).ravel(),
+            "turbulence": np.repeat(rng.uniform(0, 100, n_days), len(tickers)),
+        }
+    )
+    for indicator in indicator_list:
+        df[indicator] = rng.normal(size=len(df))
+    df.index = df.date.factorize()[0]
+    return df
+
+
+def make_env(df, indicator_list, **kwargs):
+    stock_dim = len(df.tic.unique())
+    return StockTradingEnv(
+        df=df,
+        stock_dim=stock_dim,
+        hmax=100,
+        initial_amount=1e6,
+        num_stock_shares=[0] * stock_dim,
+        buy_cost_pct=[1e-3] * stock_dim,
+        sell_cost_pct=[1e-3] * stock_dim,
+        reward_scaling=1e-4,
+        state_space=1 + (2 + len(indicator_list)) * stock_dim,
+        action_space=stock_dim,
+        tech_indicator_list=indicator_list,
+        **kwargs,
+    )
+
+
+def test_day_arrays_match_df(data, indicator_list):
+    env = make_env(data, indicator_list)
+    for day in (0, 1, len(data.index.unique()) - 1):
+        rows = data.loc[day, :]
+        assert env.close_ary[day].tolist() == rows.close.tolist()
+        assert env.tech_ary[day].tolist() == sum(
+            (rows[tech].tolist() for tech in indicator_list), []
+        )
+        assert env.date_ary[day] == rows.date.iloc[0]
+        assert env.risk_ary[day] == rows.turbulence.iloc[0]
+
+
+def test_uneven_days_raise(data, indicator_list):
+    with pytest.raises(ValueError, match="same number of rows"):
+        make_env(data.iloc[[0, 1, 2, 3, 4, 6, 7, 8]], indicator_list)
+
+
+def test_direct_policy_prediction(data, indicator_list):
+    # Prove that the direct backtest produces the same memories as DummyVecEnv
+    env_kwargs = {"turbulence_threshold": 80}
+    model = PPO("MlpPolicy", make_env(data, indicator_list), seed=0, device="cpu")
+    with torch.no_grad():  # make the untrained policy both buy and sell
+        model.policy.action_net.weight.normal_(0, 0.05)
+        model.policy.action_net.bias.copy_(torch.tensor([0.5, -0.3, 0.8]))
+
+    account, actions = DRLAgent.DRL_prediction(
+        model, make_env(data, indicator_list, **env_kwargs)
+    )
+    account_direct, actions_direct = DRLAgent.DRL_prediction(
+        model, make_env(data, indicator_list, **env_kwargs), direct_policy=True
+    )
+
+    assert actions.abs().values.sum() > 0
+    pd.testing.assert_frame_equal(account, account_direct)
+    pd.testing.assert_frame_equal(actions, actions_direct)
+
+
+def run_episode(env):
+    env.reset()
+    terminal = False
+    while not terminal:
+        _, _, terminal, _, _ = env.step(np.full(env.stock_dim, 0.5))
+
+
+def test_default_reporter_writes_nothing(data, indicator_list, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    run_episode(make_env(data, indicator_list))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_background_file_reporter(data, indicator_list, tmp_path):
+    reporter = FileReporter(results_dir=str(tmp_path), background=True)
+    env = make_env(
+        data, indicator_list, model_name="ppo", mode="test", reporter=reporter
+    )
+    run_episode(env)
+    reporter.close()
+
+    df_account_value = pd.read_csv(tmp_path / "account_value_test_ppo_.csv")
+    assert df_account_value.account_value.tolist() == pytest.approx(
+        env.save_asset_memory().account_value.tolist()
+    )
+    assert (tmp_path / "actions_test_ppo_.csv").exists()
+    assert (tmp_path / "account_value_test_ppo_.png").exists()
+
+
+def test_episode_memories(data, indicator_list):
+    env = make_env(data, indicator_list)
+    for _ in range(2):  # memories are rewound on reset, not appended to
+        run_episode(env)
+    n_days = len(data.index.unique())
+    assert len(env.asset_memory) == len(env.date_memory) == n_days
+    assert len(env.actions_memory) == len(env.state_memory) == n_days - 1
+
+    df_states = env.save_state_memory()
+    assert df_states.shape == (n_days - 1, 1 + (2 + len(indicator_list)) * 3)
+    assert df_states.columns[:3].tolist() == ["cash", "AAPL_price", "GOOG_price"]
+    assert df_states.columns[-1] == f"MSFT_{indicator_list[-1]}"
+    assert df_states.iloc[-1].tolist() == pytest.approx(env.state)
+
+
+def test_skip_state_memory(data, indicator_list):
+    env = make_env(data, indicator_list, record_state_memory=False)
+    run_episode(env)
+    assert len(env.state_memory) == 0
+    assert len(env.save_asset_memory()) == len(data.index.unique())
+    with pytest.raises(ValueError):
+        env.save_state_memory()
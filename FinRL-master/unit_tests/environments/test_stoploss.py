@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from finrl.meta.env_stock_trading.env_stocktrading_stoploss import (
+    StockTradingEnvStopLoss,
+)
+
+
+@pytest.fixture(scope="session")
+def data():
+    rng = np.random.default_rng(0)
+    n_days, tickers = 40, ["AAPL", "GOOG", "MSFT"]
+    dates = pd.bdate_range("2019-01-01", periods=n_days).strftime("%Y-%m-%d")
+    close = 100 + rng.normal(0, 3, size=(n_days, len(tickers))).cumsum(0)
+    df = pd.DataFrame(
+        {
+            "date": np.repeat(dates, len(tickers)),
+            "tic": np.tile(tickers, n_days),
+            "close": close.ravel(),
+        }
+    )
+    for col in ["open", "high", "low", "volume"]:
+        df[col] = df.close
+    return df
+
+
+def run_episode(env):
+    env.reset()
+    rng = np.random.default_rng(1)
+    done = False
+    while not done:
+        _, _, done, info = env.step(rng.uniform(-1, 1, len(env.assets)))
+    return info
+
+
+def test_events_are_counted_not_printed(data, capsys):
+    env = StockTradingEnvStopLoss(
+        df=data, hmax=5000, random_start=False, patient=True, print_verbosity=5
+    )
+    capsys.readouterr()  # the caching messages
+    info = run_episode(env)
+    assert capsys.readouterr().out == ""
+
+    metrics = info["episode_metrics"]
+    assert metrics["environment/completed_steps"] == len(data.date.unique()) - 1
+    df_events = env.save_event_memory()
+    assert len(df_events) > 1
+    for reason in env.event_reasons:
+        key = "environment/events/" + reason.lower().replace(" ", "_")
+        assert metrics[key] == (df_events.reason == reason).sum()
+
+    # events keep their episode, rewards and percentages, and the history is
+    # recorded without printing
+    assert (df_events.episode == env.episode).all()
+    assert df_events.step.is_monotonic_increasing
+    assert (
+        df_events[["terminal_reward", "gain_loss_pct", "cash_pct"]].notna().all().all()
+    )
+    assert len(env.episode_history) == len(env.history_records) > len(df_events)
+    assert env.episode_history[-1][2] == "Last Date"
+
+    # the same episode, printed
+    env.verbose = True
+    run_episode(env)
+    assert len(capsys.readouterr().out.splitlines()) > len(df_events)
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from finrl.applications.stock_trading.fundamental_stock_trading import (
+    trailing_quarters_sum,
+)
+
+
+def test_trailing_quarters_sum_matches_row_loop():
+    rng = np.random.default_rng(0)
+    fund_data = pd.DataFrame(
+        {
+            "date": np.tile([20200331, 20200630, 20200930, 20201231, 20210331], 4),
+            "tic": np.repeat(["AAPL", "GOOG", "MSFT", "AAPL"], 5),
+            "rev_q": rng.lognormal(3, 1, 20),
+        }
+    )
+    fund_data.loc[[2, 7, 8], "rev_q"] = np.nan
+
+    expected = np.full(len(fund_data), np.nan)
+    for i in range(3, len(fund_data)):
+        if fund_data.iloc[i, 1] == fund_data.iloc[i - 3, 1]:
+            expected[i] = np.sum(fund_data["rev_q"].iloc[i - 3 : i])
+
+    result = trailing_quarters_sum(fund_data, "rev_q")
+    np.testing.assert_array_equal(result.to_numpy(), expected)
+    assert result.index.equals(fund_data.index)
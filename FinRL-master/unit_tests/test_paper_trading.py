@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+import torch
+
+from finrl.meta.paper_trading.common import AgentPPO
+from finrl.meta.paper_trading.common import VecEnv
+
+
+def reference_advantages(agent, rewards, undones, values):
+    """The original per-step GAE recurrence, applied to each env separately."""
+    masks = undones * agent.gamma
+    next_state = torch.tensor(agent.states, dtype=torch.float32)
+    next_values = agent.cri(next_state).detach().reshape(-1)
+    advantages = torch.empty_like(values)
+    for env in range(values.shape[1]):
+        next_value = next_values[env]
+        advantage = 0
+        for t in range(values.shape[0] - 1, -1, -1):
+            delta = rewards[t, env] + masks[t, env] * next_value - values[t, env]
+            advantages[t, env] = advantage = (
+                delta + masks[t, env] * agent.lambda_gae_adv * advantage
+            )
+            next_value = values[t, env]
+    return advantages
+
+
+@pytest.mark.parametrize("num_envs", [1, 3])
+@pytest.mark.parametrize("horizon_len", [1, 40, 64, 130])
+def test_get_advantages_matches_recurrence(num_envs, horizon_len):
+    torch.manual_seed(0)
+    agent = AgentPPO(net_dims=(8,), state_dim=4, action_dim=2, gpu_id=-1)
+    agent.states = np.random.default_rng(0).normal(size=(num_envs, 4))
+    rewards = torch.randn(horizon_len, num_envs)
+    undones = (torch.rand(horizon_len, num_envs) > 0.05).float()
+    values = torch.randn(horizon_len, num_envs)
+
+    expected = reference_advantages(agent, rewards, undones, values)
+    for chunk_len in [16, 64]:
+        advantages = agent.get_advantages(rewards, undones, values, chunk_len=chunk_len)
+        torch.testing.assert_close(advantages, expected, rtol=1e-5, atol=1e-5)
+
+
+class CountdownEnv:
+    """Episodes of `length` steps whose state counts the remaining steps."""
+
+    def __init__(self, length=3):
+        self.length = length
+
+    def reset(self):
+        self.remaining = self.length
+        return np.array([self.remaining, 0.0], dtype=np.float32)
+
+    def step(self, action):
+        self.remaining -= 1
+        state = np.array([self.remaining, action[0]], dtype=np.float32)
+        return state, 1.0, self.remaining == 0, {}
+
+
+def test_explore_vec_env_resets_finished_envs():
+    env_args = {
+        "env_name": "Countdown",
+        "state_dim": 2,
+        "action_dim": 1,
+        "if_discrete": False,
+        "length": 3,
+    }
+    env = VecEnv(CountdownEnv, env_args, num_envs=2)
+    torch.manual_seed(0)
+    agent = AgentPPO(net_dims=(8,), state_dim=2, action_dim=1, gpu_id=-1)
+    agent.states = env.reset()
+
+    states, actions, logprobs, rewards, undones = agent.explore_vec_env(env, 7)
+    assert states.shape == (7, 2, 2)
+    assert actions.shape == (7, 2, 1)
+    assert logprobs.shape == rewards.shape == undones.shape == (7, 2)
+    # every third step ends an episode and the next state is a reset one
+    np.testing.assert_array_equal(undones[:, 0].numpy(), [1, 1, 0, 1, 1, 0, 1])
+    np.testing.assert_array_equal(states[:, 0, 0].numpy(), [3, 2, 1, 3, 2, 1, 3])
+    np.testing.assert_array_equal(agent.states[:, 0], [2, 2])